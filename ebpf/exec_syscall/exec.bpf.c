@@ -4,12 +4,76 @@
 #include "exec.h"                  // Custom header file, assumed to define struct exec_evt
 
 // Define a ring buffer map named 'rb' to store events. The ring buffer is used
-// for user-space communication.
+// for user-space communication. The collector may resize it before loading
+// (exec --ringbuf-size).
 struct {
     __uint(type, BPF_MAP_TYPE_RINGBUF);      // Map type: Ring buffer
-    __uint(max_entries, 256 * 1024);         // Maximum size: 256 KB
+    __uint(max_entries, 256 * 1024);         // Default size: 256 KB
 } rb SEC(".maps");
 
+// Per-CPU event counters (enum exec_counter), read by the collector so that
+// ring buffer overflows are visible from user space.
+struct {
+    __uint(type, BPF_MAP_TYPE_PERCPU_ARRAY);
+    __uint(max_entries, EXEC_COUNTER_MAX);
+    __type(key, __u32);
+    __type(value, __u64);
+} counters SEC(".maps");
+
+// Filter maps (see struct exec_filter_config in exec.h). They are pinned by
+// name under the collector's pin root so that they survive collector
+// restarts and can be updated while the program runs.
+struct {
+    __uint(type, BPF_MAP_TYPE_ARRAY);
+    __uint(max_entries, 1);
+    __type(key, __u32);
+    __type(value, struct exec_filter_config);
+    __uint(pinning, LIBBPF_PIN_BY_NAME);
+} filter_config SEC(".maps");
+
+struct {
+    __uint(type, BPF_MAP_TYPE_HASH);
+    __uint(max_entries, 1024);
+    __type(key, char[EXEC_COMM_LEN]);
+    __type(value, __u8);
+    __uint(pinning, LIBBPF_PIN_BY_NAME);
+} comm_filter SEC(".maps");
+
+struct {
+    __uint(type, BPF_MAP_TYPE_LPM_TRIE);
+    __uint(max_entries, 1024);
+    __type(key, struct exec_file_key);
+    __type(value, __u8);
+    __uint(map_flags, BPF_F_NO_PREALLOC);
+    __uint(pinning, LIBBPF_PIN_BY_NAME);
+} file_filter SEC(".maps");
+
+struct {
+    __uint(type, BPF_MAP_TYPE_HASH);
+    __uint(max_entries, 1024);
+    __type(key, __u64);
+    __type(value, __u8);
+    __uint(pinning, LIBBPF_PIN_BY_NAME);
+} cgroup_filter SEC(".maps");
+
+static __always_inline void count_event(__u32 counter)
+{
+    __u64 *value = bpf_map_lookup_elem(&counters, &counter);
+
+    if (value)
+        *value += 1;  // per-CPU slot, no atomics needed
+}
+
+// Apply a filter mode to the result of a filter map lookup.
+static __always_inline bool filter_pass(__u32 mode, void *found)
+{
+    if (mode == EXEC_FILTER_ALLOW)
+        return found != NULL;
+    if (mode == EXEC_FILTER_DENY)
+        return found == NULL;
+    return true;
+}
+
 // Struct definition for the parameters passed to the execve syscall tracepoint.
 // This is provided by the kernel tracepoint API.
 struct exec_params_t {
@@ -31,29 +95,56 @@ int handle_execve(struct exec_params_t *params)
 {
     // Get the current task (process context) using a BPF helper.
     struct task_struct *task = (struct task_struct *)bpf_get_current_task();
-    
+    char comm[EXEC_COMM_LEN] = {};
+    struct exec_file_key file = {};
+    __u64 cgroup_id = bpf_get_current_cgroup_id();
+    __u32 zero = 0;
+
+    // Check the filters before reserving ring buffer space, so filtered
+    // events cost neither ring buffer capacity nor user-space work.
+    bpf_get_current_comm(&comm, sizeof(comm));
+    bpf_probe_read_user_str(file.data, sizeof(file.data), params->file);
+
+    struct exec_filter_config *cfg = bpf_map_lookup_elem(&filter_config, &zero);
+    if (cfg) {
+        bool pass = true;
+
+        if (cfg->comm_mode)
+            pass = filter_pass(cfg->comm_mode, bpf_map_lookup_elem(&comm_filter, comm));
+        if (pass && cfg->file_mode) {
+            file.prefixlen = sizeof(file.data) * 8;
+            pass = filter_pass(cfg->file_mode, bpf_map_lookup_elem(&file_filter, &file));
+        }
+        if (pass && cfg->cgroup_mode)
+            pass = filter_pass(cfg->cgroup_mode, bpf_map_lookup_elem(&cgroup_filter, &cgroup_id));
+        if (!pass) {
+            count_event(EXEC_COUNTER_FILTERED);
+            return 0;
+        }
+    }
+
     // Reserve space in the ring buffer for the event structure.
     struct exec_evt *evt = bpf_ringbuf_reserve(&rb, sizeof(*evt), 0);
     
-    // If the ring buffer reservation fails, exit the program.
+    // If the ring buffer is full the event is lost; count it and exit.
     if (!evt) {
-        bpf_printk("ring buffer not reserved\n");
-        return 0; // Return without doing anything
+        count_event(EXEC_COUNTER_DROPPED);
+        return 0;
     }
 
     // Populate the event structure with data from the current process.
     evt->tgid = BPF_CORE_READ(task, tgid);  // Read thread group ID (process ID)
     evt->pid = BPF_CORE_READ(task, pid);    // Read the process ID
-    bpf_get_current_comm(&evt->comm, sizeof(evt->comm)); // Get the process name
-    
-    // Safely read the filename being executed.
-    bpf_probe_read_user_str(evt->file, sizeof(evt->file), params->file);
+    evt->cgroup_id = cgroup_id;             // Resolved to a pod by the web backend
+    // Copy the process name and the filename read above.
+    __builtin_memset(evt->comm, 0, sizeof(evt->comm));
+    __builtin_memcpy(evt->comm, comm, sizeof(comm));
+    __builtin_memcpy(evt->file, file.data, sizeof(evt->file));
 
     // Submit the event to the ring buffer for user-space consumption.
+    // evt must not be touched after this.
     bpf_ringbuf_submit(evt, 0);
-
-    // Log a debug message indicating that an execve syscall was handled.
-    bpf_printk("Execve syscall handled: %s\n", evt->file);
+    count_event(EXEC_COUNTER_SUBMITTED);
 
     return 0; // Indicate successful execution of the eBPF program
 }
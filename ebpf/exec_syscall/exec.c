@@ -1,7 +1,13 @@
+#include <errno.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
 #include <sys/resource.h>
 #include <signal.h>
+#include <bpf/libbpf.h>
+#include <bpf/bpf.h>
 #include "exec.skel.h"
 #include "exec.h"
 
@@ -9,10 +15,39 @@
 static struct exec *skel = NULL;
 static struct ring_buffer *rb = NULL;
 
-// Signal handler for cleanup
+// Output format for events written to stdout
+enum output_format {
+    FORMAT_TEXT,    // human readable line per event
+    FORMAT_JSON,    // newline-delimited JSON
+    FORMAT_BINARY,  // framed struct exec_record_evt records (see exec.h)
+};
+
+static enum output_format out_format = FORMAT_TEXT;
+
+// Events read from the ring buffer since start
+static unsigned long long consumed;
+// Ring buffer size in bytes (0 keeps the size compiled into exec.bpf.c)
+static unsigned long ringbuf_size;
+// Directory under which the filter maps are pinned (and reused if present)
+static const char *pin_root = "/sys/fs/bpf/k8sscope";
+// Interval between stats records
+#define STATS_INTERVAL_NS 1000000000ULL
+
+// Set by the signal handler; the poll loop in main() exits when it is set
+static volatile sig_atomic_t exiting;
+
+// Signal handler: only record the signal. stdio and libbpf are not
+// async-signal-safe, and flushing stdout from here could cut a binary record
+// that main() is in the middle of writing.
 static void handle_signal(int sig)
 {
-    fprintf(stdout, "\nReceived signal %d, cleaning up...\n", sig);
+    exiting = sig;
+}
+
+// Flush buffered records and release the ring buffer and the programs
+static void cleanup(void)
+{
+    fflush(stdout);
 
     if (rb) {
         ring_buffer__free(rb);
@@ -24,8 +59,6 @@ static void handle_signal(int sig)
         exec__destroy(skel);
         skel = NULL;
     }
-
-    exit(0);
 }
 
 static void bump_memlock_rlimit(void)
@@ -41,30 +74,200 @@ static void bump_memlock_rlimit(void)
     }
 }
 
+static unsigned long long realtime_ns(void)
+{
+    struct timespec ts;
+
+    clock_gettime(CLOCK_REALTIME, &ts);
+    return (unsigned long long)ts.tv_sec * 1000000000ULL + ts.tv_nsec;
+}
+
+// Write a NUL-terminated string of at most `max` bytes as a JSON string.
+static void write_json_str(const char *s, size_t max)
+{
+    size_t i;
+
+    fputc('"', stdout);
+    for (i = 0; i < max && s[i]; i++) {
+        unsigned char c = s[i];
+        if (c == '"' || c == '\\')
+            fprintf(stdout, "\\%c", c);
+        else if (c < 0x20)
+            fprintf(stdout, "\\u%04x", c);
+        else
+            fputc(c, stdout);
+    }
+    fputc('"', stdout);
+}
+
 static int handle_evt(void *ctx, void *data, size_t sz)
 {
     const struct exec_evt *evt = data;
+    unsigned long long ts_ns = realtime_ns();
+
+    (void)ctx;
+    if (sz < sizeof(*evt))
+        return 0;
+    consumed++;
 
-    fprintf(stdout, "tgid: %d <> pid: %d -- comm: %s <> file: %s\n", evt->tgid, evt->pid, evt->comm, evt->file);
+    switch (out_format) {
+    case FORMAT_BINARY: {
+        struct exec_record_hdr hdr = {
+            .len = sizeof(struct exec_record_evt),
+            .type = EXEC_RECORD_EVT,
+        };
+        struct exec_record_evt rec = { .ts_ns = ts_ns, .evt = *evt };
+
+        fwrite(&hdr, sizeof(hdr), 1, stdout);
+        fwrite(&rec, sizeof(rec), 1, stdout);
+        break;
+    }
+    case FORMAT_JSON:
+        fprintf(stdout, "{\"ts\":%llu,\"pid\":%d,\"tgid\":%d,\"cgroup_id\":%llu,\"comm\":",
+                ts_ns, evt->pid, evt->tgid, evt->cgroup_id);
+        write_json_str(evt->comm, sizeof(evt->comm));
+        fputs(",\"file\":", stdout);
+        write_json_str(evt->file, sizeof(evt->file));
+        fputs("}\n", stdout);
+        break;
+    default:
+        fprintf(stdout, "tgid: %d <> pid: %d -- comm: %s <> file: %s\n", evt->tgid, evt->pid, evt->comm, evt->file);
+        break;
+    }
 
     return 0;
 }
 
-int main(void)
+// Sum a per-CPU counter of the `counters` map over all CPUs.
+static unsigned long long read_counter(int map_fd, unsigned int counter, int ncpus)
 {
+    unsigned long long values[ncpus];
+    unsigned long long sum = 0;
+    int i;
+
+    if (bpf_map_lookup_elem(map_fd, &counter, values))
+        return 0;
+    for (i = 0; i < ncpus; i++)
+        sum += values[i];
+    return sum;
+}
+
+// Report kernel and user-space counters so that the reader can tell how
+// many events were lost and how far behind it is.
+static void write_stats(int map_fd, int ncpus)
+{
+    struct exec_record_stats st = {
+        .ts_ns = realtime_ns(),
+        .submitted = read_counter(map_fd, EXEC_COUNTER_SUBMITTED, ncpus),
+        .dropped = read_counter(map_fd, EXEC_COUNTER_DROPPED, ncpus),
+        .consumed = consumed,
+        .ringbuf_bytes = bpf_map__max_entries(skel->maps.rb),
+        .filtered = read_counter(map_fd, EXEC_COUNTER_FILTERED, ncpus),
+    };
+
+    switch (out_format) {
+    case FORMAT_BINARY: {
+        struct exec_record_hdr hdr = {
+            .len = sizeof(st),
+            .type = EXEC_RECORD_STATS,
+        };
+
+        fwrite(&hdr, sizeof(hdr), 1, stdout);
+        fwrite(&st, sizeof(st), 1, stdout);
+        fflush(stdout);
+        break;
+    }
+    case FORMAT_JSON:
+        fprintf(stdout, "{\"type\":\"stats\",\"ts\":%llu,\"submitted\":%llu,\"dropped\":%llu,"
+                "\"consumed\":%llu,\"ringbuf_bytes\":%llu,\"filtered\":%llu}\n",
+                st.ts_ns, st.submitted, st.dropped, st.consumed, st.ringbuf_bytes, st.filtered);
+        fflush(stdout);
+        break;
+    default:
+        // Keep stdout readable; only report when events were lost
+        if (st.dropped)
+            fprintf(stderr, "stats: submitted=%llu dropped=%llu consumed=%llu\n",
+                    st.submitted, st.dropped, st.consumed);
+        break;
+    }
+}
+
+// Round a requested ring buffer size up to a power of two that is a
+// multiple of the page size, as required by BPF_MAP_TYPE_RINGBUF.
+static unsigned long ringbuf_size_round(unsigned long size)
+{
+    unsigned long page = sysconf(_SC_PAGESIZE);
+    unsigned long rounded = page;
+
+    while (rounded < size)
+        rounded <<= 1;
+    return rounded;
+}
+
+static void usage(const char *prog)
+{
+    fprintf(stderr, "Usage: %s [--format text|json|binary] [--ringbuf-size BYTES] [--pin-root DIR]\n", prog);
+}
+
+int main(int argc, char *argv[])
+{
+    // Default to the readable format on a terminal and to framed binary
+    // records when stdout is a pipe (e.g. when run by the web backend)
+    out_format = isatty(STDOUT_FILENO) ? FORMAT_TEXT : FORMAT_BINARY;
+    for (int i = 1; i < argc; i += 2) {
+        if (i + 1 >= argc) {
+            usage(argv[0]);
+            return 1;
+        }
+        if (strcmp(argv[i], "--format") == 0) {
+            if (strcmp(argv[i + 1], "text") == 0) {
+                out_format = FORMAT_TEXT;
+            } else if (strcmp(argv[i + 1], "json") == 0) {
+                out_format = FORMAT_JSON;
+            } else if (strcmp(argv[i + 1], "binary") == 0) {
+                out_format = FORMAT_BINARY;
+            } else {
+                usage(argv[0]);
+                return 1;
+            }
+        } else if (strcmp(argv[i], "--ringbuf-size") == 0) {
+            char *end;
+
+            ringbuf_size = strtoul(argv[i + 1], &end, 0);
+            if (*end || !ringbuf_size) {
+                usage(argv[0]);
+                return 1;
+            }
+            ringbuf_size = ringbuf_size_round(ringbuf_size);
+        } else if (strcmp(argv[i], "--pin-root") == 0) {
+            pin_root = argv[i + 1];
+        } else {
+            usage(argv[0]);
+            return 1;
+        }
+    }
+
     // Set up signal handlers for clean exit
     signal(SIGINT, handle_signal);
     signal(SIGTERM, handle_signal);
 
     bump_memlock_rlimit();
 
-    // Open, load, and attach the eBPF program
-    skel = exec__open();
+    // Open, load, and attach the eBPF program. Maps marked for pinning (the
+    // filters) are pinned under pin_root, or reused if already pinned there.
+    LIBBPF_OPTS(bpf_object_open_opts, open_opts, .pin_root_path = pin_root);
+    skel = exec__open_opts(&open_opts);
     if (!skel) {
         fprintf(stderr, "Failed to open eBPF skeleton!\n");
         return 1;
     }
 
+    if (ringbuf_size && bpf_map__set_max_entries(skel->maps.rb, ringbuf_size)) {
+        fprintf(stderr, "Failed to set ring buffer size to %lu bytes!\n", ringbuf_size);
+        exec__destroy(skel);
+        return 1;
+    }
+
     if (exec__load(skel)) {
         fprintf(stderr, "Failed to load eBPF skeleton!\n");
         exec__destroy(skel);
@@ -86,14 +289,44 @@ int main(void)
         return 1;
     }
 
-    fprintf(stdout, "Running... Press Ctrl+C to stop.\n");
+    int counters_fd = bpf_map__fd(skel->maps.counters);
+    int ncpus = libbpf_num_possible_cpus();
+    unsigned long long next_stats = 0;
+    int ret = 0;
 
-    // Poll the ring buffer
-    while (1) {
-        ring_buffer__poll(rb, 1000);
+    if (ncpus < 1) {
+        fprintf(stderr, "Failed to get the number of CPUs!\n");
+        cleanup();
+        return 1;
     }
 
-    // Cleanup (in case loop exits)
-    handle_signal(0);
-    return 0;
+    fprintf(stderr, "Running (ring buffer %u bytes)... Press Ctrl+C to stop.\n",
+            bpf_map__max_entries(skel->maps.rb));
+
+    // Poll the ring buffer. Records are written to the stdio buffer and
+    // flushed once per poll, so each batch reaches the pipe in a few writes.
+    // About once per second a stats record with the loss counters follows.
+    // A signal interrupts the poll (-EINTR) and ends the loop.
+    while (!exiting) {
+        unsigned long long now;
+        int err = ring_buffer__poll(rb, 1000);
+
+        if (err < 0 && err != -EINTR) {
+            fprintf(stderr, "Error polling the ring buffer: %d\n", err);
+            ret = 1;
+            break;
+        }
+        if (err > 0)
+            fflush(stdout);
+        now = realtime_ns();
+        if (now >= next_stats) {
+            write_stats(counters_fd, ncpus);
+            next_stats = now + STATS_INTERVAL_NS;
+        }
+    }
+
+    if (exiting)
+        fprintf(stderr, "\nReceived signal %d, cleaning up...\n", exiting);
+    cleanup();
+    return ret;
 }
@@ -6,6 +6,67 @@ struct exec_evt {
     pid_t tgid;
     char comm[32];
     char file[32];
+    unsigned long long cgroup_id;  // cgroup v2 id of the task (its cgroupfs inode)
 };
 
-#endif // __EXEC_H__
\ No newline at end of file
+// Per-CPU counters kept by exec.bpf.c in the `counters` map
+enum exec_counter {
+    EXEC_COUNTER_SUBMITTED,  // events submitted to the ring buffer
+    EXEC_COUNTER_DROPPED,    // events lost because the ring buffer was full
+    EXEC_COUNTER_FILTERED,   // events rejected by the filter maps
+    EXEC_COUNTER_MAX,
+};
+
+// In-kernel event filters. Each filter (comm, file prefix, cgroup id) has a
+// mode in `filter_config`; with EXEC_FILTER_ALLOW only events whose value is
+// in the filter's map are submitted, with EXEC_FILTER_DENY those events are
+// dropped. The maps are pinned by name and updated live by the web backend
+// (web/backend/collector_filters.py).
+#define EXEC_FILTER_OFF 0
+#define EXEC_FILTER_ALLOW 1
+#define EXEC_FILTER_DENY 2
+
+struct exec_filter_config {
+    unsigned int comm_mode;
+    unsigned int file_mode;
+    unsigned int cgroup_mode;
+};
+
+#define EXEC_COMM_LEN 16     // TASK_COMM_LEN, key of `comm_filter`
+
+// Key of the `file_filter` LPM trie: prefixlen is in bits. The filename is
+// read with bpf_probe_read_user_str(), so data[31] is always NUL and stored
+// prefixes are at most 31 bytes long.
+struct exec_file_key {
+    unsigned int prefixlen;
+    char data[32];
+};
+
+// Framed record written by the user-space collector in binary mode.
+// Every record starts with this header; `len` is the size of the payload
+// that follows it. Keep in sync with web/backend/collector_protocol.py.
+#define EXEC_RECORD_EVT 1    // payload: struct exec_record_evt
+#define EXEC_RECORD_STATS 2  // payload: struct exec_record_stats
+
+struct exec_record_hdr {
+    unsigned int len;        // payload size in bytes
+    unsigned int type;       // EXEC_RECORD_*
+};
+
+struct exec_record_evt {
+    unsigned long long ts_ns; // CLOCK_REALTIME when the event was consumed
+    struct exec_evt evt;
+};
+
+// Written about once per second. Kernel counters are summed over all CPUs;
+// all counters start at zero when the collector starts.
+struct exec_record_stats {
+    unsigned long long ts_ns;         // CLOCK_REALTIME when the counters were read
+    unsigned long long submitted;     // EXEC_COUNTER_SUBMITTED
+    unsigned long long dropped;       // EXEC_COUNTER_DROPPED
+    unsigned long long consumed;      // events read from the ring buffer by user space
+    unsigned long long ringbuf_bytes; // size of the ring buffer
+    unsigned long long filtered;      // EXEC_COUNTER_FILTERED
+};
+
+#endif // __EXEC_H__
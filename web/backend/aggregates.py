@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Streaming aggregates over collector events.
+
+Events are counted as they are ingested, one batch at a time, into
+time-bucketed windows (1 minute, 5 minutes and 1 hour by default) plus a
+per-second rate histogram for the last hour. Per-comm and per-file counts use
+BoundedCounter, a heavy-hitter summary with a fixed capacity, so memory stays
+bounded no matter how many distinct filenames are seen. Reading the stats
+costs O(buckets * capacity), independent of the event history size.
+"""
+import heapq
+import threading
+import time
+from collections import Counter
+from operator import attrgetter
+
+_get_comm = attrgetter("comm")
+_get_file = attrgetter("file")
+
+
+class BoundedCounter:
+    """
+    Approximate counter that keeps at most `capacity` keys.
+
+    Keys are counted exactly until the counter holds 2 * capacity keys; it is
+    then pruned back to the `capacity` largest. `error` is the largest count
+    ever pruned, an upper bound on how much any reported count may be
+    underestimated (and the threshold below which keys may be missing).
+    """
+    __slots__ = ("capacity", "counts", "error")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = Counter()
+        self.error = 0
+
+    def update(self, counts):
+        self.counts.update(counts)
+        if len(self.counts) > 2 * self.capacity:
+            self._prune()
+
+    def _prune(self):
+        keep = heapq.nlargest(self.capacity, self.counts.items(), key=lambda item: item[1])
+        kept = dict(keep)
+        dropped_max = max((c for k, c in self.counts.items() if k not in kept), default=0)
+        self.error = max(self.error, dropped_max)
+        self.counts = Counter(kept)
+
+
+class WindowedCounts:
+    """Per-comm and per-file counts over a sliding window of fixed buckets."""
+
+    def __init__(self, window_seconds, buckets=60, capacity=256):
+        self.window_seconds = window_seconds
+        self.bucket_seconds = window_seconds / buckets
+        self.capacity = capacity
+        # bucket number -> [total, comm BoundedCounter, file BoundedCounter]
+        self.buckets = {}
+
+    def add(self, now, total, comm_counts, file_counts):
+        bucket_id = int(now // self.bucket_seconds)
+        bucket = self.buckets.get(bucket_id)
+        if bucket is None:
+            bucket = self.buckets[bucket_id] = [0, BoundedCounter(self.capacity), BoundedCounter(self.capacity)]
+            self._expire(bucket_id)
+        bucket[0] += total
+        bucket[1].update(comm_counts)
+        bucket[2].update(file_counts)
+
+    def _expire(self, current_id):
+        oldest = current_id - int(self.window_seconds / self.bucket_seconds) + 1
+        for bucket_id in [b for b in self.buckets if b < oldest]:
+            del self.buckets[bucket_id]
+
+    def snapshot(self, now, top_n):
+        self._expire(int(now // self.bucket_seconds))
+        total = 0
+        comms = Counter()
+        files = Counter()
+        error = 0
+        for count, comm_counter, file_counter in self.buckets.values():
+            total += count
+            comms.update(comm_counter.counts)
+            files.update(file_counter.counts)
+            error += max(comm_counter.error, file_counter.error)
+        seconds = self.window_seconds
+        return {
+            "window_seconds": seconds,
+            "total": total,
+            "rate": round(total / seconds, 3),
+            "top_comm": [
+                {"comm": comm, "count": count, "rate": round(count / seconds, 3)}
+                for comm, count in comms.most_common(top_n)
+            ],
+            "top_file": [
+                {"file": file, "count": count}
+                for file, count in files.most_common(top_n)
+            ],
+            "max_error": error,
+        }
+
+
+class RateHistogram:
+    """Exec count per second for the last `seconds` seconds."""
+
+    def __init__(self, seconds=3600):
+        self.seconds = seconds
+        self.counts = [0] * seconds
+        self.last_second = None
+
+    def add(self, now, count):
+        second = int(now)
+        self._advance(second)
+        self.counts[second % self.seconds] += count
+
+    def _advance(self, second):
+        if self.last_second is None:
+            self.last_second = second
+            return
+        if second <= self.last_second:
+            return
+        # Zero the slots of the seconds that passed without events
+        for s in range(max(self.last_second + 1, second - self.seconds + 1), second + 1):
+            self.counts[s % self.seconds] = 0
+        self.last_second = second
+
+    def series(self, now, span, step):
+        """Return (start_second, step, counts) for `span` seconds in `step`-second bins."""
+        second = int(now)
+        self._advance(second)
+        span = max(1, min(span, self.seconds))
+        step = max(1, min(step, span))
+        start = second - span + 1
+        values = []
+        for bin_start in range(start, second + 1, step):
+            values.append(sum(self.counts[s % self.seconds]
+                              for s in range(bin_start, min(bin_start + step, second + 1))))
+        return start, step, values
+
+
+class ExecAggregates:
+    """
+    Windowed exec statistics fed from collector batches, plus cumulative
+    per-comm totals for counters. The totals track at most `max_comms`
+    distinct comms; events of any further comm are added to `other_comms`,
+    so every total only ever grows. reset() clears the windows, not the
+    cumulative totals.
+    """
+
+    DEFAULT_WINDOWS = {"1m": 60, "5m": 300, "1h": 3600}
+
+    def __init__(self, windows=None, capacity=256, max_comms=500, clock=time.time):
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.windows = {
+            name: WindowedCounts(seconds, capacity=capacity)
+            for name, seconds in (windows or self.DEFAULT_WINDOWS).items()
+        }
+        self.rates = RateHistogram(max(seconds for seconds in (windows or self.DEFAULT_WINDOWS).values()))
+        self.total = 0
+        self.max_comms = max_comms
+        self.ingested = 0
+        self.comm_totals = {}
+        self.other_comms = 0
+
+    def add_batch(self, events):
+        """Count a batch of ExecEvents (called from the collector reader)."""
+        if not events:
+            return
+        comm_counts = Counter(map(_get_comm, events))
+        file_counts = Counter(map(_get_file, events))
+        now = self.clock()
+        with self.lock:
+            self.total += len(events)
+            self.rates.add(now, len(events))
+            for window in self.windows.values():
+                window.add(now, len(events), comm_counts, file_counts)
+            self.ingested += len(events)
+            totals = self.comm_totals
+            for comm, count in comm_counts.items():
+                if comm in totals:
+                    totals[comm] += count
+                elif len(totals) < self.max_comms:
+                    totals[comm] = count
+                else:
+                    self.other_comms += count
+
+    def reset(self):
+        with self.lock:
+            for name, window in self.windows.items():
+                self.windows[name] = WindowedCounts(window.window_seconds, capacity=window.capacity)
+            self.rates = RateHistogram(self.rates.seconds)
+            self.total = 0
+
+    def totals(self):
+        """Return (total, {comm: total}, other_comms) since the aggregates were created."""
+        with self.lock:
+            return self.ingested, dict(self.comm_totals), self.other_comms
+
+    def snapshot(self, top_n=10, series_seconds=300, series_step=1):
+        now = self.clock()
+        with self.lock:
+            start, step, counts = self.rates.series(now, series_seconds, series_step)
+            return {
+                "total": self.total,
+                "windows": {name: window.snapshot(now, top_n) for name, window in self.windows.items()},
+                "rate_series": {"start": start, "step": step, "counts": counts},
+            }
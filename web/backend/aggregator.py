@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Cluster aggregation over several node backends.
+
+An aggregator instance of app.py follows the /api/collector_events cursor API
+of every configured node and merges their events into one local EventStore:
+
+- Each node has its own poller thread and a small pool of persistent
+  keep-alive HTTP/1.1 connections, so nodes are fetched concurrently and a
+  slow node only delays its own poller.
+- Per node, the aggregator tracks the sequence cursor it has consumed, events
+  lost to evictions on the node (cursor gaps) and node restarts (the node's
+  sequence numbers went backwards).
+- Fetched events wait in a per-node buffer. A merger releases them in
+  timestamp order up to the watermark: the lowest "complete up to" time of
+  the healthy nodes. A node that has not answered for `lag_seconds` is marked
+  lagging and no longer holds the watermark back, and nothing is held for
+  longer than `max_hold` seconds, so a lagging node degrades only its own
+  data: its events arrive late instead of stalling everyone else.
+- The store only ever receives events in timestamp order, which its time
+  range queries rely on. An event older than what was already released is
+  late: it is counted and kept in a bounded side buffer (`late_events()`)
+  instead of being stored.
+
+Merged events are ClusterEvents, which carry the node name and the node's
+sequence number next to the ExecEvent fields, so the usual indexes,
+aggregates and queries work on them unchanged.
+"""
+import heapq
+import http.client
+import json
+import queue
+import threading
+import time
+import urllib.parse
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from operator import attrgetter
+
+_get_ts = attrgetter("ts")
+
+POD_FIELDS = ("container_id", "namespace", "pod", "container")
+
+
+class ClusterEvent(namedtuple("ClusterEvent", ["ts", "pid", "tgid", "comm", "file", "cgroup_id",
+                                               "node", "node_seq", "pod"])):
+    """An exec event received from a node; `pod` holds the node's pod fields (or None)."""
+    __slots__ = ()
+
+    @classmethod
+    def from_dict(cls, node, node_seq, data):
+        pod = {k: data[k] for k in POD_FIELDS if data.get(k) is not None} or None
+        return cls(data["ts"], data["pid"], data["tgid"], data["comm"], data["file"],
+                   data.get("cgroup_id", 0), node, node_seq, pod)
+
+    def to_dict(self):
+        data = {
+            "ts": self.ts,
+            "pid": self.pid,
+            "tgid": self.tgid,
+            "comm": self.comm,
+            "file": self.file,
+            "cgroup_id": self.cgroup_id,
+            "node": self.node,
+            "node_seq": self.node_seq,
+        }
+        if self.pod:
+            data.update(self.pod)
+        return data
+
+    def format_line(self):
+        return f"[{self.node}] tgid: {self.tgid} <> pid: {self.pid} -- comm: {self.comm} <> file: {self.file}"
+
+
+def parse_nodes(spec):
+    """Parse "name=http://host:port,..." into {name: url}; a bare URL is named after its host:port."""
+    nodes = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, url = item.partition("=")
+        if not sep:
+            url = name
+            name = urllib.parse.urlsplit(url).netloc
+        if not url.startswith(("http://", "https://")):
+            raise ValueError(f"Node URL must be http(s): {url!r}")
+        if name in nodes:
+            raise ValueError(f"Duplicate node name: {name!r}")
+        nodes[name] = url.rstrip("/")
+    return nodes
+
+
+class NodeError(Exception):
+    """A node request failed (connection error, timeout, bad status or body)."""
+
+
+# ------------------------
+# Connections
+# ------------------------
+class NodeConnectionPool:
+    """
+    Keep-alive HTTP connections to one node. A connection is taken for the
+    duration of one request and returned afterwards; connections that failed
+    or that the server closed are discarded and re-created on demand.
+    """
+
+    def __init__(self, base_url, size=4, timeout=2.0):
+        parts = urllib.parse.urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        self.connects = 0
+        self.requests = 0
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.connects += 1
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    @contextmanager
+    def _connection(self):
+        try:
+            conn = self._idle.get_nowait()
+            fresh = False
+        except queue.Empty:
+            conn = self._connect()
+            fresh = True
+        try:
+            yield conn, fresh
+        except BaseException:
+            conn.close()
+            raise
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def get_json(self, path, params=None):
+        """GET `path` and return the decoded JSON body; raises NodeError."""
+        url = self.prefix + path
+        if params:
+            url += "?" + urllib.parse.urlencode({k: v for k, v in params.items() if v is not None})
+        while True:
+            try:
+                with self._connection() as (conn, fresh):
+                    try:
+                        conn.request("GET", url, headers={"Accept": "application/json"})
+                        response = conn.getresponse()
+                        body = response.read()
+                    except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                        if fresh:
+                            raise
+                        # The server closed an idle keep-alive connection; retry on a new one
+                        raise _StaleConnection()
+                    if response.will_close:
+                        conn.close()
+            except _StaleConnection:
+                continue
+            except (OSError, http.client.HTTPException) as e:
+                raise NodeError(f"{type(e).__name__}: {e}" if str(e) else type(e).__name__)
+            self.requests += 1
+            if response.status != 200:
+                raise NodeError(f"HTTP {response.status} from {url}")
+            try:
+                return json.loads(body)
+            except ValueError as e:
+                raise NodeError(f"invalid JSON from {url}: {e}")
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class _StaleConnection(Exception):
+    pass
+
+
+# ------------------------
+# Per-node state
+# ------------------------
+class Node:
+    def __init__(self, name, url, pool):
+        self.name = name
+        self.url = url
+        self.pool = pool
+        self.cursor = None          # last node sequence number consumed
+        self.node_last_seq = None   # newest sequence number on the node at the last fetch
+        self.pending = deque()      # fetched ClusterEvents not merged yet
+        self.watermark = 0          # events up to this ts (ns) have been fetched
+        self.last_ok = None         # monotonic time of the last successful fetch
+        self.last_error = None
+        self.errors = 0
+        self.fetched = 0
+        self.lost = 0               # evicted on the node before they were fetched
+        self.restarts = 0
+        self.late = 0               # arrived after newer events of other nodes were released
+        self.fetch_ms = 0.0
+
+    def state(self, now, lag_seconds):
+        if self.last_ok is None:
+            return "down" if self.errors else "connecting"
+        if now - self.last_ok > lag_seconds:
+            return "lagging"
+        return "ok"
+
+    def backlog(self):
+        if self.node_last_seq is None or self.cursor is None:
+            return None
+        return max(self.node_last_seq - self.cursor, 0)
+
+
+class ClusterAggregator:
+    def __init__(self, nodes, store, poll_interval=0.5, page_limit=1000, timeout=2.0, lag_seconds=5.0,
+                 max_hold=2.0, skew=0.5, max_pending=100000, pool_size=4, late_capacity=10000, on_batch=None,
+                 logger=None):
+        self.store = store
+        self.poll_interval = poll_interval
+        self.page_limit = page_limit
+        self.timeout = timeout
+        self.lag_seconds = lag_seconds
+        self.max_hold_ns = int(max_hold * 1e9)
+        self.skew_ns = int(skew * 1e9)
+        self.max_pending = max_pending
+        self.on_batch = on_batch
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.nodes = {
+            name: Node(name, url, NodeConnectionPool(url, size=pool_size, timeout=timeout))
+            for name, url in nodes.items()
+        }
+        self._executor = ThreadPoolExecutor(max_workers=max(len(self.nodes), 1), thread_name_prefix="cluster-fanout")
+        self._stop = threading.Event()
+        self._threads = []
+        self.released_ts = 0     # newest ts merged so far
+        self.merged = 0
+        self.late = 0
+        self._late_events = deque(maxlen=late_capacity)   # newest late events, not in the store
+
+    def start(self):
+        if self._threads:
+            return self
+        for node in self.nodes.values():
+            self._threads.append(threading.Thread(target=self._poll, args=(node,),
+                                                  name=f"cluster-poll-{node.name}", daemon=True))
+        self._threads.append(threading.Thread(target=self._merge_loop, name="cluster-merge", daemon=True))
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for node in self.nodes.values():
+            node.pool.close()
+
+    # ------------------------
+    # Pollers (one thread per node)
+    # ------------------------
+    def _poll(self, node):
+        while not self._stop.is_set():
+            try:
+                more = self._fetch(node)
+            except NodeError as e:
+                with self.lock:
+                    node.errors += 1
+                    if str(e) != node.last_error and self.logger:
+                        self.logger.warning(f"Cluster node {node.name} ({node.url}): {e}")
+                    node.last_error = str(e)
+                more = False
+            if not more:
+                self._stop.wait(self.poll_interval)
+
+    def _fetch(self, node):
+        """Fetch one page from `node`; return True if more events are waiting on the node."""
+        requested = time.time_ns()
+        started = time.monotonic()
+        params = {"limit": self.page_limit}
+        if node.cursor is not None:
+            params["since"] = node.cursor
+        page = node.pool.get_json("/api/collector_events", params)
+        try:
+            raw_events = page["events"]
+            first_seq, last_seq = page["first_seq"], page["last_seq"]
+            events = [ClusterEvent.from_dict(node.name, first_seq + i, data) for i, data in enumerate(raw_events)]
+        except (KeyError, TypeError) as e:
+            raise NodeError(f"unexpected response: {e!r}")
+
+        with self.lock:
+            node.fetch_ms = (time.monotonic() - started) * 1000
+            node.last_ok = time.monotonic()
+            node.last_error = None
+            if node.cursor is not None and last_seq < node.cursor:
+                # The node restarted without its journal; follow its new sequence
+                node.restarts += 1
+                node.cursor = 0
+                node.node_last_seq = last_seq
+                return True
+            if node.cursor is not None and page.get("gap"):
+                node.lost += first_seq - node.cursor - 1
+            if events:
+                node.cursor = first_seq + len(events) - 1
+                node.pending.extend(events)
+                node.fetched += len(events)
+            elif node.cursor is None:
+                node.cursor = last_seq
+            node.node_last_seq = last_seq
+            caught_up = node.cursor >= last_seq
+            if caught_up:
+                # Everything the node had when we asked is here; allow for events
+                # still in flight between its collector and its store
+                node.watermark = max(node.watermark, requested - self.skew_ns)
+            elif events:
+                node.watermark = max(node.watermark, events[-1].ts)
+        return not caught_up
+
+    # ------------------------
+    # Merger
+    # ------------------------
+    def _merge_loop(self):
+        while not self._stop.wait(min(self.poll_interval, 0.1)):
+            try:
+                self.merge()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Cluster merge failed: {e}")
+
+    def merge(self):
+        """
+        Move buffered events up to the current watermark into the store, in
+        timestamp order; late events go to the side buffer instead. Returns
+        the number of events stored.
+        """
+        now_ns = time.time_ns()
+        now = time.monotonic()
+        with self.lock:
+            marks = [node.watermark for node in self.nodes.values()
+                     if node.state(now, self.lag_seconds) == "ok"]
+            floor = now_ns - self.max_hold_ns
+            watermark = max(min(marks), floor) if marks else floor
+            runs = []
+            for node in self.nodes.values():
+                pending = node.pending
+                run = []
+                while pending and (pending[0].ts <= watermark or len(pending) > self.max_pending):
+                    run.append(pending.popleft())
+                if run:
+                    runs.append(run)
+            if not runs:
+                return 0
+            merged = list(heapq.merge(*runs, key=_get_ts)) if len(runs) > 1 else runs[0]
+            released = self.released_ts
+            events = []
+            for event in merged:
+                if event.ts < released:
+                    self.late += 1
+                    self.nodes[event.node].late += 1
+                    self._late_events.append(event)
+                else:
+                    released = event.ts
+                    events.append(event)
+            self.released_ts = released
+            if not events:
+                return 0
+            self.merged += len(events)
+            # Store the batch under our lock so batches keep their order
+            last_seq = self.store.extend(events)
+        if self.on_batch is not None:
+            self.on_batch(last_seq - len(events) + 1, events)
+        return len(events)
+
+    def late_events(self, limit=None):
+        """Return the newest late events (oldest first), at most `limit`."""
+        with self.lock:
+            events = list(self._late_events)
+        return events[-limit:] if limit else events
+
+    # ------------------------
+    # Fan-out requests and status
+    # ------------------------
+    def fan_out(self, path, params=None, timeout=None):
+        """
+        GET `path` from every node concurrently. Returns {node: {"ok": data}
+        or {"error": message}}; a node that does not answer within `timeout`
+        is reported as an error without waiting for it.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        futures = {name: self._executor.submit(node.pool.get_json, path, params)
+                   for name, node in self.nodes.items()}
+        deadline = time.monotonic() + timeout
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = {"ok": future.result(max(deadline - time.monotonic(), 0))}
+            except NodeError as e:
+                results[name] = {"error": str(e)}
+            except FutureTimeout:
+                results[name] = {"error": f"no answer within {timeout}s"}
+        return results
+
+    def node_status(self):
+        now = time.monotonic()
+        with self.lock:
+            return {
+                name: {
+                    "url": node.url,
+                    "state": node.state(now, self.lag_seconds),
+                    "cursor": node.cursor,
+                    "node_last_seq": node.node_last_seq,
+                    "backlog": node.backlog(),
+                    "pending": len(node.pending),
+                    "watermark": node.watermark / 1e9 if node.watermark else None,
+                    "last_ok_seconds_ago": round(now - node.last_ok, 3) if node.last_ok else None,
+                    "last_error": node.last_error,
+                    "errors": node.errors,
+                    "fetched": node.fetched,
+                    "lost": node.lost,
+                    "late": node.late,
+                    "restarts": node.restarts,
+                    "fetch_ms": round(node.fetch_ms, 2),
+                    "connections": node.pool.connects,
+                    "requests": node.pool.requests,
+                }
+                for name, node in self.nodes.items()
+            }
+
+    def stats(self):
+        with self.lock:
+            return {
+                "nodes": len(self.nodes),
+                "merged": self.merged,
+                "late": self.late,
+                "late_buffered": len(self._late_events),
+                "released_ts": self.released_ts / 1e9 if self.released_ts else None,
+                "pending": sum(len(node.pending) for node in self.nodes.values()),
+            }
@@ -1,11 +1,35 @@
 #!/usr/bin/env python3
 import os
 import json
+import hashlib
+import shlex
 import subprocess
 import threading
 import time
+from datetime import datetime
 from flask import Flask, request, jsonify, render_template, Response
 
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+from aggregates import ExecAggregates
+from aggregator import ClusterAggregator, parse_nodes
+from bpf_backend import create_backend
+from cache import SingleFlightCache
+from collector_filters import CollectorFilters, FilterError, FiltersUnavailable
+from collector_protocol import event_size, make_decoder
+from event_index import ExecEventIndex, query_events
+from event_store import EventStore
+from host_metrics import HostMetricsSampler
+from journal import Journal
+from map_views import MapViews
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, LatencyHistogram, MetricsWriter
+from pod_metadata import PodResolver, create_metadata_source
+from program_stats import ProgramStatsSampler
+from supervisor import Supervisor, validate_limits
+
 # Since app.py is inside web/, set static_folder to "static" and template_folder to "templates"
 app = Flask(__name__, static_folder="../frontend/static", template_folder="../frontend/templates")
 
@@ -15,20 +39,199 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 EBPF_SRC_DIR = os.path.join(BASE_DIR, "../ebpf", "exec_syscall")
 USERSPACE_DIR = os.path.join(BASE_DIR, "../userspace")
 
-# Global list and lock for storing collector events (for eBPF)
-collected_events = []
-events_lock = threading.Lock()
-
-# Global variables for controlling the eBPF collector
-collector_started = False
-collector_thread = None
-collector_proc = None  # Process for the eBPF collector
-
-# Global variables for the userspace program
-userspace_proc = None      # Process for the userspace program
-userspace_thread = None    # Thread that reads its output
-userspace_output = []      # List to store the output lines
-userspace_lock = threading.Lock()
+# How long (seconds) the /api/programs listing is cached between backend lookups
+PROGRAMS_CACHE_TTL = float(os.environ.get("K8SSCOPE_PROGRAMS_CACHE_TTL", 2.0))
+
+# How eBPF objects are inspected: "auto" (bpf syscall when privileged, else
+# bpftool), "syscall" or "bpftool"
+BPF_BACKEND = os.environ.get("K8SSCOPE_BPF_BACKEND", "auto")
+
+# How long (seconds) a map read is shared between /api/maps/<id> requests,
+# and the page size limits of those requests
+MAP_CACHE_TTL = float(os.environ.get("K8SSCOPE_MAP_CACHE_TTL", 1.0))
+MAP_PAGE_LIMIT = 500
+MAP_PAGE_MAX_LIMIT = 10000
+
+# Sampling of per-program run_time_ns/run_cnt: every PROG_STATS_INTERVAL
+# seconds (opt-in; 0 disables), with run-time stats enabled only for the first
+# PROG_STATS_WINDOW seconds of each interval (0 = leave kernel.bpf_stats_enabled
+# alone and sample continuously). One hour of samples is kept per program.
+# On the bpftool backend every sample forks sudo bpftool (and, in window mode,
+# sudo sysctl), so the interval is raised to at least
+# PROG_STATS_BPFTOOL_MIN_INTERVAL there.
+PROG_STATS_INTERVAL = float(os.environ.get("K8SSCOPE_PROG_STATS_INTERVAL", 0))
+PROG_STATS_WINDOW = float(os.environ.get("K8SSCOPE_PROG_STATS_WINDOW", 0.25))
+PROG_STATS_BPFTOOL_MIN_INTERVAL = 30.0
+PROG_STATS_HISTORY = 3600
+
+# Sampling of host and process (backend, collector, userspace program) CPU,
+# memory, context switch and I/O rates every HOST_METRICS_INTERVAL seconds
+# (0 disables; needs psutil). One hour of samples is kept.
+HOST_METRICS_INTERVAL = float(os.environ.get("K8SSCOPE_HOST_METRICS_INTERVAL", 1.0))
+HOST_METRICS_HISTORY = 3600
+
+# Capacity of the in-memory event stores (oldest events are evicted first)
+EVENT_STORE_MAX_EVENTS = int(os.environ.get("K8SSCOPE_MAX_EVENTS", 100000))
+EVENT_STORE_MAX_BYTES = int(os.environ.get("K8SSCOPE_MAX_EVENT_BYTES", 64 * 1024 * 1024))
+# Default and maximum number of events returned by a single read
+EVENT_READ_LIMIT = 1000
+EVENT_READ_MAX_LIMIT = 10000
+# Maximum number of matches returned by one query page
+QUERY_MAX_LIMIT = 1000
+# Per-subscriber queue size (in batches) for streaming clients, and how often
+# an idle stream sends a keepalive comment
+SSE_QUEUE_BATCHES = 256
+SSE_KEEPALIVE_SECONDS = 15
+# Maximum number of concurrently open event streams. Each stream occupies a
+# server thread, so keep this below the server's thread count (see serve.py)
+SSE_MAX_STREAMS = int(os.environ.get("K8SSCOPE_MAX_STREAMS", 16))
+# Longest time (seconds) a bpftool/sudo command may run before it is killed
+COMMAND_TIMEOUT = float(os.environ.get("K8SSCOPE_COMMAND_TIMEOUT", 30))
+
+# Output format requested from the exec collector ("binary" or "json")
+COLLECTOR_FORMAT = os.environ.get("K8SSCOPE_COLLECTOR_FORMAT", "binary")
+# Default size of the collector's BPF ring buffer (rounded up to a power of
+# two); can be overridden per start with "ringbuf_bytes"
+COLLECTOR_RINGBUF_BYTES = int(os.environ.get("K8SSCOPE_RINGBUF_BYTES", 256 * 1024))
+# bpffs directory where the collector pins its filter maps
+COLLECTOR_PIN_ROOT = os.environ.get("K8SSCOPE_PIN_ROOT", "/sys/fs/bpf/k8sscope")
+# Where pod names for container cgroups come from: "file:<PodList JSON>",
+# "kubelet:<url of a /pods endpoint>" or "" (container ids only)
+POD_METADATA_SOURCE = os.environ.get("K8SSCOPE_POD_METADATA", "")
+# Collector stats records older than this mark the collector as stale
+COLLECTOR_STATS_STALE_SECONDS = 5
+# Aggregator mode: node backends to follow, as "name=http://host:port,...".
+# Their collector events are merged by timestamp under /api/cluster/*. A node
+# that has not answered for K8SSCOPE_NODE_LAG_SECONDS stops holding back the
+# merge; no event is held back longer than K8SSCOPE_CLUSTER_MAX_HOLD seconds.
+CLUSTER_NODES = os.environ.get("K8SSCOPE_NODES", "")
+CLUSTER_POLL_INTERVAL = float(os.environ.get("K8SSCOPE_NODE_POLL_INTERVAL", 0.5))
+CLUSTER_NODE_TIMEOUT = float(os.environ.get("K8SSCOPE_NODE_TIMEOUT", 2.0))
+CLUSTER_LAG_SECONDS = float(os.environ.get("K8SSCOPE_NODE_LAG_SECONDS", 5.0))
+CLUSTER_MAX_HOLD = float(os.environ.get("K8SSCOPE_CLUSTER_MAX_HOLD", 2.0))
+# Maximum number of bytes read from a child process pipe at once
+PIPE_READ_SIZE = 64 * 1024
+
+# Prefix of privileged commands (bpftool, the collector and userspace
+# programs, kill); set it to "" when the backend already runs as root
+PRIVILEGE_PREFIX = shlex.split(os.environ.get("K8SSCOPE_SUDO", "sudo"))
+# Collector binary; the top-level Makefile builds it into the userspace directory
+COLLECTOR_BIN = os.environ.get("K8SSCOPE_COLLECTOR_BIN", os.path.join(USERSPACE_DIR, "exec"))
+# Restart backoff of crashed processes (doubles per crash, up to the max); a
+# run of PROCESS_STABLE_SECONDS resets it
+PROCESS_BACKOFF_INITIAL = float(os.environ.get("K8SSCOPE_RESTART_BACKOFF", 1.0))
+PROCESS_BACKOFF_MAX = float(os.environ.get("K8SSCOPE_RESTART_BACKOFF_MAX", 60.0))
+PROCESS_STABLE_SECONDS = 30
+# Seconds between SIGTERM and SIGKILL when stopping a process
+PROCESS_STOP_TIMEOUT = float(os.environ.get("K8SSCOPE_STOP_TIMEOUT", 5.0))
+
+# On-disk journal of collector events (set K8SSCOPE_JOURNAL_DIR="" to disable)
+JOURNAL_DIR = os.environ.get("K8SSCOPE_JOURNAL_DIR", os.path.join(BASE_DIR, "../journal"))
+JOURNAL_SEGMENT_BYTES = int(os.environ.get("K8SSCOPE_JOURNAL_SEGMENT_BYTES", 64 * 1024 * 1024))
+JOURNAL_SEGMENT_SECONDS = int(os.environ.get("K8SSCOPE_JOURNAL_SEGMENT_SECONDS", 3600))
+JOURNAL_RETENTION_BYTES = int(os.environ.get("K8SSCOPE_JOURNAL_RETENTION_BYTES", 1024 * 1024 * 1024))
+JOURNAL_RETENTION_SECONDS = int(os.environ.get("K8SSCOPE_JOURNAL_RETENTION_SECONDS", 7 * 24 * 3600))
+
+collector_journal = None
+if JOURNAL_DIR:
+    collector_journal = Journal(
+        JOURNAL_DIR,
+        segment_max_bytes=JOURNAL_SEGMENT_BYTES,
+        segment_max_age=JOURNAL_SEGMENT_SECONDS,
+        retention_bytes=JOURNAL_RETENTION_BYTES,
+        retention_age=JOURNAL_RETENTION_SECONDS,
+        logger=app.logger,
+    )
+
+
+def create_collector_store():
+    """
+    Create the collector event store. With a journal, the newest events are
+    replayed into it so history and sequence numbers survive restarts.
+    """
+    if collector_journal is None:
+        return EventStore(EVENT_STORE_MAX_EVENTS, EVENT_STORE_MAX_BYTES, sizeof=event_size,
+                          index=collected_events_index)
+    start_seq, events = collector_journal.replay_tail(EVENT_STORE_MAX_EVENTS)
+    store = EventStore(EVENT_STORE_MAX_EVENTS, EVENT_STORE_MAX_BYTES, sizeof=event_size,
+                       start_seq=start_seq, index=collected_events_index)
+    store.extend(events)
+    return store
+
+
+# Bounded store for collector events (for eBPF); holds ExecEvent records.
+# The index keeps per-comm and per-file posting lists for the query API.
+collected_events_index = ExecEventIndex()
+collected_events = create_collector_store()
+# Windowed per-comm/per-file counts and exec rates, fed by the collector reader
+collector_stats = ExecAggregates()
+# Background cgroup id -> container/pod resolution for collector events
+pod_resolver = PodResolver(create_metadata_source(POD_METADATA_SOURCE), logger=app.logger).start()
+
+# Merged events of all nodes in aggregator mode, with their own index and aggregates
+cluster_events_index = ExecEventIndex()
+cluster_events = EventStore(EVENT_STORE_MAX_EVENTS, EVENT_STORE_MAX_BYTES, sizeof=event_size,
+                            index=cluster_events_index)
+cluster_stats = ExecAggregates()
+cluster = None
+if CLUSTER_NODES:
+    cluster = ClusterAggregator(
+        parse_nodes(CLUSTER_NODES),
+        cluster_events,
+        poll_interval=CLUSTER_POLL_INTERVAL,
+        page_limit=EVENT_READ_MAX_LIMIT,
+        timeout=CLUSTER_NODE_TIMEOUT,
+        lag_seconds=CLUSTER_LAG_SECONDS,
+        max_hold=CLUSTER_MAX_HOLD,
+        on_batch=lambda first_seq, events: cluster_stats.add_batch(events),
+        logger=app.logger,
+    ).start()
+
+# Collector and userspace processes by id. The legacy endpoints drive the
+# DEFAULT_COLLECTOR and DEFAULT_USERSPACE entries; /api/processes adds more.
+DEFAULT_COLLECTOR = "collector"
+DEFAULT_USERSPACE = "userspace"
+# Names used by host_metrics and the metrics store labels, and the ids of the
+# legacy endpoints' processes (which expect their own store and decoder)
+RESERVED_PROCESS_IDS = {"backend", "cluster", DEFAULT_COLLECTOR, DEFAULT_USERSPACE}
+supervisor = Supervisor(
+    app.logger,
+    prefix=PRIVILEGE_PREFIX,
+    backoff_initial=PROCESS_BACKOFF_INITIAL,
+    backoff_max=PROCESS_BACKOFF_MAX,
+    stable_seconds=PROCESS_STABLE_SECONDS,
+    stop_timeout=PROCESS_STOP_TIMEOUT,
+    read_size=PIPE_READ_SIZE,
+)
+
+# Serializes defining and starting processes through the API, so concurrent
+# requests cannot register the same id twice or replace a process being started
+process_lock = threading.Lock()
+
+# Output of the default userspace program
+userspace_output = EventStore(EVENT_STORE_MAX_EVENTS, EVENT_STORE_MAX_BYTES)
+
+
+def tracked_processes():
+    """Pids sampled by host_metrics: this server and the running supervised processes."""
+    return {**supervisor.pids(), "backend": os.getpid()}
+
+
+def process_reader(process_id):
+    """PipeReader of the current (or last) run of a process, or None."""
+    process = supervisor.get(process_id)
+    return process.reader if process is not None else None
+
+
+host_metrics = None
+if psutil is not None and HOST_METRICS_INTERVAL > 0:
+    host_metrics = HostMetricsSampler(
+        psutil,
+        tracked_processes,
+        interval=HOST_METRICS_INTERVAL,
+        capacity=max(int(HOST_METRICS_HISTORY / HOST_METRICS_INTERVAL), 1),
+        logger=app.logger,
+    ).start()
 
 
 def make_absolute_pin_path(pin_path):
@@ -41,28 +244,73 @@ def make_absolute_pin_path(pin_path):
     return pin_path
 
 
+# Duration of sudo commands by command ("bpftool prog show", "sysctl", ...)
+command_latency = LatencyHistogram()
+
+
 def run_command(cmd):
-    """Run a command with sudo and capture output."""
+    """Run a command with the privilege prefix (sudo) and capture output."""
+    started = time.monotonic()
     try:
-        result = subprocess.run(["sudo"] + cmd, check=True, capture_output=True, text=True)
+        result = subprocess.run(PRIVILEGE_PREFIX + cmd, check=True, capture_output=True, text=True,
+                                timeout=COMMAND_TIMEOUT)
         return result.stdout, result.stderr, None
     except subprocess.CalledProcessError as e:
         error_message = e.stderr.strip() if e.stderr else "Unknown error"
         return None, None, error_message
+    except subprocess.TimeoutExpired:
+        return None, None, f"{cmd[0]} did not finish within {COMMAND_TIMEOUT:g}s"
+    finally:
+        command_latency.observe(" ".join(cmd[:3]) if cmd[0] == "bpftool" else cmd[0],
+                                time.monotonic() - started)
+
+
+bpf = create_backend(BPF_BACKEND, run_command, logger=app.logger)
+app.logger.info(f"Using the {bpf.name} eBPF backend")
+map_views = MapViews(bpf, ttl=MAP_CACHE_TTL)
+collector_filters = CollectorFilters(bpf, COLLECTOR_PIN_ROOT)
+
+prog_stats_interval = PROG_STATS_INTERVAL or 1.0
+if bpf.name == "bpftool" and prog_stats_interval < PROG_STATS_BPFTOOL_MIN_INTERVAL:
+    if PROG_STATS_INTERVAL > 0:
+        app.logger.warning(f"Program stats interval raised to {PROG_STATS_BPFTOOL_MIN_INTERVAL:g}s "
+                           f"on the bpftool backend (every sample forks sudo)")
+    prog_stats_interval = PROG_STATS_BPFTOOL_MIN_INTERVAL
+program_stats = ProgramStatsSampler(
+    bpf,
+    interval=prog_stats_interval,
+    window=PROG_STATS_WINDOW,
+    capacity=max(int(PROG_STATS_HISTORY / prog_stats_interval), 1),
+    logger=app.logger,
+)
+if PROG_STATS_INTERVAL > 0:
+    program_stats.start()
 
 
 def get_loaded_programs():
     """Return loaded eBPF programs with detailed information."""
-    cmd = ["bpftool", "prog", "show", "--json"]
-    stdout, _, error = run_command(cmd)
+    programs, error = bpf.list_programs()
     if error:
-        app.logger.error(f"[ERROR] bpftool prog show: {error}")
-        return []
-    try:
-        return json.loads(stdout)
-    except json.JSONDecodeError as e:
-        app.logger.error(f"[ERROR] JSON decode: {str(e)}")
+        app.logger.error(f"[ERROR] {bpf.name} prog show: {error}")
         return []
+    return programs
+
+
+def load_programs_state():
+    """
+    Build the /api/programs response body and its ETag. Called through
+    programs_cache, so concurrent requests share one backend lookup.
+    """
+    programs = [
+        f for f in os.listdir(EBPF_SRC_DIR)
+        if f.endswith(".o") and os.path.isfile(os.path.join(EBPF_SRC_DIR, f))
+    ]
+    loaded_programs = get_loaded_programs()
+    body = json.dumps({"programs": programs, "loaded": loaded_programs}, sort_keys=True)
+    return body, hashlib.sha1(body.encode()).hexdigest()
+
+
+programs_cache = SingleFlightCache(load_programs_state, PROGRAMS_CACHE_TTL)
 
 
 # ------------------------
@@ -76,14 +324,12 @@ def home():
 
 @app.route("/api/programs", methods=["GET"])
 def list_programs():
-    """List available and loaded eBPF programs."""
+    """List available and loaded eBPF programs (cached; supports If-None-Match)."""
     try:
-        programs = [
-            f for f in os.listdir(EBPF_SRC_DIR)
-            if f.endswith(".o") and os.path.isfile(os.path.join(EBPF_SRC_DIR, f))
-        ]
-        loaded_programs = get_loaded_programs()
-        return jsonify({"programs": programs, "loaded": loaded_programs})
+        body, etag = programs_cache.get()
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response.make_conditional(request)
     except Exception as e:
         app.logger.error(f"Failed to list programs: {str(e)}")
         return jsonify({"error": "Failed to list programs"}), 500
@@ -91,7 +337,7 @@ def list_programs():
 
 @app.route("/api/programs/load", methods=["POST"])
 def load_program():
-    """Load and pin an eBPF program using bpftool."""
+    """Load and pin an eBPF program."""
     data = request.get_json() or {}
     program = data.get("program")
     if not program or not program.endswith(".bpf.o"):
@@ -102,19 +348,24 @@ def load_program():
         return jsonify({"error": f".o file not found: {program_path}"}), 404
 
     pin_path = make_absolute_pin_path(data.get("pin_path") or program[:-len(".bpf.o")])
-    cmd = ["bpftool", "prog", "loadall", program_path, pin_path]
-    _, _, error = run_command(cmd)
+    ringbuf_bytes = data.get("ringbuf_bytes", COLLECTOR_RINGBUF_BYTES)
+    if not isinstance(ringbuf_bytes, int) or ringbuf_bytes <= 0:
+        return jsonify({"error": "'ringbuf_bytes' must be a positive integer"}), 400
+    _, error = bpf.load(program_path, pin_path)
     if error:
         return jsonify({"error": f"Failed to load program: {error}"}), 500
+    programs_cache.invalidate()
+    map_views.invalidate()
 
-    global collector_started
-    if not collector_started:
-        start_collector()
-        collector_started = True
-        app.logger.info("Collector started after successful load.")
+    with process_lock:
+        try:
+            if start_collector(ringbuf_bytes):
+                app.logger.info("Collector started after successful load.")
+        except OSError as ex:
+            app.logger.error(f"Failed to launch collector: {ex}")
 
-    with events_lock:
-        collected_events.clear()
+    collected_events.clear()
+    collector_stats.reset()
 
     return jsonify({"message": f"Program loaded at {pin_path}"}), 200
 
@@ -131,17 +382,18 @@ def unload_program():
         return jsonify({"error": "Missing or invalid 'pin_path'"}), 400
     if not os.path.exists(pin_path):
         return jsonify({"error": f"Pin path not found: {pin_path}"}), 404
-    cmd = ["rm", "-rf", pin_path]
-    _, _, error = run_command(cmd)
+    _, error = bpf.unload(pin_path)
     if error:
         return jsonify({"error": f"Failed to unload program: {error}"}), 500
+    programs_cache.invalidate()
+    map_views.invalidate()
 
     return jsonify({"message": f"Successfully unloaded program at {pin_path}"}), 200
 
 
 @app.route("/api/programs/attach", methods=["POST"])
 def attach_program():
-    """Attach a loaded eBPF program to a target using bpftool."""
+    """Attach a loaded eBPF program to a target."""
     data = request.get_json() or {}
     raw_pin_path = data.get("pin_path")
     if not raw_pin_path:
@@ -151,23 +403,22 @@ def attach_program():
     attach_type = data.get("attach_type", "tracepoint")
     if attach_type == "tracepoint":
         target = data.get("target") or "tracepoint/syscalls/sys_enter_execve"
-        cmd = ["bpftool", "prog", "attach", "pinned", pin_path, "tracepoint", target]
     elif attach_type == "xdp":
         target = data.get("target") or "eth0"
-        cmd = ["bpftool", "net", "attach", "xdp", "dev", target, "pinned", pin_path]
     else:
         return jsonify({"error": f"Unsupported attach_type: {attach_type}"}), 400
 
-    _, _, error = run_command(cmd)
+    _, error = bpf.attach(pin_path, attach_type, target)
     if error:
         return jsonify({"error": f"Attach failed: {error}"}), 500
+    programs_cache.invalidate()
 
     return jsonify({"message": f"Attached {pin_path} to {attach_type}:{target}"}), 200
 
 
 @app.route("/api/programs/detach", methods=["POST"])
 def detach_program():
-    """Detach an attached eBPF program using bpftool."""
+    """Detach an attached eBPF program."""
     data = request.get_json() or {}
     raw_pin_path = data.get("pin_path")
     if not raw_pin_path:
@@ -179,114 +430,517 @@ def detach_program():
     if not attach_type or not target:
         return jsonify({"error": "Missing required parameters: attach_type and target"}), 400
 
-    if attach_type == "tracepoint":
-        cmd = ["bpftool", "prog", "detach", "pinned", pin_path, "tracepoint", target]
-    elif attach_type == "xdp":
-        cmd = ["bpftool", "net", "detach", "xdp", "dev", target]
-    else:
+    if attach_type not in ("tracepoint", "xdp"):
         return jsonify({"error": f"Unsupported attach_type: {attach_type}"}), 400
 
-    _, _, error = run_command(cmd)
+    _, error = bpf.detach(pin_path, attach_type, target)
     if error:
         return jsonify({"error": f"Detach failed: {error}"}), 500
+    programs_cache.invalidate()
 
     return jsonify({"message": f"Detached {pin_path} from {attach_type}:{target}"}), 200
 
 
+@app.route("/api/programs/<int:prog_id>", methods=["GET"])
+def program_info(prog_id):
+    """Return the current info (including run_time_ns/run_cnt) of one program."""
+    info, error = bpf.program_info(prog_id)
+    if error:
+        return jsonify({"error": error}), 404
+    return jsonify(info), 200
+
+
+@app.route("/api/programs/<int:prog_id>/stats", methods=["GET"])
+def program_run_stats(prog_id):
+    """
+    Return sampled run-time stats of one program: ns per invocation and
+    invocations per second, latest and over `seconds` (default 300) in
+    `step`-second bins.
+    """
+    seconds = max(request.args.get("seconds", 300, type=float), 1)
+    step = request.args.get("step", type=float)
+    if step is not None:
+        step = max(step, program_stats.interval)
+    history = program_stats.history(prog_id, seconds=seconds, step=step)
+    if history is None:
+        return jsonify({"error": f"No stats sampled for program {prog_id}", "sampler": program_stats.stats()}), 404
+    return jsonify(history), 200
+
+
+@app.route("/api/programs/pin", methods=["POST"])
+def pin_program():
+    """Pin a loaded program by id so it outlives the process that loaded it."""
+    data = request.get_json() or {}
+    prog_id = data.get("id")
+    raw_pin_path = data.get("pin_path")
+    if not isinstance(prog_id, int) or not raw_pin_path:
+        return jsonify({"error": "Missing or invalid 'id' / 'pin_path'"}), 400
+    pin_path = make_absolute_pin_path(raw_pin_path)
+    _, error = bpf.pin(prog_id, pin_path)
+    if error:
+        return jsonify({"error": f"Pin failed: {error}"}), 500
+    programs_cache.invalidate()
+    return jsonify({"message": f"Pinned program {prog_id} at {pin_path}"}), 200
+
+
+# ------------------------
+# Map Endpoints
+# ------------------------
+@app.route("/api/maps", methods=["GET"])
+def list_maps():
+    maps, error = bpf.list_maps()
+    if error:
+        return jsonify({"error": error}), 500
+    return jsonify({"maps": maps}), 200
+
+
+@app.route("/api/maps/<int:map_id>", methods=["GET"])
+def dump_map(map_id):
+    """
+    Page through a map's entries (hex-encoded keys and values), sorted by key.
+    Query parameters: prefix=<hex> filters keys, after=<hex key> continues
+    from the previous page's `next`, limit=<n>, and since=<token> returns
+    only entries changed (and keys deleted) since that snapshot.
+    """
+    try:
+        prefix = bytes.fromhex(request.args.get("prefix", ""))
+        after = request.args.get("after")
+        after = bytes.fromhex(after) if after else None
+    except ValueError:
+        return jsonify({"error": "'prefix' and 'after' must be hex strings"}), 400
+    limit = request.args.get("limit", MAP_PAGE_LIMIT, type=int)
+    limit = max(1, min(limit, MAP_PAGE_MAX_LIMIT))
+
+    try:
+        snapshot = map_views.snapshot(map_id)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+
+    since = None
+    token = request.args.get("since")
+    if token:
+        since = map_views.previous(token)
+        if since is not None and since.map_id != map_id:
+            return jsonify({"error": f"Snapshot {token} belongs to another map"}), 400
+    page = map_views.page(snapshot, prefix=prefix, after=after, limit=limit, since=since)
+    page["map"] = snapshot.info
+    if token and since is None:
+        # The snapshot expired; the client gets a full listing instead
+        page["reset"] = True
+    return jsonify(page), 200
+
+
 # ------------------------
 # Collector Endpoints (for eBPF)
 # ------------------------
+def serialize_exec_event(event):
+    data = event.to_dict()
+    info = pod_resolver.lookup(event.cgroup_id)
+    if info is not None:
+        data.update(info.to_dict())
+    return data
+
+
+def format_exec_event(event):
+    ts = datetime.fromtimestamp(event.ts / 1e9).isoformat(timespec="microseconds")
+    return f"{ts} {event.format_line()}"
+
+
+def read_store_page(store, key, serialize=None):
+    """
+    Read a page of events from `store` using the `since`/`limit` query
+    parameters. Without `since` the newest `limit` events are returned. A
+    `since` ahead of the store (a cursor from a previous backend instance)
+    reads from the start again and sets `reset`.
+    """
+    since = request.args.get("since", type=int)
+    limit = request.args.get("limit", EVENT_READ_LIMIT, type=int)
+    limit = max(1, min(limit, EVENT_READ_MAX_LIMIT))
+    reset = False
+    if since is None:
+        result = store.tail(limit)
+    else:
+        result = store.read_since(max(since, 0), limit)
+        if since > result.last_seq:
+            reset = True
+            result = store.read_since(0, limit)
+    events = result.events
+    if serialize is not None:
+        events = [serialize(event) for event in events]
+    return jsonify({
+        key: events,
+        "first_seq": result.first_seq,
+        "next": result.next,
+        "last_seq": result.last_seq,
+        "gap": result.gap,
+        "reset": reset,
+    })
+
+
 @app.route("/api/collector_events", methods=["GET"])
 def get_collector_events():
-    with events_lock:
-        events_copy = collected_events.copy()
-    return jsonify({"events": events_copy})
+    return read_store_page(collected_events, "events", serialize_exec_event)
+
+
+def seconds_arg_to_ns(name):
+    """Read a UNIX-seconds query parameter and return it in nanoseconds."""
+    value = request.args.get(name, type=float)
+    return int(value * 1e9) if value is not None else None
+
+
+def run_event_query(store, index, serialize, match=None):
+    """Run query_events with the filters given as query parameters and return the JSON response."""
+    from_ts = seconds_arg_to_ns("from_ts")
+    to_ts = seconds_arg_to_ns("to_ts")
+    last = request.args.get("last", type=float)
+    if last is not None:
+        from_ts = time.time_ns() - int(last * 1e9)
+    limit = max(1, min(request.args.get("limit", 100, type=int), QUERY_MAX_LIMIT))
+    matches, cursor, more = query_events(
+        store,
+        index,
+        since=max(request.args.get("since", 0, type=int), 0),
+        limit=limit,
+        comm=request.args.get("comm"),
+        file_prefix=request.args.get("file_prefix"),
+        pid=request.args.get("pid", type=int),
+        tgid=request.args.get("tgid", type=int),
+        from_ts=from_ts,
+        to_ts=to_ts,
+        match=match,
+    )
+    return jsonify({
+        "events": [{"seq": seq, **serialize(event)} for seq, event in matches],
+        "next": cursor,
+        "more": more,
+    })
+
+
+@app.route("/api/collector_events/query", methods=["GET"])
+def query_collector_events():
+    """
+    Filter collector events by pid, tgid, comm, file prefix and time range.
+
+    Query parameters: comm, file_prefix, pid, tgid, from_ts / to_ts (UNIX
+    seconds) or last (seconds back from now), since (sequence cursor) and
+    limit. Results are ordered by sequence number; pass `next` back as
+    `since` to fetch the following page while `more` is true.
+    """
+    return run_event_query(collected_events, collected_events_index, serialize_exec_event)
+
+
+stream_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+
+def sse_event_stream(store, since, serialize, disconnected=None):
+    """
+    Yield Server-Sent Events for every event after `since`: first the
+    retained backlog, then live batches from a bounded subscription. If the
+    subscriber falls behind it skips ahead by catching up from the store.
+    `disconnected` (the server's client_disconnected callable, if it has one)
+    is checked every second while idle, so a closed stream ends promptly.
+    """
+    subscription = store.subscribe(SSE_QUEUE_BATCHES)
+    cursor = since
+
+    def catch_up():
+        nonlocal cursor
+        while True:
+            result = store.read_since(cursor, EVENT_READ_LIMIT)
+            if result.gap:
+                yield f"event: gap\ndata: {json.dumps({'since': cursor, 'first_seq': result.first_seq})}\n\n"
+            for offset, event in enumerate(result.events):
+                yield f"id: {result.first_seq + offset}\ndata: {json.dumps(serialize(event))}\n\n"
+            cursor = result.next
+            if len(result.events) < EVENT_READ_LIMIT:
+                return
+
+    poll = 1.0 if disconnected is not None else SSE_KEEPALIVE_SECONDS
+    idle = 0.0
+    try:
+        yield "retry: 2000\n\n"
+        yield from catch_up()
+        while True:
+            batch = subscription.get(timeout=poll)
+            if subscription.lagged:
+                subscription.reset()
+                yield from catch_up()
+                continue
+            if batch is None:
+                if disconnected is not None and disconnected():
+                    return
+                idle += poll
+                if idle >= SSE_KEEPALIVE_SECONDS:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+                continue
+            idle = 0.0
+            first_seq, events = batch
+            if first_seq > cursor + 1:
+                # Missed batches (e.g. published out of order); read them back
+                yield from catch_up()
+                continue
+            chunks = []
+            for offset, event in enumerate(events):
+                seq = first_seq + offset
+                if seq > cursor:
+                    chunks.append(f"id: {seq}\ndata: {json.dumps(serialize(event))}\n\n")
+                    cursor = seq
+            if chunks:
+                yield "".join(chunks)
+    finally:
+        store.unsubscribe(subscription)
+
+
+def stream_store_events(store, serialize):
+    """
+    SSE response for `store`, resuming from Last-Event-ID or `since`. At most
+    SSE_MAX_STREAMS streams are open at once; further clients get a 503.
+    """
+    if not stream_slots.acquire(blocking=False):
+        response = jsonify({"error": f"Too many open event streams (limit {SSE_MAX_STREAMS})"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", 0, type=int)
+    since = max(since, 0)
+    if since > store.stats()["last_seq"]:
+        # Cursor from a previous backend instance; start over
+        since = 0
+    disconnected = request.environ.get("waitress.client_disconnected")
+    response = Response(sse_event_stream(store, since, serialize, disconnected), mimetype="text/event-stream")
+    response.call_on_close(stream_slots.release)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/api/collector_events/stream", methods=["GET"])
+def stream_collector_events():
+    """Stream collector events as Server-Sent Events (resumable via Last-Event-ID)."""
+    return stream_store_events(collected_events, serialize_exec_event)
 
 
 @app.route("/api/clear_logs", methods=["POST"])
 def clear_logs():
-    with events_lock:
-        collected_events.clear()
+    cleared_seq = collected_events.clear()
+    collector_stats.reset()
+    if collector_journal is not None:
+        # Keep the cleared events out of journal dumps and later replays
+        collector_journal.clear(cleared_seq)
     return jsonify({"message": "Collector logs cleared"}), 200
 
 
+def stream_store_text(store, format_line=str):
+    """Yield the store's history as text lines, one chunk at a time."""
+    for chunk in store.iter_chunks():
+        yield "".join(f"{format_line(line)}\n" for line in chunk)
+
+
 @app.route("/api/dump_logs", methods=["GET"])
 def dump_logs():
-    with events_lock:
-        log_text = "\n".join(collected_events)
-    response = Response(log_text, mimetype="text/plain")
-    response.headers["Content-Disposition"] = "attachment;filename=collector_logs.txt"
+    """
+    Download the collector history. With a journal this streams the on-disk
+    segments as JSON lines, optionally starting after `since` (a sequence
+    number) or at `from_ts` (UNIX seconds); otherwise the in-memory history
+    is dumped as text. Events removed by /api/clear_logs are not included.
+    """
+    if collector_journal is None or request.args.get("format") == "text":
+        response = Response(stream_store_text(collected_events, format_exec_event), mimetype="text/plain")
+        response.headers["Content-Disposition"] = "attachment;filename=collector_logs.txt"
+        return response
+
+    since = max(request.args.get("since", 0, type=int), 0)
+    from_ts = request.args.get("from_ts", type=float)
+    from_ts_ns = int(from_ts * 1e9) if from_ts is not None else None
+    response = Response(collector_journal.iter_raw(since, from_ts_ns), mimetype="application/x-ndjson")
+    response.headers["Content-Disposition"] = "attachment;filename=collector_logs.jsonl"
     return response
 
 
+@app.route("/api/collector_stats", methods=["GET"])
+def get_collector_stats():
+    """
+    Windowed exec statistics: totals, rates and top comms/files over the last
+    1m, 5m and 1h, plus a per-second exec rate series. Query parameters:
+    top (entries per list), series (seconds of rate history), step (bin size).
+    """
+    top_n = max(1, min(request.args.get("top", 10, type=int), 100))
+    series = request.args.get("series", 300, type=int)
+    step = request.args.get("step", 1, type=int)
+    return jsonify(collector_stats.snapshot(top_n, series, step))
+
+
+@app.route("/api/collector_health", methods=["GET"])
+def collector_health():
+    """
+    Report event loss along the whole pipeline: ring buffer drops in the
+    kernel, events not yet consumed by the collector, the pipe backlog of the
+    reader, store evictions and events dropped for lagging stream clients.
+    """
+    reader = process_reader(DEFAULT_COLLECTOR)
+    running = reader is not None and reader.is_alive()
+    issues = []
+
+    kernel = None
+    stats = getattr(reader.decoder, "last_stats", None) if reader else None
+    if stats is not None:
+        prev = reader.decoder.prev_stats
+        interval = (stats.ts - prev.ts) / 1e9 if prev else 0
+        dropped_per_sec = (stats.dropped - prev.dropped) / interval if interval > 0 else 0.0
+        age = time.time() - stats.ts / 1e9
+        kernel = {
+            "submitted": stats.submitted,
+            "dropped": stats.dropped,
+            "drop_ratio": round(stats.dropped / (stats.submitted + stats.dropped), 6)
+            if stats.submitted + stats.dropped else 0.0,
+            "dropped_per_sec": round(dropped_per_sec, 2),
+            "consumed": stats.consumed,
+            "lag_events": max(stats.submitted - stats.consumed, 0),
+            "ringbuf_bytes": stats.ringbuf_bytes,
+            "filtered": stats.filtered,
+            "reported_at": stats.ts / 1e9,
+            "age_seconds": round(age, 3),
+        }
+        if dropped_per_sec > 0:
+            issues.append("ring buffer full: events are being dropped in the kernel")
+        if running and age > COLLECTOR_STATS_STALE_SECONDS:
+            issues.append("collector stats are stale")
+
+    reader_stats = None
+    if reader is not None:
+        full = reader.stats()
+        reader_stats = {k: full[k] for k in (
+            "events", "events_per_sec", "backlog_bytes", "max_backlog_bytes",
+            "ingest_lag_ms", "decode_skipped", "batch_errors")}
+
+    subscribers = collected_events.subscriber_stats()
+    if subscribers["lagged"]:
+        issues.append("stream subscribers are lagging")
+    store = collected_events.stats()
+
+    return jsonify({
+        "status": "stopped" if not running else ("degraded" if issues else "ok"),
+        "issues": issues,
+        "kernel": kernel,
+        "reader": reader_stats,
+        "store": {"count": store["count"], "max_events": store["max_events"], "evicted": store["evicted"]},
+        "subscribers": subscribers,
+    })
+
+
+@app.route("/api/collector/filters", methods=["GET", "PUT"])
+def collector_filter_settings():
+    """
+    Read or update the collector's in-kernel filters. PUT takes
+    {"comm"|"file_prefix"|"cgroup": {"mode": "off"|"allow"|"deny", "values": [...]}};
+    changes apply to the running program immediately.
+    """
+    try:
+        if request.method == "PUT":
+            spec = request.get_json(silent=True)
+            if not isinstance(spec, dict):
+                return jsonify({"error": "Expected a JSON object"}), 400
+            filters = collector_filters.update(spec)
+            app.logger.info(f"Collector filters updated: {spec}")
+        else:
+            filters = collector_filters.get()
+    except FilterError as e:
+        return jsonify({"error": str(e)}), 400
+    except FiltersUnavailable as e:
+        return jsonify({"error": str(e)}), 409
+    except RuntimeError as e:
+        return jsonify({"error": f"Failed to access filter maps: {e}"}), 500
+    return jsonify({"filters": filters}), 200
+
+
+@app.route("/api/pod_metadata", methods=["GET"])
+def pod_metadata_stats():
+    """Cache and lookup counters of the cgroup -> pod resolver."""
+    return jsonify(pod_resolver.stats())
+
+
+@app.route("/api/journal", methods=["GET"])
+def journal_stats():
+    if collector_journal is None:
+        return jsonify({"enabled": False})
+    return jsonify({"enabled": True, **collector_journal.stats()})
+
+
 @app.route("/api/start_collection", methods=["POST"])
 def start_collection_endpoint():
-    global collector_started
-    if collector_started:
-        return jsonify({"message": "Collector process already running."}), 200
-    try:
-        start_collector()
-        collector_started = True
-        app.logger.info("Collector process started.")
-        return jsonify({"message": "Collector process started."}), 200
-    except Exception as ex:
-        app.logger.error(f"Failed to start collector: {ex}")
-        return jsonify({"error": f"Failed to start collector: {ex}"}), 500
+    data = request.get_json(silent=True) or {}
+    ringbuf_bytes = data.get("ringbuf_bytes", COLLECTOR_RINGBUF_BYTES)
+    if not isinstance(ringbuf_bytes, int) or ringbuf_bytes <= 0:
+        return jsonify({"error": "'ringbuf_bytes' must be a positive integer"}), 400
+    with process_lock:
+        try:
+            if not start_collector(ringbuf_bytes):
+                return jsonify({"message": "Collector process already running."}), 200
+            app.logger.info("Collector process started.")
+            return jsonify({"message": "Collector process started."}), 200
+        except Exception as ex:
+            app.logger.error(f"Failed to start collector: {ex}")
+            return jsonify({"error": f"Failed to start collector: {ex}"}), 500
+
+
+def stop_process(process_id):
+    """Stop a supervised process; return False if it was not running."""
+    process = supervisor.get(process_id)
+    return process is not None and process.stop()
 
 
 @app.route("/api/stop_collection", methods=["POST"])
 def stop_collection():
-    global collector_proc, collector_started
-    if collector_proc is not None and collector_proc.poll() is None:
-        try:
-            subprocess.run(["sudo", "kill", "-TERM", str(collector_proc.pid)], check=True)
-            collector_proc.wait(timeout=5)
-            collector_started = False
-            app.logger.info("Collector process terminated successfully.")
-            return jsonify({"message": "Collector process stopped."}), 200
-        except Exception as ex:
-            app.logger.error(f"Failed to stop collector: {ex}")
-            return jsonify({"error": f"Failed to stop collector: {ex}"}), 500
-    else:
-        collector_started = False
+    try:
+        stopped = stop_process(DEFAULT_COLLECTOR)
+    except Exception as ex:
+        app.logger.error(f"Failed to stop collector: {ex}")
+        return jsonify({"error": f"Failed to stop collector: {ex}"}), 500
+    if not stopped:
         return jsonify({"message": "Collector process is not running."}), 200
+    app.logger.info("Collector process terminated successfully.")
+    return jsonify({"message": "Collector process stopped."}), 200
 
 
-def start_collector():
-    def run_collector():
-        global collector_proc
+def on_collector_batch(first_seq, events):
+    """Feed a freshly stored batch of collector events to aggregates, pod resolution and journal."""
+    collector_stats.add_batch(events)
+    pod_resolver.submit(events)
+    if collector_journal is not None:
         try:
-            proc = subprocess.Popen(
-                ["sudo", "./exec"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
-            collector_proc = proc
-        except Exception as ex:
-            app.logger.error(f"Failed to launch collector: {ex}")
-            return
+            collector_journal.append(first_seq, events)
+        except OSError as ex:
+            # Counted in the journal's errors; the events stay in memory
+            app.logger.error(f"Journal: failed to write events {first_seq}-{first_seq + len(events) - 1}: {ex}")
+
+
+def collector_command(ringbuf_bytes=COLLECTOR_RINGBUF_BYTES, pin_root=COLLECTOR_PIN_ROOT):
+    return [COLLECTOR_BIN, "--format", COLLECTOR_FORMAT, "--ringbuf-size", str(ringbuf_bytes),
+            "--pin-root", pin_root]
+
+
+def submit_pod_lookups(first_seq, events):
+    pod_resolver.submit(events)
 
-        while True:
-            line = proc.stdout.readline()
-            if line:
-                line = line.strip()
-                with events_lock:
-                    collected_events.append(line)
-                app.logger.info(f"Collector event: {line}")
-            else:
-                if proc.poll() is not None:
-                    app.logger.info("Collector process terminated.")
-                    break
-                time.sleep(0.1)
-        proc.stdout.close()
-        proc.wait()
-        collector_proc = None
-
-    global collector_thread
-    collector_thread = threading.Thread(target=run_collector, daemon=True)
-    collector_thread.start()
+
+def collector_decoder():
+    return make_decoder(COLLECTOR_FORMAT)
+
+
+def start_collector(ringbuf_bytes=COLLECTOR_RINGBUF_BYTES):
+    """
+    Start the default collector, which feeds collected_events; return False
+    if it is already running. Caller holds process_lock.
+    """
+    process = supervisor.get(DEFAULT_COLLECTOR)
+    if process is None:
+        process = supervisor.add(DEFAULT_COLLECTOR, "collector", collector_command(ringbuf_bytes),
+                                 collected_events, collector_decoder, on_batch=on_collector_batch)
+    elif not process.is_running():
+        process.command = collector_command(ringbuf_bytes)
+    return process.start()
 
 
 # ------------------------
@@ -306,127 +960,489 @@ def list_userspace_programs():
         return jsonify({"error": "Failed to list userspace programs"}), 500
 
 
-@app.route("/api/start_userspace", methods=["POST"])
-def start_userspace():
-    data = request.get_json() or {}
-    program = data.get("program")
-    args = data.get("args", "")
+def userspace_command(program, args):
+    """Return (command, error) for a program in USERSPACE_DIR; `args` is a string or a list."""
     if not program:
-        return jsonify({"error": "Missing 'program' parameter."}), 400
-
+        return None, "Missing 'program' parameter."
     program_path = os.path.join(USERSPACE_DIR, program)
     if not os.path.isfile(program_path) or not os.access(program_path, os.X_OK):
-        return jsonify({"error": "Invalid program or not executable."}), 400
+        return None, "Invalid program or not executable."
+    if isinstance(args, str):
+        args = args.split()
+    elif not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+        return None, "'args' must be a string or a list of strings."
+    return [program_path] + args, None
 
-    global userspace_proc, userspace_thread, userspace_output
-    if userspace_proc is not None and userspace_proc.poll() is None:
-        return jsonify({"message": "Userspace program already running."}), 200
 
-    with userspace_lock:
-        userspace_output.clear()
+def text_decoder():
+    return make_decoder("text")
 
-    full_command = [program_path] + args.split()
-    app.logger.info(f"Starting userspace program: sudo {' '.join(full_command)}")
-    try:
-        userspace_proc = subprocess.Popen(
-            ["sudo"] + full_command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            bufsize=1
-        )
-    except Exception as ex:
-        app.logger.error(f"Error starting userspace program: {ex}")
-        return jsonify({"error": str(ex)}), 500
 
-    def run_userspace_output():
-        global userspace_proc
-        while True:
-            line = userspace_proc.stdout.readline()
-            if line:
-                line = line.strip()
-                app.logger.info(f"Userspace output: {line}")
-                with userspace_lock:
-                    userspace_output.append(line)
-            else:
-                if userspace_proc.poll() is not None:
-                    app.logger.info("Userspace program terminated.")
-                    break
-                time.sleep(0.1)
-        userspace_proc.stdout.close()
-        userspace_proc.wait()
-
-    userspace_thread = threading.Thread(target=run_userspace_output, daemon=True)
-    userspace_thread.start()
-    return jsonify({"message": "Userspace program started."}), 200
+@app.route("/api/start_userspace", methods=["POST"])
+def start_userspace():
+    data = request.get_json() or {}
+    command, error = userspace_command(data.get("program"), data.get("args", ""))
+    if error:
+        return jsonify({"error": error}), 400
 
+    with process_lock:
+        process = supervisor.get(DEFAULT_USERSPACE)
+        if process is not None and process.is_running():
+            return jsonify({"message": "Userspace program already running."}), 200
+        if process is not None:
+            supervisor.remove(DEFAULT_USERSPACE)
 
-@app.route("/api/stop_userspace", methods=["POST"])
-def stop_userspace():
-    global userspace_proc
-    if userspace_proc is not None and userspace_proc.poll() is None:
+        userspace_output.clear()
+        process = supervisor.add(DEFAULT_USERSPACE, "userspace", command, userspace_output, text_decoder)
+        app.logger.info(f"Starting userspace program: {' '.join(command)}")
         try:
-            # Send SIGTERM first
-            subprocess.run(["sudo", "kill", "-15", str(userspace_proc.pid)], check=True)
-            userspace_proc.wait(timeout=3)
-        except subprocess.TimeoutExpired:
-            # If still not terminated, send SIGKILL
-            subprocess.run(["sudo", "kill", "-9", str(userspace_proc.pid)], check=True)
-            userspace_proc.wait(timeout=2)
+            process.start()
         except Exception as ex:
-            app.logger.error(f"Error stopping userspace program: {ex}")
+            app.logger.error(f"Error starting userspace program: {ex}")
             return jsonify({"error": str(ex)}), 500
-        finally:
-            userspace_proc = None
+    return jsonify({"message": "Userspace program started."}), 200
 
-        app.logger.info("Userspace program terminated successfully.")
-        return jsonify({"message": "Userspace program stopped."}), 200
-    else:
-        userspace_proc = None
+
+@app.route("/api/stop_userspace", methods=["POST"])
+def stop_userspace():
+    try:
+        stopped = stop_process(DEFAULT_USERSPACE)
+    except Exception as ex:
+        app.logger.error(f"Error stopping userspace program: {ex}")
+        return jsonify({"error": str(ex)}), 500
+    if not stopped:
         return jsonify({"message": "Userspace program is not running."}), 200
+    app.logger.info("Userspace program terminated successfully.")
+    return jsonify({"message": "Userspace program stopped."}), 200
+
+
+def shutdown():
+    """Stop child processes and background samplers; called when the server exits."""
+    supervisor.stop_all()
+    program_stats.stop()
+    if host_metrics is not None:
+        host_metrics.stop()
+    if cluster is not None:
+        cluster.stop()
+
+
+@app.route("/api/reader_stats", methods=["GET"])
+def reader_stats():
+    """Throughput and lag counters of the pipe readers of all supervised processes."""
+    readers = {process.id: process.reader.stats() if process.reader else None for process in supervisor.all()}
+    return jsonify({
+        "collector": readers.get(DEFAULT_COLLECTOR),
+        "userspace": readers.get(DEFAULT_USERSPACE),
+        "processes": readers,
+    })
 
 
 @app.route("/api/userspace_output", methods=["GET"])
 def get_userspace_output():
-    global userspace_output
-    with userspace_lock:
-        output_copy = userspace_output.copy()
-    return jsonify({"output": output_copy})
+    return read_store_page(userspace_output, "output")
 
 @app.route("/api/userspace_status", methods=["GET"])
 def userspace_status():
-    global userspace_proc
-    # If userspace_proc is not None and hasn't exited (poll() returns None), it's running
-    running = (userspace_proc is not None and userspace_proc.poll() is None)
-    return jsonify({"running": running}), 200
+    process = supervisor.get(DEFAULT_USERSPACE)
+    if process is None:
+        return jsonify({"running": False, "state": "stopped"}), 200
+    return jsonify({"running": process.is_running(), "state": process.state}), 200
 
 @app.route("/api/dump_userspace_output", methods=["GET"])
 def dump_userspace_output():
-    global userspace_output
-    with userspace_lock:
-        output_text = "\n".join(userspace_output)
-    response = Response(output_text, mimetype='text/plain')
+    response = Response(stream_store_text(userspace_output), mimetype='text/plain')
     response.headers["Content-Disposition"] = "attachment;filename=userspace_output.txt"
     return response
 
 
+# ------------------------
+# Supervised Processes
+# ------------------------
+def process_not_found(process_id):
+    return jsonify({"error": f"No process with id {process_id!r}"}), 404
+
+
+def process_output_key(process):
+    return "events" if process.kind == "collector" else "output"
+
+
+def process_serializer(process):
+    return serialize_exec_event if process.kind == "collector" else str
+
+
+@app.route("/api/processes", methods=["GET"])
+def list_processes():
+    return jsonify({"processes": [process.status() for process in supervisor.all()]})
+
+
+def collector_pin_roots():
+    """Pin roots of the default collector and of every defined collector process."""
+    roots = {os.path.normpath(COLLECTOR_PIN_ROOT)}
+    for process in supervisor.all():
+        if process.kind == "collector" and "--pin-root" in process.command:
+            roots.add(os.path.normpath(process.command[process.command.index("--pin-root") + 1]))
+    return roots
+
+
+@app.route("/api/processes", methods=["POST"])
+def create_process():
+    """
+    Define (and by default start) a collector or userspace program with its
+    own output store. Body: {"id", "kind": "collector"|"userspace",
+    "program" and "args" (userspace), "ringbuf_bytes" and "pin_root"
+    (collector), "restart" (default true), "limits": {"memory_bytes",
+    "cpu_seconds", "open_files", "nice"}, "start" (default true)}.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Expected a JSON object"}), 400
+    process_id = data.get("id")
+    if process_id in RESERVED_PROCESS_IDS:
+        return jsonify({"error": f"Process id {process_id!r} is reserved"}), 400
+    kind = data.get("kind", "userspace")
+    if kind == "collector":
+        ringbuf_bytes = data.get("ringbuf_bytes", COLLECTOR_RINGBUF_BYTES)
+        if not isinstance(ringbuf_bytes, int) or ringbuf_bytes <= 0:
+            return jsonify({"error": "'ringbuf_bytes' must be a positive integer"}), 400
+        # Each collector pins its own filter maps: a shared pin root would
+        # make filter updates reach whichever collector pinned last
+        pin_root = data.get("pin_root") or f"{COLLECTOR_PIN_ROOT.rstrip('/')}-{process_id}"
+        pin_root = os.path.normpath(make_absolute_pin_path(pin_root))
+        command = collector_command(ringbuf_bytes, pin_root)
+        store = EventStore(EVENT_STORE_MAX_EVENTS, EVENT_STORE_MAX_BYTES, sizeof=event_size)
+        decoder_factory = collector_decoder
+        on_batch = submit_pod_lookups
+    elif kind == "userspace":
+        command, error = userspace_command(data.get("program"), data.get("args", ""))
+        if error:
+            return jsonify({"error": error}), 400
+        store = EventStore(EVENT_STORE_MAX_EVENTS, EVENT_STORE_MAX_BYTES)
+        decoder_factory = text_decoder
+        on_batch = None
+    else:
+        return jsonify({"error": "'kind' must be 'collector' or 'userspace'"}), 400
+    try:
+        limits = validate_limits(data.get("limits") or {})
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with process_lock:
+        if kind == "collector" and pin_root in collector_pin_roots():
+            return jsonify({"error": f"Pin root {pin_root} is used by another collector"}), 409
+        try:
+            process = supervisor.add(process_id, kind, command, store, decoder_factory, on_batch=on_batch,
+                                     restart=bool(data.get("restart", True)), limits=limits)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409 if "already exists" in str(e) else 400
+        app.logger.info(f"Process {process_id} defined: {' '.join(command)}")
+        if data.get("start", True):
+            try:
+                process.start()
+            except OSError as e:
+                return jsonify({"error": f"Failed to start {process_id}: {e}", "process": process.status()}), 500
+    return jsonify({"process": process.status()}), 201
+
+
+@app.route("/api/processes/<process_id>", methods=["GET"])
+def get_process(process_id):
+    process = supervisor.get(process_id)
+    if process is None:
+        return process_not_found(process_id)
+    status = process.status()
+    status["reader"] = process.reader.stats() if process.reader else None
+    return jsonify({"process": status})
+
+
+@app.route("/api/processes/<process_id>", methods=["DELETE"])
+def delete_process(process_id):
+    """Stop a process and forget it, together with its output."""
+    with process_lock:
+        try:
+            process = supervisor.remove(process_id)
+        except Exception as ex:
+            app.logger.error(f"Failed to stop {process_id}: {ex}")
+            return jsonify({"error": f"Failed to stop {process_id}: {ex}"}), 500
+    if process is None:
+        return process_not_found(process_id)
+    return jsonify({"message": f"Process {process_id} removed."}), 200
+
+
+@app.route("/api/processes/<process_id>/<action>", methods=["POST"])
+def control_process(process_id, action):
+    """start, stop or restart a process. A crashed process in backoff is started at once."""
+    if action not in ("start", "stop", "restart"):
+        return jsonify({"error": f"Unknown action {action!r} (expected start, stop or restart)"}), 404
+    process = supervisor.get(process_id)
+    if process is None:
+        return process_not_found(process_id)
+    try:
+        if action in ("stop", "restart"):
+            process.stop()
+        if action in ("start", "restart"):
+            process.start()
+    except Exception as ex:
+        app.logger.error(f"Failed to {action} {process_id}: {ex}")
+        return jsonify({"error": f"Failed to {action} {process_id}: {ex}", "process": process.status()}), 500
+    return jsonify({"process": process.status()}), 200
+
+
+@app.route("/api/processes/<process_id>/output", methods=["GET"])
+def get_process_output(process_id):
+    """Page through a process's output with since/limit, like /api/collector_events."""
+    process = supervisor.get(process_id)
+    if process is None:
+        return process_not_found(process_id)
+    serialize = serialize_exec_event if process.kind == "collector" else None
+    return read_store_page(process.store, process_output_key(process), serialize)
+
+
+@app.route("/api/processes/<process_id>/stream", methods=["GET"])
+def stream_process_output(process_id):
+    """Stream a process's output as Server-Sent Events (resumable via Last-Event-ID)."""
+    process = supervisor.get(process_id)
+    if process is None:
+        return process_not_found(process_id)
+    return stream_store_events(process.store, process_serializer(process))
+
+
+# ------------------------
+# Cluster Endpoints (aggregator mode)
+# ------------------------
+def cluster_disabled():
+    return jsonify({"error": "Aggregator mode is not enabled (set K8SSCOPE_NODES)"}), 404
+
+
+def serialize_cluster_event(event):
+    return event.to_dict()
+
+
+@app.route("/api/cluster/nodes", methods=["GET"])
+def cluster_nodes():
+    """Per-node cursor, backlog, health and connection counters of the aggregator."""
+    if cluster is None:
+        return cluster_disabled()
+    return jsonify({**cluster.stats(), "nodes": cluster.node_status()})
+
+
+@app.route("/api/cluster/events", methods=["GET"])
+def get_cluster_events():
+    """Merged events of all nodes, in timestamp order, with the collector_events cursor API."""
+    if cluster is None:
+        return cluster_disabled()
+    return read_store_page(cluster_events, "events", serialize_cluster_event)
+
+
+@app.route("/api/cluster/events/query", methods=["GET"])
+def query_cluster_events():
+    """Same filters as /api/collector_events/query, plus `node`."""
+    if cluster is None:
+        return cluster_disabled()
+    node = request.args.get("node")
+    match = (lambda event: event.node == node) if node else None
+    return run_event_query(cluster_events, cluster_events_index, serialize_cluster_event, match)
+
+
+@app.route("/api/cluster/events/late", methods=["GET"])
+def get_cluster_late_events():
+    """
+    Events that reached the aggregator after newer events had been merged.
+    They are not in the cluster store (which stays in timestamp order); the
+    newest `limit` of them are returned from a bounded buffer.
+    """
+    if cluster is None:
+        return cluster_disabled()
+    limit = max(1, min(request.args.get("limit", EVENT_READ_LIMIT, type=int), EVENT_READ_MAX_LIMIT))
+    events = cluster.late_events(limit)
+    return jsonify({"events": [serialize_cluster_event(event) for event in events], "late": cluster.stats()["late"]})
+
+
+@app.route("/api/cluster/events/stream", methods=["GET"])
+def stream_cluster_events():
+    if cluster is None:
+        return cluster_disabled()
+    return stream_store_events(cluster_events, serialize_cluster_event)
+
+
+@app.route("/api/cluster/stats", methods=["GET"])
+def get_cluster_stats():
+    """Windowed exec statistics over the merged events (same parameters as /api/collector_stats)."""
+    if cluster is None:
+        return cluster_disabled()
+    top_n = max(1, min(request.args.get("top", 10, type=int), 100))
+    series = request.args.get("series", 300, type=int)
+    step = request.args.get("step", 1, type=int)
+    return jsonify(cluster_stats.snapshot(top_n, series, step))
+
+
+@app.route("/api/cluster/health", methods=["GET"])
+def cluster_health():
+    """/api/collector_health of every node, fetched concurrently."""
+    if cluster is None:
+        return cluster_disabled()
+    results = cluster.fan_out("/api/collector_health")
+    nodes = {name: result.get("ok", {"status": "unreachable", "error": result.get("error")})
+             for name, result in results.items()}
+    statuses = {node["status"] for node in nodes.values()}
+    return jsonify({
+        "status": "ok" if statuses <= {"ok"} else "degraded",
+        "nodes": nodes,
+    })
+
+
+# ------------------------
+# Prometheus metrics
+# ------------------------
+def write_store_metrics(out, stores):
+    out.family("event_store_events", "gauge", "Events currently retained in memory.",
+               [({"store": name}, store.stats()["count"]) for name, store in stores.items()])
+    out.family("event_store_evicted_total", "counter", "Events evicted from memory because of capacity.",
+               [({"store": name}, store.evicted) for name, store in stores.items()])
+    out.family("event_store_subscribers", "gauge", "Open event streams.",
+               [({"store": name}, store.subscriber_count()) for name, store in stores.items()])
+    out.family("event_store_subscriber_dropped_total", "counter", "Events not delivered to lagging streams.",
+               [({"store": name}, store.subscriber_dropped) for name, store in stores.items()])
+
+
+def write_collector_metrics(out):
+    ingested, by_comm, other = collector_stats.totals()
+    out.counter("exec_events_total", "Exec events ingested from the collector.", ingested)
+    samples = [({"comm": comm}, count) for comm, count in sorted(by_comm.items())]
+    if other:
+        samples.append(({"comm": "__other__"}, other))
+    out.family("exec_events_by_comm_total", "counter",
+               f"Exec events by comm (comms beyond the first {collector_stats.max_comms} count as __other__).",
+               samples)
+
+    if collector_journal is not None:
+        out.counter("collector_journal_errors_total", "Collector batches that failed to be journaled.",
+                    collector_journal.errors)
+
+    reader = process_reader(DEFAULT_COLLECTOR)
+    running = reader is not None and reader.is_alive()
+    out.gauge("collector_up", "1 if the collector process is running.", int(running))
+    if reader is None:
+        return
+    out.counter("collector_read_bytes_total", "Bytes read from the collector's output.", reader.bytes_read)
+    out.counter("collector_read_events_total", "Events decoded from the collector's output.", reader.events)
+    out.gauge("collector_events_per_second", "Recent collector ingest rate.", reader.events_per_sec)
+    out.gauge("collector_pipe_backlog_bytes", "Bytes waiting in the collector pipe after the last read.",
+              reader.backlog_bytes)
+    out.gauge("collector_ingest_lag_seconds", "Age of the newest event when it was stored.",
+              reader.ingest_lag_ns / 1e9)
+    out.counter("collector_decode_skipped_total", "Malformed collector records skipped.",
+                getattr(reader.decoder, "skipped", 0))
+    out.counter("collector_batch_errors_total", "Collector batches dropped because they failed to ingest.",
+                reader.batch_errors)
+    stats = getattr(reader.decoder, "last_stats", None)
+    if stats is not None:
+        out.counter("collector_kernel_submitted_total", "Events submitted to the ring buffer.", stats.submitted)
+        out.counter("collector_kernel_dropped_total", "Events dropped because the ring buffer was full.",
+                    stats.dropped)
+        out.counter("collector_kernel_filtered_total", "Events rejected by the in-kernel filters.", stats.filtered)
+        out.counter("collector_consumed_total", "Events consumed from the ring buffer by the collector.",
+                    stats.consumed)
+        out.gauge("collector_kernel_lag_events", "Events submitted but not yet consumed.",
+                  max(stats.submitted - stats.consumed, 0))
+        out.gauge("collector_ringbuf_bytes", "Size of the collector's ring buffer.", stats.ringbuf_bytes)
+
+
+def write_supervisor_metrics(out):
+    processes = supervisor.all()
+    out.family("supervised_process_up", "gauge", "1 if the supervised process is running.",
+               [({"id": p.id, "kind": p.kind}, int(p.is_running())) for p in processes])
+    out.family("supervised_process_restarts_total", "counter", "Automatic restarts after a crash.",
+               [({"id": p.id, "kind": p.kind}, p.restarts) for p in processes])
+
+
+def write_program_metrics(out):
+    programs = program_stats.programs()
+    if not programs:
+        return
+    counts = {}
+    for _, _, prog_type, _, _ in programs:
+        counts[prog_type] = counts.get(prog_type, 0) + 1
+    out.family("bpf_programs", "gauge", "Loaded eBPF programs by type.",
+               [({"type": prog_type}, count) for prog_type, count in sorted(counts.items())])
+    out.family("bpf_program_run_time_seconds_total", "counter",
+               "Time spent running each program while run-time stats were enabled.",
+               [({"id": prog_id, "name": name, "type": prog_type}, run_time / 1e9)
+                for prog_id, name, prog_type, run_time, _ in programs])
+    out.family("bpf_program_run_count_total", "counter",
+               "Invocations of each program while run-time stats were enabled.",
+               [({"id": prog_id, "name": name, "type": prog_type}, run_cnt)
+                for prog_id, name, prog_type, _, run_cnt in programs])
+
+
+def write_process_metrics(out):
+    if host_metrics is None:
+        return
+    latest = host_metrics.latest()
+    host = latest["host"]
+    if host is not None:
+        out.gauge("host_cpu_percent", "Host CPU utilization.", host["cpu_percent"])
+        out.gauge("host_memory_percent", "Host memory utilization.", host["memory_percent"])
+    processes = latest["processes"]
+    out.family("process_cpu_percent", "gauge", "CPU utilization of the backend and its child processes.",
+               [({"process": name}, p["cpu_percent"]) for name, p in processes.items() if "cpu_percent" in p])
+    out.family("process_rss_bytes", "gauge", "Resident memory of the backend and its child processes.",
+               [({"process": name}, p["rss_bytes"]) for name, p in processes.items() if "rss_bytes" in p])
+
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """
+    Prometheus exposition of pre-aggregated counters. Nothing here reads the
+    event history or calls into the eBPF backend; program counts come from
+    the program stats sampler.
+    """
+    out = MetricsWriter()
+    write_collector_metrics(out)
+    write_store_metrics(out, {DEFAULT_COLLECTOR: collected_events, DEFAULT_USERSPACE: userspace_output,
+                              **{process.id: process.store for process in supervisor.all()},
+                              **({"cluster": cluster_events} if cluster is not None else {})})
+    write_supervisor_metrics(out)
+    out.gauge("bpf_backend_info", "The eBPF backend in use.", 1, {"backend": bpf.name})
+    write_program_metrics(out)
+    out.histogram("command_duration_seconds", "Duration of bpftool and other sudo commands.",
+                  "command", command_latency)
+    write_process_metrics(out)
+    return Response(out.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 # ------------------------
 # Additional Endpoint: Performance Metrics
 # ------------------------
 @app.route("/api/performance_metrics", methods=["GET"])
 def performance_metrics():
-    try:
-        import psutil
-    except ImportError:
+    """
+    Host and process resource usage from the background sampler. Returns the
+    newest sample at once; with `history` (seconds) the samples of that
+    period are added as `series`, averaged over `step`-second bins.
+    """
+    if psutil is None:
         return jsonify({"error": "psutil module is not installed."}), 500
+    if host_metrics is None:
+        return jsonify({"error": "Host metrics sampling is disabled (K8SSCOPE_HOST_METRICS_INTERVAL=0)"}), 404
+
+    latest = host_metrics.latest()
+    host = latest["host"] or {}
+    body = {
+        "cpu": host.get("cpu_percent"),
+        "memory": host.get("memory_percent"),
+        **latest,
+        "sampler": host_metrics.stats(),
+    }
+    seconds = request.args.get("history", type=float)
+    if seconds:
+        step = request.args.get("step", type=float)
+        body["series"] = host_metrics.history(min(seconds, HOST_METRICS_HISTORY), step)
+    return jsonify(body)
 
-    try:
-        cpu_percent = psutil.cpu_percent(interval=0.5)
-        mem = psutil.virtual_memory()
-        memory_percent = mem.percent
-        return jsonify({"cpu": cpu_percent, "memory": memory_percent})
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-    
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=True)
+    # Development server; use serve.py in production
+    from werkzeug.serving import WSGIRequestHandler
+    # HTTP/1.1 so aggregators can keep their node connections alive
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    app.run(host=os.environ.get("K8SSCOPE_HOST", "127.0.0.1"),
+            port=int(os.environ.get("K8SSCOPE_PORT", 5000)),
+            debug=os.environ.get("K8SSCOPE_DEBUG", "") == "1", threaded=True)
@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Benchmark and load test of the ingest and HTTP API paths, without root or eBPF.
+
+The backend (app.py) runs in this process behind a real HTTP server, with
+the collector replaced by synthetic_collector.py, bpftool by
+stub_bpftool.py and no privilege prefix. Two phases:
+
+- ingest: the collector writes --rate events per second (0 = as fast as the
+  backend takes them) and nothing else runs. Reports the end-to-end
+  throughput (events stored per second), loss and ingest lag, the memory
+  growth of the process against the events retained, and contention on the
+  event store and aggregates locks.
+- api: with the collector still running, each endpoint is requested by
+  --clients concurrent keep-alive clients for --api-seconds:
+  /api/collector_events (newest page, and cursor polling like the UI),
+  /api/programs and /api/dump_logs. Reports the request rate and latency
+  percentiles per endpoint, and the ingest rate and lock contention while
+  it ran. The clients run in a separate process, so they do not compete
+  with the server for the GIL.
+
+The result is one JSON document (stdout or --output). With --baseline the
+run is compared against an earlier result: throughput drops and latency or
+memory increases beyond --tolerance are listed under "regressions", and the
+exit status is 1.
+
+    python3 benchmark.py --rate 50000 --clients 8 --output bench.json
+    python3 benchmark.py --rate 50000 --clients 8 --baseline bench.json
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# endpoint name -> (path, or None for cursor polling)
+ENDPOINTS = {
+    "collector_events": "/api/collector_events?limit=1000",
+    "collector_events_since": None,
+    "programs": "/api/programs",
+    "dump_logs": "/api/dump_logs?format=text",
+}
+
+# (path, direction): 1 = higher is better, -1 = lower is better
+COMPARED_METRICS = [
+    (("ingest", "events_per_sec"), 1),
+    (("memory", "bytes_per_event"), -1),
+] + [
+    (("api", name, key), direction)
+    for name in ENDPOINTS
+    for key, direction in (("requests_per_sec", 1), ("p99_ms", -1))
+]
+
+
+# ------------------------
+# Instrumentation
+# ------------------------
+class TimedLock:
+    """A threading.Lock that counts contended acquisitions and wait and hold times."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._acquired_at = 0
+        self._reset()
+
+    def _reset(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_ns = 0
+        self.max_wait_ns = 0
+        self.hold_ns = 0
+        self.max_hold_ns = 0
+
+    def acquire(self, blocking=True, timeout=-1):
+        waited = 0
+        if not self._lock.acquire(False):
+            if not blocking:
+                return False
+            started = time.perf_counter_ns()
+            if not self._lock.acquire(True, timeout):
+                return False
+            waited = time.perf_counter_ns() - started
+        # Counters are only updated while the lock is held
+        self.acquisitions += 1
+        if waited:
+            self.contended += 1
+            self.wait_ns += waited
+            self.max_wait_ns = max(self.max_wait_ns, waited)
+        self._acquired_at = time.perf_counter_ns()
+        return True
+
+    def release(self):
+        held = time.perf_counter_ns() - self._acquired_at
+        self.hold_ns += held
+        self.max_hold_ns = max(self.max_hold_ns, held)
+        self._lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return True
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def take(self, elapsed):
+        """Return the counters since the last call (over `elapsed` seconds) and reset them."""
+        with self._lock:
+            stats = {
+                "acquisitions": self.acquisitions,
+                "contended": self.contended,
+                "contended_ratio": round(self.contended / self.acquisitions, 4) if self.acquisitions else 0.0,
+                "wait_ms_total": round(self.wait_ns / 1e6, 3),
+                "wait_ms_max": round(self.max_wait_ns / 1e6, 3),
+                "held_percent": round(100.0 * self.hold_ns / (elapsed * 1e9), 2) if elapsed > 0 else 0.0,
+                "hold_ms_max": round(self.max_hold_ns / 1e6, 3),
+            }
+            self._reset()
+        return stats
+
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def latency_summary(seconds):
+    latencies = sorted(seconds)
+    return {
+        "p50_ms": round(percentile(latencies, 0.50) * 1e3, 3) if latencies else None,
+        "p90_ms": round(percentile(latencies, 0.90) * 1e3, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1e3, 3) if latencies else None,
+        "max_ms": round(latencies[-1] * 1e3, 3) if latencies else None,
+    }
+
+
+# ------------------------
+# Clients (separate process)
+# ------------------------
+def client_loop(port, path, since, deadline, result, lock):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    latencies = []
+    errors = 0
+    received = 0
+    while time.monotonic() < deadline:
+        target = path or f"/api/collector_events?since={since}&limit=1000"
+        started = time.perf_counter()
+        try:
+            conn.request("GET", target)
+            response = conn.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            continue
+        elapsed = time.perf_counter() - started
+        if response.status != 200:
+            errors += 1
+            continue
+        latencies.append(elapsed)
+        received += len(body)
+        if path is None:
+            since = json.loads(body)["next"]
+    conn.close()
+    with lock:
+        result["latencies"].extend(latencies)
+        result["errors"] += errors
+        result["bytes"] += received
+
+
+def run_clients(port, path, since, clients, seconds):
+    """Run `clients` threads against `path` for `seconds`; returns raw latencies and counters."""
+    result = {"latencies": [], "errors": 0, "bytes": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=client_loop, args=(port, path, since, deadline, result, lock))
+               for _ in range(clients)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result["elapsed"] = time.monotonic() - started
+    return result
+
+
+# ------------------------
+# Backend under test
+# ------------------------
+def configure_environment(args, workdir):
+    """Point the backend at the synthetic collector and the bpftool stub; must run before importing app."""
+    stub = os.path.join(workdir, "bpftool")
+    os.symlink(os.path.join(BACKEND_DIR, "stub_bpftool.py"), stub)
+    os.environ.update({
+        "PATH": workdir + os.pathsep + os.environ.get("PATH", ""),
+        "K8SSCOPE_SUDO": "",
+        "K8SSCOPE_BPF_BACKEND": "bpftool",
+        "K8SSCOPE_COLLECTOR_BIN": os.path.join(BACKEND_DIR, "synthetic_collector.py"),
+        "K8SSCOPE_COLLECTOR_FORMAT": args.format,
+        "K8SSCOPE_MAX_EVENTS": str(args.max_events),
+        "K8SSCOPE_JOURNAL_DIR": args.journal or "",
+        "K8SSCOPE_PROG_STATS_INTERVAL": "0",
+        "K8SSCOPE_HOST_METRICS_INTERVAL": "0",
+        "K8SSCOPE_SYNTHETIC_RATE": str(args.rate),
+        "K8SSCOPE_SYNTHETIC_COMMS": str(args.comms),
+        "K8SSCOPE_STUB_PROGRAMS": str(args.programs),
+        "K8SSCOPE_STUB_DELAY": str(args.bpftool_delay),
+    })
+
+
+def start_server(app, kind, threads):
+    """Serve `app` on an ephemeral port in a daemon thread; returns (port, stop)."""
+    if kind == "waitress":
+        from waitress.server import create_server
+        server = create_server(app, host="127.0.0.1", port=0, threads=threads, asyncore_use_poll=True,
+                               channel_request_lookahead=1)
+        port, run, stop = server.effective_port, server.run, server.close
+    else:
+        from werkzeug.serving import WSGIRequestHandler, make_server
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        port, run, stop = server.server_port, server.serve_forever, server.shutdown
+    threading.Thread(target=run, name="bench-server", daemon=True).start()
+    return port, stop
+
+
+def default_server():
+    try:
+        import waitress  # noqa: F401
+        return "waitress"
+    except ImportError:
+        return "werkzeug"
+
+
+class Backend:
+    """The imported app module plus the instrumented locks."""
+
+    def __init__(self, app_module):
+        self.app = app_module
+        self.store = app_module.collected_events
+        self.locks = {"event_store": TimedLock(), "aggregates": TimedLock()}
+        self.store.lock = self.locks["event_store"]
+        app_module.collector_stats.lock = self.locks["aggregates"]
+        self.store.clear()
+
+    def start_collector(self, ringbuf_bytes):
+        with self.app.process_lock:
+            self.app.start_collector(ringbuf_bytes)
+        deadline = time.monotonic() + 10
+        while self.store.stats()["last_seq"] == 0:
+            if time.monotonic() > deadline:
+                reader = self.reader()
+                raise RuntimeError(f"collector produced no events: {reader.stats() if reader else 'not started'}")
+            time.sleep(0.05)
+
+    def reader(self):
+        return self.app.process_reader(self.app.DEFAULT_COLLECTOR)
+
+    def take_locks(self, elapsed):
+        return {name: lock.take(elapsed) for name, lock in self.locks.items()}
+
+
+# ------------------------
+# Phases
+# ------------------------
+def measure_ingest(backend, seconds, sample_interval=0.5):
+    store = backend.store
+    backend.take_locks(1)
+    first = store.stats()
+    rss_start = rss_bytes()
+    started = time.monotonic()
+    samples = []
+    while time.monotonic() - started < seconds:
+        time.sleep(sample_interval)
+        stats = store.stats()
+        samples.append({
+            "t": round(time.monotonic() - started, 3),
+            "events": stats["last_seq"] - first["last_seq"],
+            "retained": stats["count"],
+            "store_bytes": stats["bytes"],
+            "rss_bytes": rss_bytes(),
+            "ingest_lag_ms": backend.reader().ingest_lag_ns / 1e6,
+        })
+    elapsed = time.monotonic() - started
+    last = store.stats()
+    reader = backend.reader()
+    generator = getattr(reader.decoder, "last_stats", None)
+    events = last["last_seq"] - first["last_seq"]
+
+    retained_growth = samples[-1]["retained"] - first["count"] if samples else 0
+    rss_growth = samples[-1]["rss_bytes"] - rss_start if samples else 0
+    full = [s for s in samples if s["retained"] >= store.max_events]
+    lags = sorted(s["ingest_lag_ms"] for s in samples)
+    return {
+        "ingest": {
+            "seconds": round(elapsed, 3),
+            "events": events,
+            "events_per_sec": round(events / elapsed, 1),
+            "generator_submitted": generator.submitted if generator else None,
+            "generator_dropped": generator.dropped if generator else None,
+            "loss_ratio": round(generator.dropped / (generator.submitted + generator.dropped), 6)
+            if generator and generator.submitted + generator.dropped else 0.0,
+            "ingest_lag_ms_p50": round(percentile(lags, 0.5), 3) if lags else None,
+            "ingest_lag_ms_max": round(lags[-1], 3) if lags else None,
+            "max_backlog_bytes": reader.max_backlog_bytes,
+            "max_batch_events": reader.max_batch_events,
+        },
+        "memory": {
+            "rss_start_bytes": rss_start,
+            "rss_end_bytes": samples[-1]["rss_bytes"] if samples else rss_start,
+            "retained_events": last["count"],
+            "store_bytes": last["bytes"],
+            "evicted": last["evicted"],
+            # Process growth per retained event, index and aggregates included
+            "bytes_per_event": round(rss_growth / retained_growth, 1) if retained_growth > 0 else None,
+            # Growth once the store is full should be ~0; anything else is a leak
+            "rss_growth_after_full_bytes": full[-1]["rss_bytes"] - full[0]["rss_bytes"] if full else None,
+            "samples": samples,
+        },
+        "locks": backend.take_locks(elapsed),
+    }
+
+
+def measure_endpoint(backend, port, name, clients, seconds, pool):
+    path = ENDPOINTS[name]
+    since = backend.store.stats()["last_seq"]
+    backend.take_locks(1)
+    first = backend.store.stats()["last_seq"]
+    started = time.monotonic()
+    raw = pool.apply(run_clients, (port, path, since, clients, seconds))
+    elapsed = time.monotonic() - started
+    ingested = backend.store.stats()["last_seq"] - first
+    requests = len(raw["latencies"])
+    return {
+        "clients": clients,
+        "requests": requests,
+        "errors": raw["errors"],
+        "requests_per_sec": round(requests / raw["elapsed"], 1),
+        **latency_summary(raw["latencies"]),
+        "bytes_per_response": round(raw["bytes"] / requests) if requests else 0,
+        "ingest_events_per_sec": round(ingested / elapsed, 1),
+        "locks": backend.take_locks(elapsed),
+    }
+
+
+def lookup(result, path):
+    for key in path:
+        if not isinstance(result, dict) or key not in result:
+            return None
+        result = result[key]
+    return result
+
+
+def compare(result, baseline, tolerance):
+    """List metrics that got worse than `baseline` by more than `tolerance` (a fraction)."""
+    regressions = []
+    for path, direction in COMPARED_METRICS:
+        current, previous = lookup(result, path), lookup(baseline, path)
+        if current is None or not previous:
+            continue
+        change = (current - previous) / previous
+        if change * direction < -tolerance:
+            regressions.append({
+                "metric": ".".join(path),
+                "baseline": previous,
+                "current": current,
+                "change_percent": round(100 * change, 1),
+            })
+    return regressions
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the K8sScope ingest and API paths.")
+    parser.add_argument("--format", choices=("binary", "json"), default="binary",
+                        help="collector output format")
+    parser.add_argument("--rate", type=float, default=50000, help="events per second (0 = unpaced)")
+    parser.add_argument("--comms", type=int, default=200, help="distinct comm names in the events")
+    parser.add_argument("--max-events", type=int, default=100000, help="event store capacity")
+    parser.add_argument("--ringbuf-bytes", type=int, default=256 * 1024)
+    parser.add_argument("--journal", default=None, help="journal directory (default: no journal)")
+    parser.add_argument("--ingest-seconds", type=float, default=10)
+    parser.add_argument("--api-seconds", type=float, default=5)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients per endpoint")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS),
+                        help=f"comma-separated subset of {', '.join(ENDPOINTS)} ('' skips the api phase)")
+    parser.add_argument("--programs", type=int, default=50, help="programs reported by the bpftool stub")
+    parser.add_argument("--bpftool-delay", type=float, default=0.02, help="seconds per stub bpftool call")
+    parser.add_argument("--server", choices=("waitress", "werkzeug"), default=default_server())
+    parser.add_argument("--threads", type=int, default=32, help="waitress worker threads")
+    parser.add_argument("--output", help="write the JSON result here instead of stdout")
+    parser.add_argument("--baseline", help="earlier result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed relative change before a metric counts as a regression")
+    args = parser.parse_args(argv)
+    endpoints = [name for name in args.endpoints.split(",") if name]
+    unknown = set(endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    args.endpoints = endpoints
+    return args
+
+
+def main(argv):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="k8sscope-bench-")
+    configure_environment(args, workdir)
+    sys.path.insert(0, BACKEND_DIR)
+    import logging
+    import app as app_module
+    app_module.app.logger.setLevel(logging.WARNING)
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    backend = Backend(app_module)
+    port, stop_server = start_server(app_module.app, args.server, args.threads)
+    result = {
+        "config": {
+            **{key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "started_at": time.time(),
+        },
+    }
+    try:
+        print(f"ingest: {args.rate:g} events/s for {args.ingest_seconds:g}s", file=sys.stderr)
+        backend.start_collector(args.ringbuf_bytes)
+        result.update(measure_ingest(backend, args.ingest_seconds))
+        result["api"] = {}
+        with multiprocessing.get_context("spawn").Pool(1) as pool:
+            for name in args.endpoints:
+                print(f"api: {name} with {args.clients} clients for {args.api_seconds:g}s", file=sys.stderr)
+                result["api"][name] = measure_endpoint(backend, port, name, args.clients, args.api_seconds, pool)
+        result["reader"] = backend.reader().stats()
+    finally:
+        app_module.shutdown()
+        stop_server()
+        os.unlink(os.path.join(workdir, "bpftool"))
+        os.rmdir(workdir)
+
+    status = 0
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        # Results of differently configured runs are not comparable
+        result["baseline_config_diff"] = {
+            key: [value, result["config"].get(key)]
+            for key, value in baseline.get("config", {}).items()
+            if key not in ("started_at", "endpoints") and value != result["config"].get(key)
+        }
+        result["regressions"] = compare(result, baseline, args.tolerance)
+        status = 1 if result["regressions"] else 0
+
+    text = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    for regression in result.get("regressions", []):
+        print(f"regression: {regression['metric']} {regression['baseline']} -> {regression['current']} "
+              f"({regression['change_percent']:+}%)", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+"""
+Backends used by the web API to inspect and manage eBPF objects.
+
+BpftoolBackend shells out to `sudo bpftool` (and `sudo rm` for unpinning),
+exactly like the original endpoints did. SyscallBackend talks to the kernel
+directly through the bpf(2) syscall via ctypes for everything that is a
+simple syscall - enumerating programs and maps, reading their info, reading
+map contents, unpinning - and inherits the bpftool implementation for the
+rest (loading ELF objects, attaching). It needs CAP_SYS_ADMIN/CAP_BPF, so it
+is only used when the backend process runs with enough privileges.
+
+Every method returns (value, error) where error is None on success or a
+message string, mirroring run_command().
+"""
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import platform
+import shutil
+import time
+
+# bpf(2) commands
+BPF_MAP_LOOKUP_ELEM = 1
+BPF_MAP_UPDATE_ELEM = 2
+BPF_MAP_DELETE_ELEM = 3
+BPF_MAP_GET_NEXT_KEY = 4
+BPF_OBJ_PIN = 6
+BPF_OBJ_GET = 7
+BPF_PROG_GET_NEXT_ID = 11
+BPF_MAP_GET_NEXT_ID = 12
+BPF_PROG_GET_FD_BY_ID = 13
+BPF_MAP_GET_FD_BY_ID = 14
+BPF_OBJ_GET_INFO_BY_FD = 15
+BPF_MAP_LOOKUP_BATCH = 24
+BPF_ENABLE_STATS = 32
+
+BPF_STATS_RUN_TIME = 0
+BPF_STATS_SYSCTL = "/proc/sys/kernel/bpf_stats_enabled"
+# Kernel-internal "operation not supported" returned for maps without batch ops
+ENOTSUPP = 524
+BPF_F_RDONLY = 1 << 3
+
+SYS_BPF = {"x86_64": 321, "aarch64": 280, "armv7l": 386, "ppc64le": 361, "s390x": 351, "riscv64": 280}
+
+PROG_TYPES = [
+    "unspec", "socket_filter", "kprobe", "sched_cls", "sched_act", "tracepoint", "xdp",
+    "perf_event", "cgroup_skb", "cgroup_sock", "lwt_in", "lwt_out", "lwt_xmit", "sock_ops",
+    "sk_skb", "cgroup_device", "sk_msg", "raw_tracepoint", "cgroup_sock_addr",
+    "lwt_seg6local", "lirc_mode2", "sk_reuseport", "flow_dissector", "cgroup_sysctl",
+    "raw_tracepoint_writable", "cgroup_sockopt", "tracing", "struct_ops", "ext", "lsm",
+    "sk_lookup", "syscall", "netfilter",
+]
+MAP_TYPES = [
+    "unspec", "hash", "array", "prog_array", "perf_event_array", "percpu_hash",
+    "percpu_array", "stack_trace", "cgroup_array", "lru_hash", "lru_percpu_hash", "lpm_trie",
+    "array_of_maps", "hash_of_maps", "devmap", "sockmap", "cpumap", "xskmap", "sockhash",
+    "cgroup_storage", "reuseport_sockarray", "percpu_cgroup_storage", "queue", "stack",
+    "sk_storage", "devmap_hash", "struct_ops", "ringbuf", "inode_storage", "task_storage",
+    "bloom_filter", "user_ringbuf", "cgrp_storage",
+]
+# Map types whose values are stored once per possible CPU
+PERCPU_MAP_TYPES = {"percpu_hash", "percpu_array", "lru_percpu_hash", "percpu_cgroup_storage"}
+
+
+class BpfProgInfo(ctypes.Structure):
+    """struct bpf_prog_info from <linux/bpf.h>."""
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("id", ctypes.c_uint32),
+        ("tag", ctypes.c_uint8 * 8),
+        ("jited_prog_len", ctypes.c_uint32),
+        ("xlated_prog_len", ctypes.c_uint32),
+        ("jited_prog_insns", ctypes.c_uint64),
+        ("xlated_prog_insns", ctypes.c_uint64),
+        ("load_time", ctypes.c_uint64),
+        ("created_by_uid", ctypes.c_uint32),
+        ("nr_map_ids", ctypes.c_uint32),
+        ("map_ids", ctypes.c_uint64),
+        ("name", ctypes.c_char * 16),
+        ("ifindex", ctypes.c_uint32),
+        ("gpl_compatible", ctypes.c_uint32, 1),
+        ("_pad", ctypes.c_uint32, 31),
+        ("netns_dev", ctypes.c_uint64),
+        ("netns_ino", ctypes.c_uint64),
+        ("nr_jited_ksyms", ctypes.c_uint32),
+        ("nr_jited_func_lens", ctypes.c_uint32),
+        ("jited_ksyms", ctypes.c_uint64),
+        ("jited_func_lens", ctypes.c_uint64),
+        ("btf_id", ctypes.c_uint32),
+        ("func_info_rec_size", ctypes.c_uint32),
+        ("func_info", ctypes.c_uint64),
+        ("nr_func_info", ctypes.c_uint32),
+        ("nr_line_info", ctypes.c_uint32),
+        ("line_info", ctypes.c_uint64),
+        ("jited_line_info", ctypes.c_uint64),
+        ("nr_jited_line_info", ctypes.c_uint32),
+        ("line_info_rec_size", ctypes.c_uint32),
+        ("jited_line_info_rec_size", ctypes.c_uint32),
+        ("nr_prog_tags", ctypes.c_uint32),
+        ("prog_tags", ctypes.c_uint64),
+        ("run_time_ns", ctypes.c_uint64),
+        ("run_cnt", ctypes.c_uint64),
+        ("recursion_misses", ctypes.c_uint64),
+        ("verified_insns", ctypes.c_uint32),
+        ("attach_btf_obj_id", ctypes.c_uint32),
+        ("attach_btf_id", ctypes.c_uint32),
+    ]
+
+
+class BpfMapInfo(ctypes.Structure):
+    """struct bpf_map_info from <linux/bpf.h>."""
+    _fields_ = [
+        ("type", ctypes.c_uint32),
+        ("id", ctypes.c_uint32),
+        ("key_size", ctypes.c_uint32),
+        ("value_size", ctypes.c_uint32),
+        ("max_entries", ctypes.c_uint32),
+        ("map_flags", ctypes.c_uint32),
+        ("name", ctypes.c_char * 16),
+        ("ifindex", ctypes.c_uint32),
+        ("btf_vmlinux_value_type_id", ctypes.c_uint32),
+        ("netns_dev", ctypes.c_uint64),
+        ("netns_ino", ctypes.c_uint64),
+        ("btf_id", ctypes.c_uint32),
+        ("btf_key_type_id", ctypes.c_uint32),
+        ("btf_value_type_id", ctypes.c_uint32),
+        ("_pad", ctypes.c_uint32),
+        ("map_extra", ctypes.c_uint64),
+    ]
+
+
+def _type_name(names, value):
+    return names[value] if value < len(names) else str(value)
+
+
+def possible_cpus():
+    """Number of possible CPUs (the per-CPU value count of percpu maps)."""
+    try:
+        with open("/sys/devices/system/cpu/possible") as f:
+            spec = f.read().strip()
+        count = 0
+        for part in spec.split(","):
+            lo, _, hi = part.partition("-")
+            count += int(hi or lo) - int(lo) + 1
+        return count
+    except (OSError, ValueError):
+        return os.cpu_count() or 1
+
+
+# ------------------------
+# bpftool backend
+# ------------------------
+class BpftoolBackend:
+    name = "bpftool"
+
+    def __init__(self, run_command):
+        self.run_command = run_command
+
+    def _json(self, cmd):
+        stdout, _, error = self.run_command(cmd)
+        if error:
+            return None, error
+        try:
+            return json.loads(stdout), None
+        except json.JSONDecodeError as e:
+            return None, f"JSON decode: {e}"
+
+    def list_programs(self):
+        return self._json(["bpftool", "prog", "show", "--json"])
+
+    def program_info(self, prog_id):
+        return self._json(["bpftool", "prog", "show", "id", str(prog_id), "--json"])
+
+    def list_maps(self):
+        return self._json(["bpftool", "map", "show", "--json"])
+
+    def map_info(self, map_id):
+        return self._json(["bpftool", "map", "show", "id", str(map_id), "--json"])
+
+    def pinned_map_info(self, pin_path):
+        return self._json(["bpftool", "map", "show", "pinned", pin_path, "--json"])
+
+    def map_entries(self, map_id, batch_size=None):
+        """Return [(key_bytes, value_bytes_or_list_of_per_cpu_values)] for a map."""
+        dump, error = self._json(["bpftool", "map", "dump", "id", str(map_id), "--json"])
+        if error:
+            return None, error
+        entries = []
+        for item in dump:
+            key = bytes(int(b, 16) for b in item.get("key", []))
+            if "values" in item:
+                value = [bytes(int(b, 16) for b in v.get("value", [])) for v in item["values"]]
+            else:
+                value = bytes(int(b, 16) for b in item.get("value", []))
+            entries.append((key, value))
+        return entries, None
+
+    def map_update(self, map_id, key, value):
+        cmd = ["bpftool", "map", "update", "id", str(map_id),
+               "key", "hex", *(f"{b:02x}" for b in key),
+               "value", "hex", *(f"{b:02x}" for b in value)]
+        _, _, error = self.run_command(cmd)
+        return None, error
+
+    def map_delete(self, map_id, key):
+        cmd = ["bpftool", "map", "delete", "id", str(map_id), "key", "hex", *(f"{b:02x}" for b in key)]
+        _, _, error = self.run_command(cmd)
+        return None, error
+
+    def load(self, program_path, pin_path):
+        _, _, error = self.run_command(["bpftool", "prog", "loadall", program_path, pin_path])
+        return None, error
+
+    def pin(self, prog_id, pin_path):
+        _, _, error = self.run_command(["bpftool", "prog", "pin", "id", str(prog_id), pin_path])
+        return None, error
+
+    def unload(self, pin_path):
+        _, _, error = self.run_command(["rm", "-rf", pin_path])
+        return None, error
+
+    def attach(self, pin_path, attach_type, target):
+        if attach_type == "tracepoint":
+            cmd = ["bpftool", "prog", "attach", "pinned", pin_path, "tracepoint", target]
+        else:
+            cmd = ["bpftool", "net", "attach", "xdp", "dev", target, "pinned", pin_path]
+        _, _, error = self.run_command(cmd)
+        return None, error
+
+    def detach(self, pin_path, attach_type, target):
+        if attach_type == "tracepoint":
+            cmd = ["bpftool", "prog", "detach", "pinned", pin_path, "tracepoint", target]
+        else:
+            cmd = ["bpftool", "net", "detach", "xdp", "dev", target]
+        _, _, error = self.run_command(cmd)
+        return None, error
+
+    def enable_stats(self):
+        """
+        Turn on run_time_ns/run_cnt accounting unless it already is on;
+        returns a handle for disable_stats(), which restores the previous
+        setting. The current value is read from /proc without sudo.
+        """
+        try:
+            with open(BPF_STATS_SYSCTL) as f:
+                previous = f.read().strip()
+        except OSError as e:
+            return None, f"{BPF_STATS_SYSCTL}: {e.strerror}"
+        if previous != "0":
+            # Already enabled (e.g. by an administrator): leave it alone
+            return previous, None
+        _, _, error = self.run_command(["sysctl", "-w", "kernel.bpf_stats_enabled=1"])
+        return (previous if not error else None), error
+
+    def disable_stats(self, handle):
+        if handle != "0":
+            return None, None
+        _, _, error = self.run_command(["sysctl", "-w", "kernel.bpf_stats_enabled=0"])
+        return None, error
+
+
+# ------------------------
+# bpf(2) syscall backend
+# ------------------------
+class SyscallBackend(BpftoolBackend):
+    name = "syscall"
+    ATTR_SIZE = 128
+
+    def __init__(self, run_command):
+        super().__init__(run_command)
+        nr = SYS_BPF.get(platform.machine())
+        if nr is None:
+            raise OSError(errno.ENOSYS, f"bpf syscall number unknown for {platform.machine()}")
+        self._nr = nr
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc.syscall.restype = ctypes.c_long
+        self._boot_time = time.time() - time.clock_gettime(time.CLOCK_BOOTTIME)
+        self.ncpus = possible_cpus()
+
+    # -- raw syscall helpers --
+    def _bpf(self, cmd, attr):
+        ret = self._libc.syscall(self._nr, ctypes.c_int(cmd), ctypes.byref(attr), ctypes.c_uint(ctypes.sizeof(attr)))
+        if ret < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        return ret
+
+    def _attr(self, *fields):
+        """Build a zeroed bpf_attr and fill (offset, ctype, value) fields."""
+        attr = (ctypes.c_uint8 * self.ATTR_SIZE)()
+        for offset, ctype, value in fields:
+            ctype.from_buffer(attr, offset).value = value
+        return attr
+
+    def _next_id(self, cmd, start_id):
+        attr = self._attr((0, ctypes.c_uint32, start_id))
+        try:
+            self._bpf(cmd, attr)
+        except OSError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        return ctypes.c_uint32.from_buffer(attr, 4).value
+
+    def _iter_ids(self, cmd):
+        current = 0
+        while True:
+            current = self._next_id(cmd, current)
+            if current is None:
+                return
+            yield current
+
+    def _fd_by_id(self, cmd, obj_id, flags=0):
+        return self._bpf(cmd, self._attr((0, ctypes.c_uint32, obj_id), (8, ctypes.c_uint32, flags)))
+
+    def _info_by_fd(self, fd, info):
+        attr = self._attr(
+            (0, ctypes.c_uint32, fd),
+            (4, ctypes.c_uint32, ctypes.sizeof(info)),
+            (8, ctypes.c_uint64, ctypes.addressof(info)),
+        )
+        self._bpf(BPF_OBJ_GET_INFO_BY_FD, attr)
+        return info
+
+    @staticmethod
+    def _memlock(fd):
+        try:
+            with open(f"/proc/self/fdinfo/{fd}") as f:
+                for line in f:
+                    if line.startswith("memlock:"):
+                        return int(line.split()[1])
+        except (OSError, ValueError):
+            pass
+        return None
+
+    # -- programs --
+    def _prog_info(self, prog_id):
+        fd = self._fd_by_id(BPF_PROG_GET_FD_BY_ID, prog_id)
+        try:
+            info = self._info_by_fd(fd, BpfProgInfo())
+            map_ids = []
+            if info.nr_map_ids:
+                ids = (ctypes.c_uint32 * info.nr_map_ids)()
+                second = BpfProgInfo()
+                second.nr_map_ids = info.nr_map_ids
+                second.map_ids = ctypes.addressof(ids)
+                self._info_by_fd(fd, second)
+                map_ids = list(ids)
+            memlock = self._memlock(fd)
+        finally:
+            os.close(fd)
+        prog = {
+            "id": info.id,
+            "type": _type_name(PROG_TYPES, info.type),
+            "name": info.name.decode(errors="replace"),
+            "tag": bytes(info.tag).hex(),
+            "gpl_compatible": bool(info.gpl_compatible),
+            "loaded_at": int(self._boot_time + info.load_time / 1e9),
+            "uid": info.created_by_uid,
+            "orphaned": False,
+            "bytes_xlated": info.xlated_prog_len,
+            "jited": info.jited_prog_len > 0,
+            "bytes_jited": info.jited_prog_len,
+            "map_ids": map_ids,
+            "btf_id": info.btf_id,
+            "run_time_ns": info.run_time_ns,
+            "run_cnt": info.run_cnt,
+        }
+        if memlock is not None:
+            prog["bytes_memlock"] = memlock
+        return prog
+
+    def list_programs(self):
+        programs = []
+        try:
+            for prog_id in self._iter_ids(BPF_PROG_GET_NEXT_ID):
+                try:
+                    programs.append(self._prog_info(prog_id))
+                except OSError as e:
+                    if e.errno != errno.ENOENT:   # unloaded while iterating
+                        raise
+        except OSError as e:
+            return None, f"bpf(PROG_GET_NEXT_ID): {e.strerror}"
+        return programs, None
+
+    def program_info(self, prog_id):
+        try:
+            return self._prog_info(prog_id), None
+        except OSError as e:
+            return None, f"bpf(PROG_GET_FD_BY_ID {prog_id}): {e.strerror}"
+
+    # -- maps --
+    def _map_info_by_fd(self, fd):
+        info = self._info_by_fd(fd, BpfMapInfo())
+        result = {
+            "id": info.id,
+            "type": _type_name(MAP_TYPES, info.type),
+            "name": info.name.decode(errors="replace"),
+            "flags": info.map_flags,
+            "bytes_key": info.key_size,
+            "bytes_value": info.value_size,
+            "max_entries": info.max_entries,
+            "btf_id": info.btf_id,
+        }
+        memlock = self._memlock(fd)
+        if memlock is not None:
+            result["bytes_memlock"] = memlock
+        return result
+
+    def _open_map(self, map_id, flags=BPF_F_RDONLY):
+        return self._fd_by_id(BPF_MAP_GET_FD_BY_ID, map_id, flags)
+
+    def list_maps(self):
+        maps = []
+        try:
+            for map_id in self._iter_ids(BPF_MAP_GET_NEXT_ID):
+                try:
+                    fd = self._open_map(map_id)
+                except OSError as e:
+                    if e.errno == errno.ENOENT:
+                        continue
+                    raise
+                try:
+                    maps.append(self._map_info_by_fd(fd))
+                finally:
+                    os.close(fd)
+        except OSError as e:
+            return None, f"bpf(MAP_GET_NEXT_ID): {e.strerror}"
+        return maps, None
+
+    def map_info(self, map_id):
+        try:
+            fd = self._open_map(map_id)
+        except OSError as e:
+            return None, f"bpf(MAP_GET_FD_BY_ID {map_id}): {e.strerror}"
+        try:
+            return self._map_info_by_fd(fd), None
+        finally:
+            os.close(fd)
+
+    def pinned_map_info(self, pin_path):
+        path = ctypes.create_string_buffer(os.fsencode(pin_path))
+        try:
+            fd = self._bpf(BPF_OBJ_GET, self._attr((0, ctypes.c_uint64, ctypes.addressof(path))))
+        except OSError as e:
+            return None, f"bpf(OBJ_GET {pin_path}): {e.strerror}"
+        try:
+            return self._map_info_by_fd(fd), None
+        finally:
+            os.close(fd)
+
+    def _value_size(self, info):
+        size = info["bytes_value"]
+        if info["type"] in PERCPU_MAP_TYPES:
+            return ((size + 7) // 8 * 8) * self.ncpus
+        return size
+
+    def _split_value(self, info, raw):
+        if info["type"] not in PERCPU_MAP_TYPES:
+            return raw
+        stride = (info["bytes_value"] + 7) // 8 * 8
+        return [raw[i * stride:i * stride + info["bytes_value"]] for i in range(self.ncpus)]
+
+    def _entries_by_key(self, fd, info):
+        """Walk the map with GET_NEXT_KEY + LOOKUP_ELEM (two syscalls per entry)."""
+        key_size = info["bytes_key"]
+        key = (ctypes.c_uint8 * max(key_size, 1))()
+        next_key = (ctypes.c_uint8 * max(key_size, 1))()
+        value = (ctypes.c_uint8 * max(self._value_size(info), 1))()
+        entries = []
+        have_key = False
+        while True:
+            attr = self._attr(
+                (0, ctypes.c_uint32, fd),
+                (8, ctypes.c_uint64, ctypes.addressof(key) if have_key else 0),
+                (16, ctypes.c_uint64, ctypes.addressof(next_key)),
+            )
+            try:
+                self._bpf(BPF_MAP_GET_NEXT_KEY, attr)
+            except OSError as e:
+                if e.errno == errno.ENOENT:
+                    break
+                raise
+            ctypes.memmove(key, next_key, key_size)
+            have_key = True
+            attr = self._attr(
+                (0, ctypes.c_uint32, fd),
+                (8, ctypes.c_uint64, ctypes.addressof(key)),
+                (16, ctypes.c_uint64, ctypes.addressof(value)),
+            )
+            try:
+                self._bpf(BPF_MAP_LOOKUP_ELEM, attr)
+            except OSError as e:
+                if e.errno == errno.ENOENT:   # deleted meanwhile
+                    continue
+                raise
+            entries.append((bytes(key)[:key_size], self._split_value(info, bytes(value))))
+        return entries
+
+    def _entries_batched(self, fd, info, batch_size):
+        """
+        Read the map with BPF_MAP_LOOKUP_BATCH, `batch_size` entries per
+        syscall. Raises OSError(EINVAL/ENOTSUPP) on kernels or map types
+        without batch support.
+        """
+        key_size = info["bytes_key"]
+        value_size = self._value_size(info)
+        # The batch token is a key for array maps and a u32 bucket for hashes
+        token_size = max(key_size, 4)
+        in_batch = (ctypes.c_uint8 * token_size)()
+        out_batch = (ctypes.c_uint8 * token_size)()
+        entries = []
+        first = True
+        while True:
+            keys = (ctypes.c_uint8 * (key_size * batch_size))()
+            values = (ctypes.c_uint8 * (value_size * batch_size))()
+            attr = self._attr(
+                (0, ctypes.c_uint64, 0 if first else ctypes.addressof(in_batch)),
+                (8, ctypes.c_uint64, ctypes.addressof(out_batch)),
+                (16, ctypes.c_uint64, ctypes.addressof(keys)),
+                (24, ctypes.c_uint64, ctypes.addressof(values)),
+                (32, ctypes.c_uint32, batch_size),
+                (36, ctypes.c_uint32, fd),
+            )
+            done = False
+            try:
+                self._bpf(BPF_MAP_LOOKUP_BATCH, attr)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    # A hash bucket holds more entries than fit in one batch
+                    batch_size *= 2
+                    continue
+                if e.errno != errno.ENOENT:
+                    raise
+                done = True   # the last (possibly partial) batch
+            count = ctypes.c_uint32.from_buffer(attr, 32).value
+            raw_keys = bytes(keys)
+            raw_values = bytes(values)
+            for i in range(count):
+                entries.append((raw_keys[i * key_size:(i + 1) * key_size],
+                                self._split_value(info, raw_values[i * value_size:(i + 1) * value_size])))
+            if done:
+                return entries
+            ctypes.memmove(in_batch, out_batch, token_size)
+            first = False
+
+    def map_entries(self, map_id, batch_size=256):
+        try:
+            fd = self._open_map(map_id)
+        except OSError as e:
+            return None, f"bpf(MAP_GET_FD_BY_ID {map_id}): {e.strerror}"
+        try:
+            info = self._map_info_by_fd(fd)
+            try:
+                return self._entries_batched(fd, info, batch_size), None
+            except OSError as e:
+                if e.errno not in (errno.EINVAL, ENOTSUPP, errno.EOPNOTSUPP, errno.ENOSYS):
+                    raise
+            return self._entries_by_key(fd, info), None
+        except OSError as e:
+            return None, f"bpf map {map_id}: {e.strerror}"
+        finally:
+            os.close(fd)
+
+    def _map_write(self, cmd, map_id, key, value=None):
+        try:
+            fd = self._open_map(map_id, flags=0)
+        except OSError as e:
+            return None, f"bpf(MAP_GET_FD_BY_ID {map_id}): {e.strerror}"
+        try:
+            key_buf = ctypes.create_string_buffer(bytes(key), len(key))
+            fields = [(0, ctypes.c_uint32, fd), (8, ctypes.c_uint64, ctypes.addressof(key_buf))]
+            if value is not None:
+                value_buf = ctypes.create_string_buffer(bytes(value), len(value))
+                fields.append((16, ctypes.c_uint64, ctypes.addressof(value_buf)))
+            self._bpf(cmd, self._attr(*fields))
+            return None, None
+        except OSError as e:
+            return None, f"bpf map {map_id}: {e.strerror}"
+        finally:
+            os.close(fd)
+
+    def map_update(self, map_id, key, value):
+        return self._map_write(BPF_MAP_UPDATE_ELEM, map_id, key, value)
+
+    def map_delete(self, map_id, key):
+        return self._map_write(BPF_MAP_DELETE_ELEM, map_id, key)
+
+    # -- pins --
+    def pin(self, prog_id, pin_path):
+        try:
+            fd = self._fd_by_id(BPF_PROG_GET_FD_BY_ID, prog_id)
+        except OSError as e:
+            return None, f"bpf(PROG_GET_FD_BY_ID {prog_id}): {e.strerror}"
+        try:
+            path = ctypes.create_string_buffer(os.fsencode(pin_path))
+            self._bpf(BPF_OBJ_PIN, self._attr((0, ctypes.c_uint64, ctypes.addressof(path)), (8, ctypes.c_uint32, fd)))
+            return None, None
+        except OSError as e:
+            return None, f"bpf(OBJ_PIN {pin_path}): {e.strerror}"
+        finally:
+            os.close(fd)
+
+    def unload(self, pin_path):
+        """Remove a pin (or a directory of pins) from bpffs without forking."""
+        try:
+            if os.path.isdir(pin_path) and not os.path.islink(pin_path):
+                shutil.rmtree(pin_path)
+            else:
+                os.unlink(pin_path)
+            return None, None
+        except OSError as e:
+            return None, f"{pin_path}: {e.strerror}"
+
+    # -- runtime statistics --
+    def enable_stats(self):
+        """Enable run-time stats; they stay on until the returned fd is closed."""
+        try:
+            return self._bpf(BPF_ENABLE_STATS, self._attr((0, ctypes.c_uint32, BPF_STATS_RUN_TIME))), None
+        except OSError as e:
+            return None, f"bpf(ENABLE_STATS): {e.strerror}"
+
+    def disable_stats(self, handle):
+        os.close(handle)
+        return None, None
+
+    def probe(self):
+        """Raise OSError unless the syscall is usable with our privileges."""
+        self._next_id(BPF_PROG_GET_NEXT_ID, 0)
+
+
+def create_backend(preference, run_command, logger=None):
+    """
+    Return the backend for `preference` ("auto", "syscall" or "bpftool").
+    "auto" uses the syscall backend when it is usable and bpftool otherwise;
+    an explicit "syscall" raises RuntimeError if the syscall is unusable
+    instead of quietly running on bpftool.
+    """
+    if preference not in ("auto", "syscall", "bpftool"):
+        raise ValueError(f"Unknown eBPF backend {preference!r} (expected auto, syscall or bpftool)")
+    if preference in ("auto", "syscall"):
+        try:
+            backend = SyscallBackend(run_command)
+            backend.probe()
+            return backend
+        except OSError as e:
+            if preference == "syscall":
+                raise RuntimeError(f"bpf syscall backend unavailable: {e}") from e
+            if logger:
+                logger.info(f"bpf syscall backend unavailable ({e}); using bpftool")
+    return BpftoolBackend(run_command)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import threading
+import time
+
+
+class _Flight:
+    """One in-progress loader call and its outcome."""
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlightCache:
+    """
+    Cache the result of an expensive `loader()` call for `ttl` seconds.
+
+    Concurrent callers that find the entry stale share one loader call: the
+    first becomes the leader and runs it, the rest wait for its result.
+    invalidate() drops the entry; a load that was already in flight when
+    invalidate() was called still answers its waiters but is not cached.
+    get(stale_ok=True) returns a stale entry at once and reloads it on a
+    background thread instead, so only a cold cache makes a caller wait.
+    """
+
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._expires = 0.0
+        self._generation = 0
+        self._inflight = None   # _Flight of the running load
+        self.loads = 0
+        self.hits = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+
+    def get(self, stale_ok=False):
+        with self._lock:
+            if self._value is not None and time.monotonic() < self._expires:
+                self.hits += 1
+                return self._value
+            if stale_ok and self._value is not None:
+                self.stale_hits += 1
+                if self._inflight is None:
+                    flight = self._inflight = _Flight()
+                    threading.Thread(target=self._load, args=(flight, self._generation),
+                                     name="cache-refresh", daemon=True).start()
+                return self._value
+            flight = self._inflight
+            leader = flight is None
+            if leader:
+                flight = self._inflight = _Flight()
+                generation = self._generation
+            else:
+                self.coalesced += 1
+
+        if leader:
+            self._load(flight, generation)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _load(self, flight, generation):
+        try:
+            flight.value = self.loader()
+        except Exception as ex:
+            flight.error = ex
+        with self._lock:
+            self.loads += 1
+            if self._inflight is flight:
+                self._inflight = None
+            if flight.error is None and generation == self._generation:
+                self._value = flight.value
+                self._expires = time.monotonic() + self.ttl
+        flight.done.set()
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._value = None
+            self._expires = 0.0
+            # Later callers must not join a load that started before now
+            self._inflight = None
+
+    def stats(self):
+        with self._lock:
+            return {"loads": self.loads, "hits": self.hits, "coalesced": self.coalesced,
+                    "stale_hits": self.stale_hits, "ttl": self.ttl}
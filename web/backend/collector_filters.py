@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Live access to the exec collector's in-kernel filter maps.
+
+exec.bpf.c checks every execve against three filters before reserving ring
+buffer space: the task's comm, the filename prefix and the cgroup id. Each
+filter has a mode (off, allow or deny) in the `filter_config` map and a set of
+values in its own map. The collector pins these maps by name under its pin
+root, so they can be read and updated here through the bpf backend while the
+program runs. Keep the encodings in sync with ebpf/exec_syscall/exec.h.
+"""
+import os
+import struct
+
+FILTER_MODES = {"off": 0, "allow": 1, "deny": 2}
+FILTER_MODE_NAMES = {value: name for name, value in FILTER_MODES.items()}
+
+# struct exec_filter_config { comm_mode; file_mode; cgroup_mode; }
+FILTER_CONFIG = struct.Struct("=III")
+# struct exec_file_key { unsigned int prefixlen; char data[32]; }
+FILE_KEY = struct.Struct("=I32s")
+CGROUP_KEY = struct.Struct("=Q")
+COMM_LEN = 16
+# The program reads the filename with bpf_probe_read_user_str() into the
+# 32-byte key, so its last byte is always NUL and a 32-byte prefix could
+# never match.
+FILE_PREFIX_MAX = FILE_KEY.size - 4 - 1
+PRESENT = b"\x01"
+ZERO_KEY = struct.pack("=I", 0)
+
+
+class FilterError(ValueError):
+    """An invalid filter specification."""
+
+
+class FiltersUnavailable(LookupError):
+    """The filter maps are not pinned (the collector has not been loaded)."""
+
+
+def _encode_comm(comm):
+    raw = str(comm).encode()
+    if not raw or len(raw) >= COMM_LEN:
+        raise FilterError(f"comm must be 1-{COMM_LEN - 1} bytes: {comm!r}")
+    return raw.ljust(COMM_LEN, b"\0")
+
+
+def _decode_comm(key):
+    return key.split(b"\0", 1)[0].decode(errors="replace")
+
+
+def _encode_file(prefix):
+    raw = str(prefix).encode()
+    if not raw or len(raw) > FILE_PREFIX_MAX:
+        raise FilterError(f"file prefix must be 1-{FILE_PREFIX_MAX} bytes: {prefix!r}")
+    return FILE_KEY.pack(len(raw) * 8, raw)
+
+
+def _decode_file(key):
+    prefixlen, data = FILE_KEY.unpack(key)
+    return data[:prefixlen // 8].decode(errors="replace")
+
+
+def _encode_cgroup(cgroup_id):
+    try:
+        return CGROUP_KEY.pack(int(cgroup_id))
+    except (TypeError, ValueError, struct.error):
+        raise FilterError(f"cgroup id must be an unsigned 64-bit integer: {cgroup_id!r}")
+
+
+def _decode_cgroup(key):
+    return CGROUP_KEY.unpack(key)[0]
+
+
+# filter name -> (pinned map name, encode, decode)
+FILTERS = {
+    "comm": ("comm_filter", _encode_comm, _decode_comm),
+    "file_prefix": ("file_filter", _encode_file, _decode_file),
+    "cgroup": ("cgroup_filter", _encode_cgroup, _decode_cgroup),
+}
+
+
+class CollectorFilters:
+    def __init__(self, backend, pin_root):
+        self.backend = backend
+        self.pin_root = pin_root
+
+    def _map_id(self, name):
+        info, error = self.backend.pinned_map_info(os.path.join(self.pin_root, name))
+        if error:
+            raise FiltersUnavailable(f"filter map {name} is not pinned under {self.pin_root} "
+                                     f"(has the collector been started?): {error}")
+        return info["id"]
+
+    def _config(self, config_id):
+        entries, error = self.backend.map_entries(config_id)
+        if error:
+            raise RuntimeError(error)
+        for key, value in entries:
+            if key == ZERO_KEY:
+                return list(FILTER_CONFIG.unpack(value[:FILTER_CONFIG.size]))
+        return [0, 0, 0]
+
+    def get(self):
+        """Return {filter: {"mode": ..., "values": [...]}} as set in the kernel."""
+        modes = self._config(self._map_id("filter_config"))
+        result = {}
+        for i, (name, (map_name, _, decode)) in enumerate(FILTERS.items()):
+            entries, error = self.backend.map_entries(self._map_id(map_name))
+            if error:
+                raise RuntimeError(error)
+            result[name] = {
+                "mode": FILTER_MODE_NAMES.get(modes[i], str(modes[i])),
+                "values": sorted(decode(key) for key, _ in entries),
+            }
+        return result
+
+    def update(self, spec):
+        """
+        Apply {filter: {"mode": ..., "values": [...]}}. Filters missing from
+        `spec` are left alone; a given `values` list replaces the current set.
+        Values are updated before the mode so that switching to allow mode
+        never briefly drops everything.
+        """
+        plans = []
+        for name, change in spec.items():
+            if name not in FILTERS:
+                raise FilterError(f"unknown filter {name!r} (expected one of {', '.join(FILTERS)})")
+            if not isinstance(change, dict):
+                raise FilterError(f"filter {name!r} must be an object")
+            mode = change.get("mode")
+            if mode is not None and mode not in FILTER_MODES:
+                raise FilterError(f"invalid mode {mode!r} for {name!r}")
+            values = change.get("values")
+            if values is not None and not isinstance(values, list):
+                raise FilterError(f"'values' of {name!r} must be a list")
+            map_name, encode, _ = FILTERS[name]
+            keys = None if values is None else {encode(v) for v in values}
+            plans.append((list(FILTERS).index(name), map_name, mode, keys))
+
+        config_id = self._map_id("filter_config")
+        modes = self._config(config_id)
+        for position, map_name, mode, keys in plans:
+            if keys is not None:
+                self._replace(self._map_id(map_name), keys)
+            if mode is not None:
+                modes[position] = FILTER_MODES[mode]
+        _, error = self.backend.map_update(config_id, ZERO_KEY, FILTER_CONFIG.pack(*modes))
+        if error:
+            raise RuntimeError(error)
+        return self.get()
+
+    def _replace(self, map_id, keys):
+        entries, error = self.backend.map_entries(map_id)
+        if error:
+            raise RuntimeError(error)
+        current = {key for key, _ in entries}
+        for key in keys - current:
+            _, error = self.backend.map_update(map_id, key, PRESENT)
+            if error:
+                raise RuntimeError(error)
+        for key in current - keys:
+            _, error = self.backend.map_delete(map_id, key)
+            if error:
+                raise RuntimeError(error)
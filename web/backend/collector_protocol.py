@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Decoders for the output of the exec collector (ebpf/exec_syscall/exec.c).
+
+The collector writes either framed binary records (the default when stdout is
+a pipe) or newline-delimited JSON. Both decoders accept arbitrary chunks of
+bytes, keep any trailing partial record for the next call, and return the
+complete events as ExecEvent records; flush() is called once the pipe closes
+and returns what a final unterminated line still holds. The collector's periodic loss counters
+are not events; the decoders keep the newest two in `last_stats` and
+`prev_stats`. TextLineDecoder does the same for plain line-oriented output
+such as userspace programs.
+"""
+import json
+import struct
+from collections import namedtuple
+
+# struct exec_record_hdr { unsigned int len; unsigned int type; }
+RECORD_HEADER = struct.Struct("=II")
+# struct exec_record_evt { unsigned long long ts_ns; struct exec_evt evt; }
+# struct exec_evt { pid_t pid; pid_t tgid; char comm[32]; char file[32];
+#                   unsigned long long cgroup_id; }
+RECORD_EVT = struct.Struct("=Qii32s32sQ")
+# struct exec_record_stats { ts_ns, submitted, dropped, consumed, ringbuf_bytes, filtered }
+RECORD_STATS = struct.Struct("=QQQQQQ")
+
+EXEC_RECORD_EVT = 1
+EXEC_RECORD_STATS = 2
+# Largest payload a valid header can announce. Anything longer is a corrupt
+# or misaligned header; waiting for that many bytes would stall the stream.
+MAX_RECORD_BYTES = 4096
+
+# Approximate per-event memory footprint, used for the store's byte limit
+EVENT_OVERHEAD_BYTES = 120
+
+
+class ExecEvent(namedtuple("ExecEvent", ["ts", "pid", "tgid", "comm", "file", "cgroup_id"], defaults=(0,))):
+    """
+    A single execve event. `ts` is a UNIX timestamp in nanoseconds and
+    `cgroup_id` the cgroup v2 id of the task (0 if unknown).
+    """
+    __slots__ = ()
+
+    def to_dict(self):
+        return {
+            "ts": self.ts,
+            "pid": self.pid,
+            "tgid": self.tgid,
+            "comm": self.comm,
+            "file": self.file,
+            "cgroup_id": self.cgroup_id,
+        }
+
+    def format_line(self):
+        """Render the event in the collector's human readable text format."""
+        return f"tgid: {self.tgid} <> pid: {self.pid} -- comm: {self.comm} <> file: {self.file}"
+
+
+class CollectorStats(namedtuple("CollectorStats",
+                                ["ts", "submitted", "dropped", "consumed", "ringbuf_bytes", "filtered"])):
+    """Loss counters reported by the collector since it started."""
+    __slots__ = ()
+
+
+def event_size(event):
+    """Approximate size of an ExecEvent in bytes."""
+    return EVENT_OVERHEAD_BYTES + len(event.comm) + len(event.file)
+
+
+def _cstr(raw):
+    return raw.split(b"\0", 1)[0].decode("utf-8", "replace")
+
+
+class BinaryRecordDecoder:
+    """
+    Decode length-prefixed exec_record frames.
+
+    A header announcing more than MAX_RECORD_BYTES is counted as skipped and
+    the decoder resyncs: it scans forward for the next header of a known
+    record type and size and drops the bytes in between.
+    """
+
+    # Headers the collector writes, searched for when resyncing
+    SYNC_HEADERS = (
+        RECORD_HEADER.pack(RECORD_EVT.size, EXEC_RECORD_EVT),
+        RECORD_HEADER.pack(RECORD_STATS.size, EXEC_RECORD_STATS),
+    )
+
+    def __init__(self):
+        self._buffer = b""
+        self._resyncing = False
+        self.skipped = 0   # records of unknown type or size, and corrupt headers
+        self.last_stats = None
+        self.prev_stats = None
+
+    def feed(self, data):
+        buf = self._buffer + data if self._buffer else data
+        events = []
+        offset = 0
+        end = len(buf)
+        header_size = RECORD_HEADER.size
+        unpack_header = RECORD_HEADER.unpack_from
+        unpack_evt = RECORD_EVT.unpack_from
+        evt_size = RECORD_EVT.size
+        while end - offset >= header_size:
+            if self._resyncing:
+                offset = self._resync(buf, offset)
+                if self._resyncing:
+                    break
+            length, rtype = unpack_header(buf, offset)
+            if length > MAX_RECORD_BYTES:
+                self.skipped += 1
+                self._resyncing = True
+                offset += 1
+                continue
+            if end - offset - header_size < length:
+                break
+            body = offset + header_size
+            if rtype == EXEC_RECORD_EVT and length >= evt_size:
+                ts, pid, tgid, comm, file, cgroup_id = unpack_evt(buf, body)
+                events.append(ExecEvent(ts, pid, tgid, _cstr(comm), _cstr(file), cgroup_id))
+            elif rtype == EXEC_RECORD_STATS and length >= RECORD_STATS.size:
+                self.prev_stats = self.last_stats
+                self.last_stats = CollectorStats(*RECORD_STATS.unpack_from(buf, body))
+            else:
+                self.skipped += 1
+            offset = body + length
+        self._buffer = buf[offset:]
+        return events
+
+    def _resync(self, buf, offset):
+        """Return the offset of the next known header, or where to resume the search."""
+        found = [pos for pos in (buf.find(header, offset) for header in self.SYNC_HEADERS) if pos >= 0]
+        if found:
+            self._resyncing = False
+            return min(found)
+        # Keep a possible partial header for the next call
+        return max(offset, len(buf) - RECORD_HEADER.size + 1)
+
+    def flush(self):
+        """Called at end of input; a truncated trailing record is counted as skipped."""
+        if self._buffer and not self._resyncing:
+            self.skipped += 1
+        self._buffer = b""
+        self._resyncing = False
+        return []
+
+
+class JsonLineDecoder:
+    """Decode newline-delimited JSON events."""
+
+    def __init__(self):
+        self._buffer = b""
+        self.skipped = 0   # lines that were not valid event objects
+        self.last_stats = None
+        self.prev_stats = None
+
+    def feed(self, data):
+        buf = self._buffer + data if self._buffer else data
+        lines = buf.split(b"\n")
+        self._buffer = lines.pop()
+        events = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+                if not isinstance(obj, dict):
+                    self.skipped += 1
+                    continue
+                if obj.get("type") == "stats":
+                    self.prev_stats = self.last_stats
+                    self.last_stats = CollectorStats(obj["ts"], obj["submitted"], obj["dropped"],
+                                                     obj["consumed"], obj["ringbuf_bytes"], obj.get("filtered", 0))
+                    continue
+                events.append(ExecEvent(obj["ts"], obj["pid"], obj["tgid"], obj["comm"], obj["file"],
+                                        obj.get("cgroup_id", 0)))
+            except (ValueError, KeyError, TypeError):
+                self.skipped += 1
+        return events
+
+    def flush(self):
+        """Called at end of input; decode a last line that had no newline."""
+        return self.feed(b"\n") if self._buffer else []
+
+
+class TextLineDecoder:
+    """Decode plain text output into stripped, non-empty lines."""
+
+    def __init__(self):
+        self._buffer = b""
+        self.skipped = 0
+
+    def feed(self, data):
+        buf = self._buffer + data if self._buffer else data
+        lines = buf.split(b"\n")
+        self._buffer = lines.pop()
+        return [text for text in (line.decode("utf-8", "replace").strip() for line in lines) if text]
+
+    def flush(self):
+        """Called at end of input; return a last line that had no newline."""
+        return self.feed(b"\n") if self._buffer else []
+
+
+DECODERS = {
+    "binary": BinaryRecordDecoder,
+    "json": JsonLineDecoder,
+    "text": TextLineDecoder,
+}
+
+
+def make_decoder(fmt):
+    """Return a new decoder for the given collector --format value."""
+    try:
+        return DECODERS[fmt]()
+    except KeyError:
+        raise ValueError(f"Unsupported collector format: {fmt}")
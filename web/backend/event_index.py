@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Secondary indexes over the collector EventStore.
+
+ExecEventIndex keeps one posting list of sequence numbers per comm and per
+file. It is attached to an EventStore and maintained incrementally under the
+store's lock: appends add the new sequence number, evictions drop it again.
+Because sequence numbers are appended in increasing order and evicted
+oldest-first, both operations are O(1) and each posting list stays sorted,
+so queries can bisect into it.
+"""
+import bisect
+import heapq
+
+
+class PostingList:
+    """Sorted list of sequence numbers with O(1) removal from the front."""
+    __slots__ = ("seqs", "start")
+
+    def __init__(self):
+        self.seqs = []
+        self.start = 0
+
+    def append(self, seq):
+        self.seqs.append(seq)
+
+    def pop_front(self):
+        self.start += 1
+        # Compact once the dead prefix dominates the list
+        if self.start > 64 and self.start * 2 > len(self.seqs):
+            del self.seqs[:self.start]
+            self.start = 0
+
+    def __len__(self):
+        return len(self.seqs) - self.start
+
+    def iter_from(self, seq):
+        """Yield sequence numbers >= seq."""
+        seqs = self.seqs
+        for i in range(bisect.bisect_left(seqs, seq, self.start), len(seqs)):
+            yield seqs[i]
+
+
+class ExecEventIndex:
+    def __init__(self):
+        self.by_comm = {}
+        self.by_file = {}
+        self.file_keys = []   # sorted, for prefix lookups
+
+    # ------------------------
+    # Maintenance (called by EventStore with its lock held)
+    # ------------------------
+    def add(self, seq, event):
+        postings = self.by_comm.get(event.comm)
+        if postings is None:
+            postings = self.by_comm[event.comm] = PostingList()
+        postings.append(seq)
+
+        postings = self.by_file.get(event.file)
+        if postings is None:
+            postings = self.by_file[event.file] = PostingList()
+            bisect.insort(self.file_keys, event.file)
+        postings.append(seq)
+
+    def remove(self, seq, event):
+        postings = self.by_comm.get(event.comm)
+        if postings is not None:
+            postings.pop_front()
+            if not postings:
+                del self.by_comm[event.comm]
+
+        postings = self.by_file.get(event.file)
+        if postings is not None:
+            postings.pop_front()
+            if not postings:
+                del self.by_file[event.file]
+                i = bisect.bisect_left(self.file_keys, event.file)
+                if i < len(self.file_keys) and self.file_keys[i] == event.file:
+                    del self.file_keys[i]
+
+    def clear(self):
+        self.by_comm.clear()
+        self.by_file.clear()
+        self.file_keys.clear()
+
+    # ------------------------
+    # Lookups (caller holds the store lock)
+    # ------------------------
+    def _file_prefix_lists(self, prefix):
+        keys = self.file_keys
+        i = bisect.bisect_left(keys, prefix)
+        lists = []
+        while i < len(keys) and keys[i].startswith(prefix):
+            lists.append(self.by_file[keys[i]])
+            i += 1
+        return lists
+
+    def candidates(self, start_seq, comm=None, file_prefix=None):
+        """
+        Return an ascending iterator of candidate sequence numbers >= start_seq
+        using the most selective index, or None if no indexed filter is given.
+        """
+        options = []
+        if comm is not None:
+            postings = self.by_comm.get(comm)
+            options.append((len(postings) if postings else 0, [postings] if postings else []))
+        if file_prefix is not None:
+            lists = self._file_prefix_lists(file_prefix)
+            options.append((sum(len(p) for p in lists), lists))
+        if not options:
+            return None
+        _, lists = min(options, key=lambda option: option[0])
+        if len(lists) == 1:
+            return lists[0].iter_from(start_seq)
+        return heapq.merge(*(p.iter_from(start_seq) for p in lists))
+
+    def stats(self):
+        return {
+            "comms": len(self.by_comm),
+            "files": len(self.by_file),
+        }
+
+
+def query_events(store, index, since=0, limit=100, comm=None, file_prefix=None,
+                 pid=None, tgid=None, from_ts=None, to_ts=None, match=None, max_scan=200000,
+                 scan_chunk=5000):
+    """
+    Return (matches, next_cursor, more) for events after sequence number
+    `since` that match every given filter. `from_ts`/`to_ts` are UNIX
+    nanoseconds; `match` is an optional extra predicate on the event. At
+    most `max_scan` candidates are examined per call; if the scan stops
+    early `more` is True and the query can be resumed from next_cursor.
+    Each match is a (seq, event) pair.
+
+    Candidates are examined `scan_chunk` at a time and the store lock is
+    released between chunks, so a long unindexed scan does not hold up the
+    collector reader. Events evicted between two chunks are skipped.
+    """
+    matches = []
+    with store.lock:
+        start, end = store.seq_range_locked(from_ts, to_ts)
+    cursor = max(start, since + 1) - 1
+    scanned = 0
+    more = False
+    done = False
+    while not done and not more:
+        with store.lock:
+            first, _ = store.seq_range_locked()
+            start = max(cursor + 1, first)
+            candidates = index.candidates(start, comm=comm, file_prefix=file_prefix)
+            if candidates is None:
+                candidates = iter(range(start, end))
+            done = True
+            chunk_end = scanned + scan_chunk
+            for seq in candidates:
+                if seq >= end:
+                    break
+                if scanned >= max_scan or len(matches) >= limit:
+                    more = True
+                    break
+                if scanned >= chunk_end:
+                    done = False
+                    break
+                scanned += 1
+                cursor = seq
+                event = store.get_locked(seq)
+                if comm is not None and event.comm != comm:
+                    continue
+                if file_prefix is not None and not event.file.startswith(file_prefix):
+                    continue
+                if pid is not None and event.pid != pid:
+                    continue
+                if tgid is not None and event.tgid != tgid:
+                    continue
+                if match is not None and not match(event):
+                    continue
+                matches.append((seq, event))
+    if not more:
+        # Everything before `end` has been examined
+        cursor = max(cursor, end - 1)
+    return matches, cursor, more
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+import queue
+import threading
+from collections import namedtuple
+
+
+class ReadResult(namedtuple("ReadResult", ["events", "first_seq", "last_seq", "gap"])):
+    """
+    Result of an EventStore read.
+
+    events    -- the returned events, oldest first
+    first_seq -- sequence number of events[0]
+    last_seq  -- newest sequence number in the store at read time
+    gap       -- True if events after the requested cursor were evicted
+    """
+    __slots__ = ()
+
+    @property
+    def next(self):
+        """Cursor to pass as `since` on the next read."""
+        return self.first_seq + len(self.events) - 1
+
+
+class Subscription:
+    """
+    Bounded queue of (first_seq, events) batches for one live subscriber.
+
+    Publishing never blocks: when the queue is full the batch is dropped and
+    `lagged` is set, telling the consumer to skip ahead by re-reading from the
+    store instead of stalling the producer.
+    """
+
+    def __init__(self, max_batches):
+        self.queue = queue.Queue(maxsize=max_batches)
+        self.lagged = False
+        self.dropped = 0
+
+    def publish(self, first_seq, events):
+        """Queue a batch; return False if it was dropped."""
+        try:
+            self.queue.put_nowait((first_seq, events))
+            return True
+        except queue.Full:
+            self.lagged = True
+            self.dropped += len(events)
+            return False
+
+    def get(self, timeout=None):
+        """Return the next batch, or None if nothing arrived within timeout."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def reset(self):
+        """Discard queued batches after a lag; the caller catches up from the store."""
+        self.lagged = False
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+
+class EventStore:
+    """
+    Fixed-capacity ring buffer of events with monotonically increasing
+    sequence numbers.
+
+    Every appended event gets the next sequence number (starting at
+    start_seq, 1 by default). When
+    either max_events or max_bytes is exceeded the oldest events are evicted.
+    Sequence numbers are never reused, so a reader can always tell whether
+    the events it asks for are still available.
+
+    An optional `index` (see event_index.py) is told about every append and
+    eviction while the lock is held, so secondary indexes stay in step.
+    """
+
+    def __init__(self, max_events=100000, max_bytes=64 * 1024 * 1024, sizeof=len, start_seq=1,
+                 index=None):
+        if max_events <= 0:
+            raise ValueError("max_events must be positive")
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self.index = index
+        self._slots = [None] * max_events
+        self._sizes = [0] * max_events
+        self._first_seq = start_seq   # sequence number of the oldest retained event
+        self._next_seq = start_seq    # sequence number the next event will get
+        self._bytes = 0
+        self.evicted = 0      # total events dropped because of capacity
+        self.subscriber_dropped = 0   # events not delivered to lagging subscribers
+        self.lock = threading.Lock()
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+
+    # ------------------------
+    # Writers
+    # ------------------------
+    def _append_locked(self, event):
+        size = self._sizeof(event)
+        if self._next_seq - self._first_seq == self.max_events:
+            self._evict_oldest_locked()
+        slot = self._next_seq % self.max_events
+        self._slots[slot] = event
+        self._sizes[slot] = size
+        self._bytes += size
+        seq = self._next_seq
+        self._next_seq += 1
+        if self.index is not None:
+            self.index.add(seq, event)
+        while self.max_bytes and self._bytes > self.max_bytes and self._first_seq < seq:
+            self._evict_oldest_locked()
+        return seq
+
+    def _evict_oldest_locked(self):
+        slot = self._first_seq % self.max_events
+        if self.index is not None:
+            self.index.remove(self._first_seq, self._slots[slot])
+        self._bytes -= self._sizes[slot]
+        self._slots[slot] = None
+        self._sizes[slot] = 0
+        self._first_seq += 1
+        self.evicted += 1
+
+    def append(self, event):
+        """Append a single event and return its sequence number."""
+        with self.lock:
+            seq = self._append_locked(event)
+        self._publish(seq, [event])
+        return seq
+
+    def extend(self, events):
+        """Append a batch of events under one lock; return the last sequence number."""
+        events = list(events)
+        if not events:
+            return None
+        with self.lock:
+            for event in events:
+                seq = self._append_locked(event)
+        self._publish(seq - len(events) + 1, events)
+        return seq
+
+    def clear(self):
+        """
+        Drop all retained events and return the last dropped sequence number.
+        Sequence numbers keep increasing.
+        """
+        with self.lock:
+            self._slots = [None] * self.max_events
+            self._sizes = [0] * self.max_events
+            self._first_seq = self._next_seq
+            self._bytes = 0
+            if self.index is not None:
+                self.index.clear()
+            return self._next_seq - 1
+
+    # ------------------------
+    # Live subscribers
+    # ------------------------
+    def subscribe(self, max_batches=256):
+        """Register a live subscriber that receives every appended batch."""
+        subscription = Subscription(max_batches)
+        with self._subscribers_lock:
+            self._subscribers = self._subscribers + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._subscribers_lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscription]
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _publish(self, first_seq, events):
+        # The subscriber list is replaced, never mutated, so iterating the
+        # current reference without the lock is safe.
+        for subscription in self._subscribers:
+            if not subscription.publish(first_seq, events):
+                self.subscriber_dropped += len(events)
+
+    def subscriber_stats(self):
+        subscribers = self._subscribers
+        return {
+            "count": len(subscribers),
+            "dropped": self.subscriber_dropped,
+            "lagged": sum(1 for s in subscribers if s.lagged),
+            "max_queue_batches": max((s.queue.qsize() for s in subscribers), default=0),
+        }
+
+    # ------------------------
+    # Readers
+    # ------------------------
+    def read_since(self, since=0, limit=1000):
+        """
+        Return a ReadResult with up to `limit` events whose sequence number is
+        greater than `since`. Only the requested slice is copied.
+        """
+        with self.lock:
+            start = max(since + 1, self._first_seq)
+            end = self._next_seq
+            if limit is not None:
+                end = min(end, start + max(limit, 0))
+            slots = self._slots
+            capacity = self.max_events
+            events = [slots[seq % capacity] for seq in range(start, end)]
+            last_seq = self._next_seq - 1
+        return ReadResult(events, start, last_seq, start > since + 1)
+
+    def tail(self, limit=1000):
+        """Return a ReadResult with the newest `limit` events."""
+        with self.lock:
+            since = max(self._first_seq, self._next_seq - limit) - 1
+        return self.read_since(since, limit)
+
+    def iter_chunks(self, chunk_size=1000):
+        """
+        Yield the retained history in chunks, taking the lock once per chunk
+        so long dumps never hold it for the whole history.
+        """
+        since = 0
+        while True:
+            result = self.read_since(since, chunk_size)
+            if not result.events:
+                return
+            yield result.events
+            since = result.next
+
+    # ------------------------
+    # Lock-held accessors (for index queries)
+    # ------------------------
+    def get_locked(self, seq):
+        """Return the event with sequence number `seq`. Caller holds the lock."""
+        return self._slots[seq % self.max_events]
+
+    def seq_range_locked(self, from_ts=None, to_ts=None):
+        """
+        Return the [start, end) sequence range of retained events whose `ts`
+        lies within [from_ts, to_ts]. Events are assumed to be appended in
+        timestamp order. Caller holds the lock.
+        """
+        start, end = self._first_seq, self._next_seq
+        if from_ts is not None:
+            start = self._bisect_ts_locked(from_ts, start, end)
+        if to_ts is not None:
+            end = self._bisect_ts_locked(to_ts + 1, start, end)
+        return start, end
+
+    def _bisect_ts_locked(self, ts, lo, hi):
+        slots = self._slots
+        capacity = self.max_events
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if slots[mid % capacity].ts < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def stats(self):
+        with self.lock:
+            return {
+                "first_seq": self._first_seq,
+                "last_seq": self._next_seq - 1,
+                "count": self._next_seq - self._first_seq,
+                "bytes": self._bytes,
+                "max_events": self.max_events,
+                "max_bytes": self.max_bytes,
+                "evicted": self.evicted,
+            }
+
+    def __len__(self):
+        with self.lock:
+            return self._next_seq - self._first_seq
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Background sampling of host and process resource usage.
+
+HostMetricsSampler reads cumulative counters with psutil every `interval`
+seconds: CPU times, context switches, disk and network I/O for the host, and
+CPU times, RSS, context switches and I/O for a set of named processes (the
+backend itself, the collector, the userspace program). Per-interval rates
+are kept in a fixed-size ring per target, so reads never wait for a sample
+and the history is bounded.
+
+A tracked process is measured together with its descendants, because the
+collector and userspace programs run under sudo; subtrees of other tracked
+processes are left out, so the backend does not count its children twice.
+When a target's pid changes (e.g. the collector was restarted) its counters
+start over.
+"""
+import threading
+import time
+from array import array
+
+HOST_FIELDS = ("cpu_percent", "memory_percent", "memory_used_bytes", "ctx_switches_per_sec",
+               "disk_read_bytes_per_sec", "disk_write_bytes_per_sec",
+               "net_recv_bytes_per_sec", "net_sent_bytes_per_sec")
+PROCESS_FIELDS = ("cpu_percent", "rss_bytes", "threads", "ctx_switches_per_sec",
+                  "read_bytes_per_sec", "write_bytes_per_sec")
+
+
+class MetricSeries:
+    """Ring of samples with one float column per field."""
+    __slots__ = ("fields", "capacity", "ts", "columns", "count", "head")
+
+    def __init__(self, fields, capacity):
+        self.fields = fields
+        self.capacity = capacity
+        self.ts = array("d", bytes(8 * capacity))
+        self.columns = [array("d", bytes(8 * capacity)) for _ in fields]
+        self.count = 0
+        self.head = 0      # next slot to write
+
+    def add(self, ts, values):
+        i = self.head
+        self.ts[i] = ts
+        for column, value in zip(self.columns, values):
+            column[i] = value
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        if not self.count:
+            return None
+        i = (self.head - 1) % self.capacity
+        return dict(ts=self.ts[i], **{f: _round(c[i]) for f, c in zip(self.fields, self.columns)})
+
+    def downsample(self, since_ts, step):
+        """Return points averaged over `step`-second bins for samples newer than since_ts."""
+        start = (self.head - self.count) % self.capacity
+        bins = []
+        for n in range(self.count):
+            i = (start + n) % self.capacity
+            ts = self.ts[i]
+            if ts <= since_ts:
+                continue
+            bin_start = since_ts + (ts - since_ts) // step * step
+            if not bins or bins[-1][0] != bin_start:
+                bins.append([bin_start, 0, [0.0] * len(self.columns)])
+            b = bins[-1]
+            b[1] += 1
+            for j, column in enumerate(self.columns):
+                b[2][j] += column[i]
+        return [dict(ts=round(b[0], 3), **{f: _round(total / b[1]) for f, total in zip(self.fields, b[2])})
+                for b in bins]
+
+
+def _round(value):
+    return round(value, 2)
+
+
+def _rate(current, previous, elapsed):
+    return max(current - previous, 0) / elapsed if elapsed > 0 else 0.0
+
+
+class _ProcessTarget:
+    """Counters of one tracked process tree between two samples."""
+    __slots__ = ("pid", "process", "last", "series")
+
+    def __init__(self, pid, process, series):
+        self.pid = pid
+        self.process = process
+        self.last = None     # (time, cpu seconds, ctx switches, read bytes, write bytes)
+        self.series = series
+
+
+class HostMetricsSampler:
+    def __init__(self, psutil, processes, interval=1.0, capacity=3600, logger=None):
+        """
+        `processes()` returns {name: pid or None} of the processes to track;
+        it is called once per sample.
+        """
+        self.psutil = psutil
+        self.processes = processes
+        self.interval = interval
+        self.capacity = capacity
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.host = MetricSeries(HOST_FIELDS, capacity)
+        self.targets = {}    # name -> _ProcessTarget
+        self._host_last = None
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="host-metrics", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # ------------------------
+    # Sampling (background thread)
+    # ------------------------
+    def _read_host(self):
+        ps = self.psutil
+        cpu = ps.cpu_times()
+        disk = ps.disk_io_counters()
+        net = ps.net_io_counters()
+        return (
+            time.monotonic(),
+            sum(cpu) - cpu.idle - getattr(cpu, "iowait", 0.0),
+            sum(cpu),
+            ps.cpu_stats().ctx_switches,
+            disk.read_bytes if disk else 0,
+            disk.write_bytes if disk else 0,
+            net.bytes_recv if net else 0,
+            net.bytes_sent if net else 0,
+        )
+
+    def _sample_host(self, now):
+        current = self._read_host()
+        memory = self.psutil.virtual_memory()
+        last, self._host_last = self._host_last, current
+        if last is None:
+            return
+        elapsed = current[0] - last[0]
+        total = current[2] - last[2]
+        values = (
+            100.0 * max(current[1] - last[1], 0) / total if total > 0 else 0.0,
+            memory.percent,
+            memory.total - memory.available,
+        ) + tuple(_rate(c, p, elapsed) for c, p in zip(current[3:], last[3:]))
+        with self.lock:
+            self.host.add(now, values)
+
+    def _read_tree(self, process, others):
+        """
+        Sum the counters of a process and its descendants, except the subtrees
+        rooted at pids in `others`; returns (cpu, rss, threads, ctx, read, write).
+        """
+        ps = self.psutil
+        totals = [0.0, 0, 0, 0, 0, 0]
+        try:
+            children = process.children(recursive=True)
+        except ps.Error:
+            return None
+        parents = {}
+        for child in children:
+            try:
+                parents[child.pid] = child.ppid()
+            except ps.Error:
+                pass
+
+        def excluded(pid):
+            while pid in parents:
+                if pid in others:
+                    return True
+                pid = parents[pid]
+            return False
+
+        members = [process] + [child for child in children if child.pid in parents and not excluded(child.pid)]
+        for member in members:
+            try:
+                with member.oneshot():
+                    cpu = member.cpu_times()
+                    ctx = member.num_ctx_switches()
+                    totals[0] += cpu.user + cpu.system
+                    totals[1] += member.memory_info().rss
+                    totals[2] += member.num_threads()
+                    totals[3] += ctx.voluntary + ctx.involuntary
+                    try:
+                        io = member.io_counters()
+                        totals[4] += io.read_bytes
+                        totals[5] += io.write_bytes
+                    except (ps.AccessDenied, AttributeError):
+                        pass
+            except ps.Error:
+                # Exited between listing and reading (or not ours to read)
+                continue
+        return totals
+
+    def _sample_processes(self, now):
+        wanted = self.processes()
+        roots = {pid for pid in wanted.values() if pid is not None}
+        for name in [n for n in self.targets if wanted.get(n) is None]:
+            with self.lock:
+                del self.targets[name]
+        for name, pid in wanted.items():
+            if pid is None:
+                continue
+            target = self.targets.get(name)
+            if target is None or target.pid != pid:
+                try:
+                    process = self.psutil.Process(pid)
+                except self.psutil.Error:
+                    continue
+                target = _ProcessTarget(pid, process, MetricSeries(PROCESS_FIELDS, self.capacity))
+                with self.lock:
+                    self.targets[name] = target
+            totals = self._read_tree(target.process, roots - {pid})
+            if totals is None:
+                continue
+            current = (time.monotonic(), totals[0], totals[3], totals[4], totals[5])
+            last, target.last = target.last, current
+            if last is None:
+                continue
+            elapsed = current[0] - last[0]
+            values = (
+                100.0 * _rate(current[1], last[1], elapsed),
+                totals[1],
+                totals[2],
+                _rate(current[2], last[2], elapsed),
+                _rate(current[3], last[3], elapsed),
+                _rate(current[4], last[4], elapsed),
+            )
+            with self.lock:
+                target.series.add(now, values)
+
+    def _run(self):
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                now = time.time()
+                self._sample_host(now)
+                self._sample_processes(now)
+                self.samples += 1
+            except Exception as e:
+                self.errors += 1
+                if str(e) != self.last_error and self.logger:
+                    self.logger.warning(f"Host metrics sampling failed: {e}")
+                self.last_error = str(e)
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+    # ------------------------
+    # Readers (request threads)
+    # ------------------------
+    def latest(self):
+        """Return the newest sample of the host and of every tracked process."""
+        with self.lock:
+            return {
+                "host": self.host.latest(),
+                "processes": {
+                    name: dict(pid=target.pid, **(target.series.latest() or {}))
+                    for name, target in self.targets.items()
+                },
+            }
+
+    def history(self, seconds=300, step=None):
+        """Return the last `seconds` of samples for all targets, averaged over `step`-second bins."""
+        step = max(step or self.interval, self.interval)
+        start = time.time() - seconds
+        with self.lock:
+            return {
+                "start": round(start, 3),
+                "step": step,
+                "host": self.host.downsample(start, step),
+                "processes": {name: target.series.downsample(start, step) for name, target in self.targets.items()},
+            }
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "samples": self.samples,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
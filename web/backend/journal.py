@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Append-only, segmented on-disk journal of collector events.
+
+Events are written as JSON lines ({"seq": ..., "ts": ..., ...}) to segment
+files named after the sequence number of their first event. Each segment has
+a sparse index file of fixed-size (seq, ts, offset) entries, so a reader can
+seek to a sequence number or timestamp without scanning the whole segment.
+Segments are rotated by size and age and deleted once the retention limits
+are exceeded. Reads go through mmap and yield raw byte ranges, so dumps never
+build the history in memory.
+
+append() runs on the collector reader thread and hands every batch to the
+kernel with one write() and flush(); there is no fsync, so durability is left
+to the page cache's writeback. If the disk cannot keep up with writeback,
+write() blocks and ingest slows down with it: the collector pipe fills and
+the kernel ring buffer starts dropping events, which shows up in
+/api/collector_health. Put the journal on a disk that can absorb the event
+rate, or disable it.
+
+A failed write (a full disk, say) is counted in `errors` and re-raised. The
+partial batch is cut off the segment and the next batch starts a new one,
+so the journal skips the lost sequence numbers rather than holding a torn
+record.
+
+clear() records a sequence number floor in the `cleared_seq` file; readers
+skip everything at or below it, so cleared history is neither dumped nor
+replayed. The segments themselves stay on disk until retention removes them.
+"""
+import bisect
+import glob
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+from collector_protocol import ExecEvent
+
+SEGMENT_SUFFIX = ".jsonl"
+INDEX_SUFFIX = ".idx"
+# (seq, ts, offset) of a record in the segment
+INDEX_ENTRY = struct.Struct("=QQQ")
+CLEARED_FILE = "cleared_seq"
+
+
+def _line_seq(line):
+    # Lines always start with {"seq": N, so the seq can be read without
+    # decoding the whole record.
+    return int(line[7:line.index(b",")])
+
+
+class Segment:
+    def __init__(self, directory, first_seq):
+        self.first_seq = first_seq
+        self.path = os.path.join(directory, f"{first_seq:020d}{SEGMENT_SUFFIX}")
+        self.index_path = os.path.join(directory, f"{first_seq:020d}{INDEX_SUFFIX}")
+        self.index_seqs = []
+        self.index_ts = []
+        self.index_offsets = []
+        self.size = 0
+        self.last_seq = first_seq - 1
+        self.created = time.time()
+
+    def load(self):
+        """Load the index and recover size/last_seq from an existing segment."""
+        self.size = os.path.getsize(self.path)
+        self.created = os.path.getmtime(self.path)
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            for seq, ts, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+                if offset >= self.size:
+                    break
+                self.add_index(seq, ts, offset)
+        # Scan the tail after the last index entry to find the last complete
+        # record; anything after it is a partial write and is truncated.
+        start = self.index_offsets[-1] if self.index_offsets else 0
+        end = start
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    self.last_seq = _line_seq(line)
+                except ValueError:
+                    break
+                end += len(line)
+        if end != self.size:
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+            self.size = end
+
+    def add_index(self, seq, ts, offset):
+        self.index_seqs.append(seq)
+        self.index_ts.append(ts)
+        self.index_offsets.append(offset)
+
+    @property
+    def first_ts(self):
+        return self.index_ts[0] if self.index_ts else 0
+
+    def offset_for_seq(self, seq):
+        """Offset of the last index entry at or before `seq` (scan from there)."""
+        i = bisect.bisect_right(self.index_seqs, seq) - 1
+        return self.index_offsets[i] if i >= 0 else 0
+
+    def offset_for_ts(self, ts):
+        i = bisect.bisect_left(self.index_ts, ts) - 1
+        return self.index_offsets[i] if i >= 0 else 0
+
+
+class Journal:
+    def __init__(self, directory, segment_max_bytes=64 * 1024 * 1024, segment_max_age=3600,
+                 retention_bytes=1024 * 1024 * 1024, retention_age=7 * 24 * 3600,
+                 index_interval=64 * 1024, logger=None):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self.retention_bytes = retention_bytes
+        self.retention_age = retention_age
+        self.index_interval = index_interval
+        self.logger = logger
+        self.lock = threading.Lock()   # guards the segment list
+        self.segments = []
+        self._file = None
+        self._index_file = None
+        self._last_index_offset = 0
+        self.bytes_written = 0
+        self.records_written = 0
+        self.segments_deleted = 0
+        self.errors = 0
+        self.cleared_seq = 0
+
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(os.path.join(directory, CLEARED_FILE)) as f:
+                self.cleared_seq = int(f.read())
+        except (FileNotFoundError, ValueError):
+            pass
+        for path in sorted(glob.glob(os.path.join(directory, "*" + SEGMENT_SUFFIX))):
+            name = os.path.basename(path)[:-len(SEGMENT_SUFFIX)]
+            try:
+                segment = Segment(directory, int(name))
+            except ValueError:
+                continue
+            segment.load()
+            self.segments.append(segment)
+        if self.segments:
+            self._open_active(self.segments[-1])
+
+    @property
+    def last_seq(self):
+        with self.lock:
+            return self.segments[-1].last_seq if self.segments else 0
+
+    # ------------------------
+    # Writer (collector reader thread)
+    # ------------------------
+    def _open_active(self, segment):
+        self._close_active()
+        self._file = open(segment.path, "ab")
+        self._index_file = open(segment.index_path, "ab")
+        self._last_index_offset = segment.index_offsets[-1] if segment.index_offsets else -self.index_interval
+
+    def _close_active(self):
+        for f in (self._file, self._index_file):
+            if f is not None:
+                f.close()
+        self._file = None
+        self._index_file = None
+
+    def _needs_rotation(self, segment):
+        return (segment.size >= self.segment_max_bytes
+                or (segment.size > 0 and time.time() - segment.created >= self.segment_max_age))
+
+    def append(self, first_seq, events):
+        """
+        Append a batch of ExecEvents whose sequence numbers start at
+        first_seq. Called synchronously from the reader thread; see the
+        module docstring for what a slow disk does to ingest.
+        """
+        if not events:
+            return
+        with self.lock:
+            active = self.segments[-1] if self.segments else None
+        if (active is None or self._file is None or self._needs_rotation(active)
+                or first_seq <= active.last_seq):
+            active = self._rotate(first_seq)
+
+        lines = []
+        index = []
+        offset = active.size
+        last_index_offset = self._last_index_offset
+        for i, event in enumerate(events):
+            seq = first_seq + i
+            line = json.dumps({
+                "seq": seq,
+                "ts": event.ts,
+                "pid": event.pid,
+                "tgid": event.tgid,
+                "comm": event.comm,
+                "file": event.file,
+                "cgroup_id": event.cgroup_id,
+            }, separators=(",", ":")).encode() + b"\n"
+            if offset - last_index_offset >= self.index_interval:
+                index.append((seq, event.ts, offset))
+                last_index_offset = offset
+            lines.append(line)
+            offset += len(line)
+
+        data = b"".join(lines)
+        try:
+            self._file.write(data)
+            self._file.flush()
+            if index:
+                self._index_file.write(b"".join(INDEX_ENTRY.pack(*entry) for entry in index))
+                self._index_file.flush()
+        except OSError:
+            self.errors += 1
+            self._abandon(active)
+            raise
+        for entry in index:
+            active.add_index(*entry)
+        self._last_index_offset = last_index_offset
+        active.size = offset
+        active.last_seq = first_seq + len(events) - 1
+        self.bytes_written += len(data)
+        self.records_written += len(events)
+
+    def _abandon(self, segment):
+        """
+        After a failed write, cut the segment back to its last complete
+        record and close it; the next append() starts a new segment.
+        """
+        for f in (self._file, self._index_file):
+            try:
+                f.close()
+            except OSError:
+                pass   # unwritten buffered data is discarded with the file
+        self._file = None
+        self._index_file = None
+        for path, size in ((segment.path, segment.size),
+                           (segment.index_path, len(segment.index_offsets) * INDEX_ENTRY.size)):
+            try:
+                os.truncate(path, size)
+            except OSError:
+                pass   # load() drops a partial tail on the next start
+
+    def _rotate(self, first_seq):
+        segment = Segment(self.directory, first_seq)
+        if os.path.exists(segment.path):
+            # A segment with this name exists (e.g. sequence numbers were
+            # reset); start over rather than interleaving two histories.
+            os.remove(segment.path)
+        if os.path.exists(segment.index_path):
+            os.remove(segment.index_path)
+        self._open_active(segment)
+        with self.lock:
+            self.segments = [s for s in self.segments if s.first_seq < first_seq] + [segment]
+        self._apply_retention()
+        return segment
+
+    def _apply_retention(self):
+        now = time.time()
+        with self.lock:
+            total = sum(s.size for s in self.segments)
+            expired = []
+            while len(self.segments) > 1:
+                oldest = self.segments[0]
+                too_big = self.retention_bytes and total > self.retention_bytes
+                too_old = self.retention_age and now - os.path.getmtime(oldest.path) > self.retention_age
+                if not (too_big or too_old):
+                    break
+                total -= oldest.size
+                expired.append(self.segments.pop(0))
+        for segment in expired:
+            for path in (segment.path, segment.index_path):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self.segments_deleted += 1
+            if self.logger:
+                self.logger.info(f"Journal: removed expired segment {segment.path}")
+
+    def close(self):
+        self._close_active()
+
+    def clear(self, seq):
+        """Hide every record up to and including `seq` from readers, also after a restart."""
+        path = os.path.join(self.directory, CLEARED_FILE)
+        with open(path + ".tmp", "w") as f:
+            f.write(str(seq))
+        os.replace(path + ".tmp", path)
+        self.cleared_seq = seq
+
+    # ------------------------
+    # Readers
+    # ------------------------
+    def _start_position(self, since=0, from_ts=None):
+        """Return [(segment, start_offset, end_offset)] to read, oldest first."""
+        with self.lock:
+            segments = list(self.segments)
+            sizes = [s.size for s in segments]
+        positions = []
+        for i, segment in enumerate(segments):
+            next_first = segments[i + 1].first_seq if i + 1 < len(segments) else None
+            if next_first is not None and next_first <= since + 1:
+                continue
+            if from_ts is not None and i + 1 < len(segments) and segments[i + 1].first_ts <= from_ts:
+                continue
+            offset = 0
+            if since >= segment.first_seq:
+                offset = segment.offset_for_seq(since + 1)
+            if from_ts is not None:
+                offset = max(offset, segment.offset_for_ts(from_ts))
+            positions.append((segment, offset, sizes[i]))
+        return positions
+
+    def _iter_segments(self, since=0, from_ts=None):
+        """
+        Yield (mmap, start, end) for each segment to read, where start is the
+        offset of the first record after `since` and at or after `from_ts`.
+        The mmap is only valid until the generator is resumed. Records at or
+        below the clear() floor are skipped.
+        """
+        since = max(since, self.cleared_seq)
+        for segment, offset, end in self._start_position(since, from_ts):
+            if end <= offset:
+                continue
+            try:
+                with open(segment.path, "rb") as f:
+                    mm = mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ)
+            except (FileNotFoundError, ValueError):
+                continue   # removed by retention meanwhile
+            try:
+                # The index only gets us close; scan forward (at most about
+                # index_interval bytes) to the exact first record.
+                pos = offset
+                while pos < end:
+                    nl = mm.find(b"\n", pos, end)
+                    if nl < 0:
+                        pos = end
+                        break
+                    line = mm[pos:nl + 1]
+                    if _line_seq(line) > since and (from_ts is None or json.loads(line)["ts"] >= from_ts):
+                        break
+                    pos = nl + 1
+                if pos < end:
+                    yield mm, pos, end
+            finally:
+                mm.close()
+
+    def iter_raw(self, since=0, from_ts=None, chunk_size=1024 * 1024):
+        """
+        Yield the journal as raw JSON-lines chunks of up to chunk_size bytes,
+        starting after sequence number `since` and/or at timestamp `from_ts`
+        (nanoseconds).
+        """
+        for mm, start, end in self._iter_segments(since, from_ts):
+            for pos in range(start, end, chunk_size):
+                yield mm[pos:min(pos + chunk_size, end)]
+
+    def replay(self, since=0):
+        """Yield (seq, ExecEvent) for every journaled event after `since`."""
+        for mm, start, end in self._iter_segments(since):
+            # One record at a time: copying the whole segment out of the
+            # mmap would cost up to segment_max_bytes of memory at startup
+            pos = start
+            while pos < end:
+                nl = mm.find(b"\n", pos, end)
+                if nl < 0:
+                    nl = end
+                line = mm[pos:nl]
+                pos = nl + 1
+                if not line:
+                    continue
+                record = json.loads(line)
+                yield record["seq"], ExecEvent(record["ts"], record["pid"], record["tgid"],
+                                               record["comm"], record["file"], record.get("cgroup_id", 0))
+
+    def replay_tail(self, limit):
+        """
+        Return (start_seq, events) for the newest `limit` journaled events
+        with consecutive sequence numbers, for a store that numbers its events
+        contiguously from start_seq. Events before a gap in the journal (a
+        failed write, a reset) are left out, so every replayed event keeps its
+        journaled sequence number. start_seq is last_seq + 1 if there is
+        nothing to replay.
+        """
+        last_seq = self.last_seq
+        start_seq, events = last_seq + 1, []
+        for seq, event in self.replay(max(last_seq - limit, 0)):
+            if seq != start_seq + len(events):
+                if events and self.logger:
+                    self.logger.warning(f"Journal: sequence gap before {seq}; replaying from there")
+                start_seq, events = seq, []
+            events.append(event)
+        if start_seq + len(events) != last_seq + 1:
+            return last_seq + 1, []
+        return start_seq, events
+
+    def stats(self):
+        with self.lock:
+            segments = list(self.segments)
+        return {
+            "directory": self.directory,
+            "segments": len(segments),
+            "bytes": sum(s.size for s in segments),
+            "first_seq": segments[0].first_seq if segments else None,
+            "last_seq": segments[-1].last_seq if segments else 0,
+            "bytes_written": self.bytes_written,
+            "records_written": self.records_written,
+            "segments_deleted": self.segments_deleted,
+            "errors": self.errors,
+            "cleared_seq": self.cleared_seq,
+        }
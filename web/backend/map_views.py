@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Paged, incremental views over eBPF map contents.
+
+A map is read in one pass through the backend (batched lookups where the
+kernel supports them) into a MapSnapshot: a dict of raw key bytes to raw
+value bytes, identified by a token. Reads are cached per map for a short TTL
+and coalesced, so many pollers share one read. Once a map has been read,
+requests are answered from the cached snapshot and an expired snapshot is
+refreshed on a background thread (one read per map at a time), so only the
+first request for a map waits for the kernel. The refresh still reads the
+whole map: the cost of a large map is one full read per TTL while it is
+being polled, off the request path. The map's info (name, type, sizes) is
+read once per map and again after invalidate(), since it does not change
+for the lifetime of a map id. Pages are cut from the
+snapshot's sorted key list, so only the requested entries are JSON-encoded;
+a key prefix filter bisects into the same list. A client that passes the
+token of an earlier snapshot gets only the entries that changed since then
+plus the keys that were deleted.
+"""
+import bisect
+import itertools
+import threading
+import time
+from collections import OrderedDict
+
+from cache import SingleFlightCache
+
+
+def _hex(value):
+    if isinstance(value, list):   # per-CPU values
+        return [v.hex() for v in value]
+    return value.hex()
+
+
+class MapSnapshot:
+    __slots__ = ("map_id", "token", "entries", "info", "taken", "_keys")
+
+    def __init__(self, map_id, token, entries, info=None):
+        self.map_id = map_id
+        self.token = token
+        self.entries = entries   # key bytes -> value bytes (or list per CPU)
+        self.info = info         # backend map_info() of the map
+        self.taken = time.time()
+        self._keys = None
+
+    @property
+    def keys(self):
+        if self._keys is None:
+            self._keys = sorted(self.entries)
+        return self._keys
+
+
+def _prefix_range(keys, prefix):
+    """(lo, hi) indexes of the keys starting with `prefix` in a sorted list."""
+    lo = bisect.bisect_left(keys, prefix)
+    # The smallest byte string greater than every key with this prefix
+    upper = prefix.rstrip(b"\xff")
+    if not upper:
+        return lo, len(keys)
+    upper = upper[:-1] + bytes([upper[-1] + 1])
+    return lo, bisect.bisect_left(keys, upper, lo)
+
+
+class MapViews:
+    def __init__(self, backend, ttl=1.0, history=32, max_maps=64):
+        self.backend = backend
+        self.ttl = ttl
+        self.history = history
+        self.max_maps = max_maps
+        self.lock = threading.Lock()
+        self._caches = OrderedDict()     # map id -> SingleFlightCache
+        self._snapshots = OrderedDict()  # token -> MapSnapshot (most recent last)
+        self._latest = {}                # map id -> newest MapSnapshot
+        self._info = {}                  # map id -> backend map_info()
+        self._tokens = itertools.count(1)
+
+    def _read(self, map_id):
+        with self.lock:
+            info = self._info.get(map_id)
+        if info is None:
+            info, error = self.backend.map_info(map_id)
+            if error:
+                raise LookupError(error)
+        entries, error = self.backend.map_entries(map_id)
+        if error:
+            raise LookupError(error)
+        entries = dict(entries)
+        with self.lock:
+            latest = self._latest.get(map_id)
+            self._info[map_id] = info
+            if latest is not None and latest.entries == entries:
+                # Unchanged: keep the token so pollers see no changes
+                latest.info = info
+                return latest
+            snapshot = MapSnapshot(map_id, f"{map_id}.{next(self._tokens)}", entries, info)
+            self._latest[map_id] = snapshot
+            self._snapshots[snapshot.token] = snapshot
+            while len(self._snapshots) > self.history:
+                self._snapshots.popitem(last=False)
+        return snapshot
+
+    def snapshot(self, map_id):
+        """
+        Return the newest MapSnapshot of a map, which may be up to one refresh
+        old; raises LookupError if the map has never been read successfully.
+        """
+        with self.lock:
+            cache = self._caches.get(map_id)
+            if cache is None:
+                cache = self._caches[map_id] = SingleFlightCache(lambda: self._read(map_id), self.ttl)
+                while len(self._caches) > self.max_maps:
+                    old_id, _ = self._caches.popitem(last=False)
+                    self._latest.pop(old_id, None)
+                    self._info.pop(old_id, None)
+            else:
+                self._caches.move_to_end(map_id)
+        return cache.get(stale_ok=True)
+
+    def previous(self, token):
+        with self.lock:
+            return self._snapshots.get(token)
+
+    def page(self, snapshot, prefix=b"", after=None, limit=500, since=None):
+        """
+        Return a JSON-ready page of `snapshot`. With `since` (an older
+        MapSnapshot of the same map) only changed entries and deleted keys are
+        returned. `after` is the last key of the previous page.
+        """
+        if since is not None:
+            old = since.entries
+            current = snapshot.entries
+            keys = sorted(k for k, v in current.items() if k.startswith(prefix) and old.get(k) != v)
+            deleted = sorted(k for k in old if k not in current and k.startswith(prefix))
+            lo, hi = 0, len(keys)
+        else:
+            keys = snapshot.keys
+            deleted = None
+            lo, hi = _prefix_range(keys, prefix)
+        matched = hi - lo
+        if after is not None:
+            lo = max(lo, bisect.bisect_right(keys, after, lo, hi))
+        end = min(hi, lo + limit)
+        result = {
+            "token": snapshot.token,
+            "taken": snapshot.taken,
+            "total": len(snapshot.entries),
+            "matched": matched,
+            "entries": [{"key": keys[i].hex(), "value": _hex(snapshot.entries[keys[i]])} for i in range(lo, end)],
+            "next": keys[end - 1].hex() if end < hi else None,
+        }
+        if deleted is not None:
+            result["since"] = since.token
+            # Deletions are reported once, with the first page of changes
+            result["deleted"] = [k.hex() for k in deleted] if after is None else []
+        return result
+
+    def invalidate(self, map_id=None):
+        """Drop cached snapshots (all maps by default), e.g. after programs were loaded or unloaded."""
+        with self.lock:
+            caches = list(self._caches.values()) if map_id is None else [self._caches.get(map_id)]
+            if map_id is None:
+                self._info.clear()
+            else:
+                self._info.pop(map_id, None)
+        for cache in caches:
+            if cache is not None:
+                cache.invalidate()
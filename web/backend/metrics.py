@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Prometheus text exposition (format 0.0.4) for /metrics.
+
+The exporter does not keep its own copy of the data: every scrape reads the
+counters that the collector reader, the samplers and the stores already
+maintain, and renders them with MetricsWriter. The only metric recorded here
+is LatencyHistogram, which is updated by the code it measures.
+"""
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; bpftool calls range from a few milliseconds to seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "+Inf" if value > 0 else "-Inf"
+        return repr(value)
+    return str(int(value))
+
+
+class LatencyHistogram:
+    """Cumulative histogram of durations per label value (thread-safe)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self._series = {}   # label value -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, label, seconds):
+        i = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += seconds
+
+    def snapshot(self):
+        """Return {label: (cumulative bucket counts, count, sum)}."""
+        with self.lock:
+            items = [(label, list(series)) for label, series in self._series.items()]
+        result = {}
+        for label, series in items:
+            cumulative = []
+            running = 0
+            for count in series[:-1]:
+                running += count
+                cumulative.append(running)
+            result[label] = (cumulative[:-1], running, series[-1])
+        return result
+
+
+class MetricsWriter:
+    """Accumulates metric families and renders them as exposition text."""
+
+    def __init__(self, prefix="k8sscope_"):
+        self.prefix = prefix
+        self.lines = []
+
+    def family(self, name, kind, help_text, samples):
+        """
+        Add a metric family. `samples` is an iterable of (labels dict or None,
+        value); families without samples are left out.
+        """
+        name = self.prefix + name
+        rendered = [self._sample(name, labels, value) for labels, value in samples]
+        if not rendered:
+            return
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+        self.lines.extend(rendered)
+
+    def gauge(self, name, help_text, value, labels=None):
+        if value is not None:
+            self.family(name, "gauge", help_text, [(labels, value)])
+
+    def counter(self, name, help_text, value, labels=None):
+        if value is not None:
+            self.family(name, "counter", help_text, [(labels, value)])
+
+    def histogram(self, name, help_text, label_name, histogram):
+        name = self.prefix + name
+        snapshot = histogram.snapshot()
+        if not snapshot:
+            return
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} histogram")
+        for label, (buckets, count, total) in sorted(snapshot.items()):
+            labels = {label_name: label}
+            for bound, cumulative in zip(histogram.buckets, buckets):
+                self.lines.append(self._sample(name + "_bucket", dict(labels, le=repr(float(bound))), cumulative))
+            self.lines.append(self._sample(name + "_bucket", dict(labels, le="+Inf"), count))
+            self.lines.append(self._sample(name + "_count", labels, count))
+            self.lines.append(self._sample(name + "_sum", labels, float(total)))
+
+    @staticmethod
+    def _sample(name, labels, value):
+        if labels:
+            inner = ",".join(f'{key}="{_escape(val)}"' for key, val in labels.items())
+            return f"{name}{{{inner}}} {_format_value(value)}"
+        return f"{name} {_format_value(value)}"
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+import collections
+import fcntl
+import os
+import selectors
+import struct
+import termios
+import threading
+import time
+
+
+class PipeReader:
+    """
+    Drain a child process's stdout and stderr on a background thread.
+
+    stdout is read in large chunks as soon as the selector reports it
+    readable, decoded in bulk by `decoder` and appended to `store` with one
+    extend() call (one lock acquisition) per batch. stderr is drained as well,
+    so the child can never block on a full stderr pipe; its last lines are
+    kept for diagnostics and logged.
+
+    `on_batch(first_seq, events)` is called after every stored batch (for
+    example to journal it); errors there are logged and do not stop reading.
+    A batch that fails to decode or store is logged, counted in
+    `batch_errors` and dropped, and reading goes on. If the reader loop
+    itself fails, the pipes are closed so the child cannot block writing to
+    them (it gets EPIPE/SIGPIPE) while we wait for it to exit.
+    """
+
+    STDERR_TAIL_LINES = 50
+
+    def __init__(self, name, proc, decoder, store, logger, read_size=64 * 1024,
+                 max_reads_per_batch=16, on_batch=None, on_exit=None):
+        self.name = name
+        self.proc = proc
+        self.decoder = decoder
+        self.store = store
+        self.logger = logger
+        self.read_size = read_size
+        self.max_reads_per_batch = max_reads_per_batch
+        self.on_batch = on_batch
+        self.on_exit = on_exit
+        self.thread = None
+        self.stderr_tail = collections.deque(maxlen=self.STDERR_TAIL_LINES)
+        self._stderr_buffer = b""
+
+        # Counters (single writer: the reader thread)
+        self.started_at = None
+        self.bytes_read = 0
+        self.reads = 0
+        self.batches = 0
+        self.events = 0
+        self.max_batch_events = 0
+        self.stderr_lines = 0
+        self.batch_errors = 0
+        self.backlog_bytes = 0       # bytes still queued in the pipe after the last batch
+        self.max_backlog_bytes = 0
+        self.ingest_lag_ns = 0       # age of the newest event when it was stored
+        self.events_per_sec = 0.0
+        self._rate_events = 0
+        self._rate_time = None
+
+    def start(self):
+        self.started_at = time.time()
+        self._rate_time = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name=f"{self.name}-reader", daemon=True)
+        self.thread.start()
+        return self
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    # ------------------------
+    # Reader thread
+    # ------------------------
+    def _run(self):
+        selector = selectors.DefaultSelector()
+        for pipe in (self.proc.stdout, self.proc.stderr):
+            if pipe is not None:
+                os.set_blocking(pipe.fileno(), False)
+        selector.register(self.proc.stdout, selectors.EVENT_READ, self._handle_stdout)
+        if self.proc.stderr is not None:
+            selector.register(self.proc.stderr, selectors.EVENT_READ, self._handle_stderr)
+        try:
+            while selector.get_map():
+                for key, _ in selector.select(timeout=1.0):
+                    if not key.data(key.fileobj.fileno()):
+                        selector.unregister(key.fileobj)
+                        key.fileobj.close()
+                self._update_rate()
+        except Exception as ex:
+            self.logger.error(f"{self.name} reader failed: {ex}")
+            for pipe in (self.proc.stdout, self.proc.stderr):
+                if pipe is not None:
+                    pipe.close()
+        finally:
+            selector.close()
+            self._flush_stderr()
+            returncode = self.proc.wait()
+            self.logger.info(f"{self.name} process terminated (exit code {returncode}).")
+            if self.on_exit is not None:
+                self.on_exit(self)
+
+    def _handle_stdout(self, fd):
+        chunks = []
+        eof = False
+        for _ in range(self.max_reads_per_batch):
+            try:
+                data = os.read(fd, self.read_size)
+            except BlockingIOError:
+                break
+            if not data:
+                eof = True
+                break
+            chunks.append(data)
+            self.reads += 1
+            if len(data) < self.read_size:
+                break
+        try:
+            events = []
+            if chunks:
+                data = b"".join(chunks) if len(chunks) > 1 else chunks[0]
+                self.bytes_read += len(data)
+                events = self.decoder.feed(data)
+            if eof and hasattr(self.decoder, "flush"):
+                events += self.decoder.flush()
+            if events:
+                self._store(events)
+        except Exception as ex:
+            self.batch_errors += 1
+            self.logger.error(f"{self.name} dropped a batch that failed to ingest: {ex}")
+        if not eof:
+            self.backlog_bytes = _pending_bytes(fd)
+            if self.backlog_bytes > self.max_backlog_bytes:
+                self.max_backlog_bytes = self.backlog_bytes
+        return not eof
+
+    def _store(self, events):
+        last_seq = self.store.extend(events)
+        count = len(events)
+        if self.on_batch is not None:
+            try:
+                self.on_batch(last_seq - count + 1, events)
+            except Exception as ex:
+                self.logger.error(f"{self.name} batch handler failed: {ex}")
+        self.events += count
+        self.batches += 1
+        if count > self.max_batch_events:
+            self.max_batch_events = count
+        ts = getattr(events[-1], "ts", None)
+        if ts is not None:
+            self.ingest_lag_ns = max(time.time_ns() - ts, 0)
+
+    def _handle_stderr(self, fd):
+        try:
+            data = os.read(fd, self.read_size)
+        except BlockingIOError:
+            return True
+        if not data:
+            return False
+        lines = (self._stderr_buffer + data).split(b"\n")
+        self._stderr_buffer = lines.pop()
+        for line in lines:
+            self._log_stderr(line)
+        return True
+
+    def _flush_stderr(self):
+        if self._stderr_buffer:
+            self._log_stderr(self._stderr_buffer)
+            self._stderr_buffer = b""
+
+    def _log_stderr(self, raw):
+        line = raw.decode("utf-8", "replace").strip()
+        if line:
+            self.stderr_lines += 1
+            self.stderr_tail.append(line)
+            self.logger.warning(f"{self.name} stderr: {line}")
+
+    def _update_rate(self):
+        now = time.monotonic()
+        elapsed = now - self._rate_time
+        if elapsed >= 1.0:
+            self.events_per_sec = (self.events - self._rate_events) / elapsed
+            self._rate_events = self.events
+            self._rate_time = now
+
+    # ------------------------
+    # Introspection
+    # ------------------------
+    def stats(self):
+        return {
+            "name": self.name,
+            "pid": self.proc.pid,
+            "running": self.is_alive(),
+            "started_at": self.started_at,
+            "bytes_read": self.bytes_read,
+            "reads": self.reads,
+            "batches": self.batches,
+            "events": self.events,
+            "max_batch_events": self.max_batch_events,
+            "events_per_sec": round(self.events_per_sec, 2),
+            "backlog_bytes": self.backlog_bytes,
+            "max_backlog_bytes": self.max_backlog_bytes,
+            "ingest_lag_ms": round(self.ingest_lag_ns / 1e6, 3),
+            "decode_skipped": getattr(self.decoder, "skipped", 0),
+            "batch_errors": self.batch_errors,
+            "stderr_lines": self.stderr_lines,
+            "stderr_tail": list(self.stderr_tail),
+        }
+
+
+def _pending_bytes(fd):
+    """Number of unread bytes queued in a pipe (0 if it cannot be queried)."""
+    try:
+        buf = fcntl.ioctl(fd, termios.FIONREAD, b"\0\0\0\0")
+        return struct.unpack("i", buf)[0]
+    except OSError:
+        return 0
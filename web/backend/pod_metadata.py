@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Resolution of exec events to Kubernetes pods.
+
+The collector tags every event with the cgroup v2 id of the task. PodResolver
+maps cgroup ids to container ids and pods in the background:
+
+- submit() is called from the collector reader with each stored batch. It
+  only queues cgroup ids that are not cached yet, so thousands of short-lived
+  processes in one container cause a single lookup.
+- A worker thread resolves the queued ids in batches. The cgroup path comes
+  from /proc/<pid>/cgroup of a process seen in that cgroup or, when the
+  process is already gone, from one walk of the cgroup filesystem (the
+  inode number of a cgroup v2 directory is its id). The pid is read a little
+  after the exec and may have exited, been recycled or moved since, so a
+  /proc path is only used if its directory's inode is the event's cgroup id. The container id and pod
+  UID are parsed from the path and looked up in a pluggable metadata source.
+- Results are kept in an LRU cache. Ids that could not be resolved are cached
+  as negative entries, and containers whose pod is not known yet as partial
+  entries, for `negative_ttl` seconds; only then are they retried.
+
+lookup() only reads the cache and never blocks, so it can be used while
+serializing API responses.
+"""
+import json
+import os
+import re
+import threading
+import time
+import urllib.request
+from collections import OrderedDict, namedtuple
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+_CONTAINER_ID = re.compile(r"([0-9a-f]{64})")
+_POD_UID = re.compile(r"pod([0-9a-f]{8}[-_][0-9a-f]{4}[-_][0-9a-f]{4}[-_][0-9a-f]{4}[-_][0-9a-f]{12})")
+
+
+class PodInfo(namedtuple("PodInfo", ["cgroup_path", "container_id", "pod_uid", "namespace", "pod", "container"])):
+    """What is known about one cgroup; fields are None when not applicable."""
+    __slots__ = ()
+
+    def to_dict(self):
+        return {
+            "container_id": self.container_id,
+            "namespace": self.namespace,
+            "pod": self.pod,
+            "container": self.container,
+        }
+
+
+def parse_cgroup_path(path):
+    """Return (container_id, pod_uid) parsed from a cgroup path (None if absent)."""
+    containers = _CONTAINER_ID.findall(path)
+    pod = _POD_UID.search(path)
+    return (containers[-1] if containers else None,
+            pod.group(1).replace("_", "-") if pod else None)
+
+
+def read_proc_cgroup(pid):
+    """Return the cgroup v2 path of a process, or None if it has exited."""
+    try:
+        with open(f"/proc/{pid}/cgroup") as f:
+            lines = f.read().splitlines()
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        return None
+    for line in lines:
+        if line.startswith("0::"):
+            return line[3:]
+    return None
+
+
+# ------------------------
+# Metadata sources
+# ------------------------
+class PodListSource:
+    """
+    Metadata from a Kubernetes PodList document (the output of
+    `kubectl get pods -A -o json` or the kubelet's /pods endpoint). `load()`
+    returns the parsed document; it is refreshed at most every
+    `refresh_seconds`, and only when a lookup misses.
+    """
+
+    def __init__(self, refresh_seconds=10.0):
+        self.refresh_seconds = refresh_seconds
+        self._containers = {}   # container id -> (namespace, pod, container)
+        self._pods = {}         # pod uid -> (namespace, pod)
+        self._loaded_at = 0.0
+        self.loads = 0
+
+    def load(self):
+        raise NotImplementedError
+
+    def _refresh(self):
+        try:
+            document = self.load()
+        except (OSError, ValueError) as e:
+            raise LookupError(f"pod metadata unavailable: {e}")
+        self._loaded_at = time.monotonic()
+        if document is None:
+            return
+        containers = {}
+        pods = {}
+        for item in document.get("items", []):
+            meta = item.get("metadata", {})
+            namespace, name = meta.get("namespace"), meta.get("name")
+            if meta.get("uid"):
+                pods[meta["uid"]] = (namespace, name)
+            status = item.get("status", {})
+            for key in ("containerStatuses", "initContainerStatuses", "ephemeralContainerStatuses"):
+                for container in status.get(key) or []:
+                    container_id = (container.get("containerID") or "").rpartition("://")[2]
+                    if container_id:
+                        containers[container_id] = (namespace, name, container.get("name"))
+        self._containers = containers
+        self._pods = pods
+        self.loads += 1
+
+    def resolve(self, keys):
+        """
+        Map [(container_id, pod_uid)] to {(container_id, pod_uid): (namespace,
+        pod, container)} for the keys that are known.
+        """
+        def find(key):
+            container_id, pod_uid = key
+            if container_id in self._containers:
+                return self._containers[container_id]
+            if pod_uid in self._pods:
+                return self._pods[pod_uid] + (None,)
+            return None
+
+        found = {key: find(key) for key in keys}
+        missing = [key for key, value in found.items() if value is None]
+        if missing and time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            self._refresh()
+            found.update((key, find(key)) for key in missing)
+        return {key: value for key, value in found.items() if value is not None}
+
+
+class FilePodSource(PodListSource):
+    """PodList JSON read from a local file, reloaded when it changes."""
+
+    def __init__(self, path, refresh_seconds=1.0):
+        super().__init__(refresh_seconds)
+        self.path = path
+        self._mtime = None
+
+    def load(self):
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return None
+        with open(self.path) as f:
+            document = json.load(f)
+        self._mtime = mtime
+        return document
+
+
+class KubeletPodSource(PodListSource):
+    """PodList fetched over HTTP, e.g. from the kubelet's /pods endpoint."""
+
+    def __init__(self, url, token_file=None, timeout=2.0, refresh_seconds=10.0):
+        super().__init__(refresh_seconds)
+        self.url = url
+        self.token_file = token_file
+        self.timeout = timeout
+
+    def load(self):
+        req = urllib.request.Request(self.url)
+        if self.token_file:
+            with open(self.token_file) as f:
+                req.add_header("Authorization", f"Bearer {f.read().strip()}")
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return json.load(response)
+
+
+def create_metadata_source(spec):
+    """
+    Build a metadata source from "file:<path>" or "kubelet:<url>"; an empty
+    spec gives None (containers are still identified, pods are not).
+    """
+    if not spec:
+        return None
+    kind, _, target = spec.partition(":")
+    if kind == "file":
+        return FilePodSource(target)
+    if kind == "kubelet":
+        return KubeletPodSource(target, token_file=os.environ.get("K8SSCOPE_KUBELET_TOKEN_FILE"))
+    raise ValueError(f"Unsupported pod metadata source: {spec}")
+
+
+# ------------------------
+# Resolver
+# ------------------------
+class PodResolver:
+    def __init__(self, source=None, capacity=4096, negative_ttl=30.0, batch_interval=0.2,
+                 walk_interval=10.0, cgroup_root=CGROUP_ROOT, logger=None):
+        self.source = source
+        self.capacity = capacity
+        self.negative_ttl = negative_ttl
+        self.batch_interval = batch_interval
+        self.walk_interval = walk_interval
+        self.cgroup_root = cgroup_root
+        self.logger = logger
+        self.lock = threading.Lock()
+        self._cache = OrderedDict()   # cgroup id -> (PodInfo or None, retry time or None)
+        self._pending = {}            # cgroup id -> a pid seen in that cgroup
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._last_walk = 0.0
+        self.resolved = 0
+        self.unresolved = 0
+        self.walks = 0
+        self.mismatched = 0   # /proc paths rejected because the pid changed cgroup
+        self.source_errors = 0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pod-resolver", daemon=True)
+            self._thread.start()
+        return self
+
+    # ------------------------
+    # Producer side (collector reader thread)
+    # ------------------------
+    def submit(self, events):
+        """Queue the unknown cgroup ids of a batch of ExecEvents."""
+        ids = {event.cgroup_id: event.tgid for event in events}
+        queued = False
+        now = time.monotonic()
+        with self.lock:
+            for cgroup_id, pid in ids.items():
+                if not cgroup_id or cgroup_id in self._pending:
+                    continue
+                entry = self._cache.get(cgroup_id)
+                if entry is None or (entry[1] is not None and entry[1] <= now):
+                    self._pending[cgroup_id] = pid
+                    queued = True
+        if queued:
+            self._wakeup.set()
+
+    # ------------------------
+    # Readers (request threads)
+    # ------------------------
+    def lookup(self, cgroup_id):
+        """Return the cached PodInfo of a cgroup id, or None. Never blocks on I/O."""
+        with self.lock:
+            entry = self._cache.get(cgroup_id)
+            if entry is None:
+                return None
+            self._cache.move_to_end(cgroup_id)
+            return entry[0]
+
+    def stats(self):
+        with self.lock:
+            cached = len(self._cache)
+            negative = sum(1 for info, _ in self._cache.values() if info is None)
+            pending = len(self._pending)
+        return {
+            "cached": cached,
+            "negative": negative,
+            "pending": pending,
+            "resolved": self.resolved,
+            "unresolved": self.unresolved,
+            "cgroup_walks": self.walks,
+            "proc_mismatched": self.mismatched,
+            "source": type(self.source).__name__ if self.source else None,
+            "source_errors": self.source_errors,
+        }
+
+    # ------------------------
+    # Worker
+    # ------------------------
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Let a burst accumulate so it is resolved as one batch
+            time.sleep(self.batch_interval)
+            self._wakeup.clear()
+            with self.lock:
+                batch, self._pending = self._pending, {}
+            try:
+                self._resolve(batch)
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"Pod metadata resolution failed: {e}")
+
+    def _walk_cgroups(self, wanted):
+        """Find the paths of `wanted` cgroup ids by walking the cgroup filesystem."""
+        if time.monotonic() - self._last_walk < self.walk_interval:
+            return {}
+        self._last_walk = time.monotonic()
+        self.walks += 1
+        found = {}
+        root = self.cgroup_root
+        for dirpath, _, _ in os.walk(root):
+            try:
+                inode = os.stat(dirpath).st_ino
+            except OSError:
+                continue
+            if inode in wanted:
+                found[inode] = "/" + os.path.relpath(dirpath, root).lstrip(".")
+                if len(found) == len(wanted):
+                    break
+        return found
+
+    def _cgroup_id(self, path):
+        """Inode number (= cgroup v2 id) of a cgroup path, or None."""
+        try:
+            return os.stat(os.path.join(self.cgroup_root, path.lstrip("/"))).st_ino
+        except OSError:
+            return None
+
+    def _resolve(self, batch):
+        paths = {}
+        for cgroup_id, pid in batch.items():
+            path = read_proc_cgroup(pid)
+            if path is None:
+                continue
+            if self._cgroup_id(path) == cgroup_id:
+                paths[cgroup_id] = path
+            else:
+                self.mismatched += 1
+        missing = {cgroup_id for cgroup_id in batch if cgroup_id not in paths}
+        if missing:
+            paths.update(self._walk_cgroups(missing))
+
+        parsed = {cgroup_id: (path,) + parse_cgroup_path(path) for cgroup_id, path in paths.items()}
+        metadata = {}
+        keys = [(c, p) for _, c, p in parsed.values() if c or p]
+        if self.source is not None and keys:
+            try:
+                metadata = self.source.resolve(keys)
+            except LookupError as e:
+                self.source_errors += 1
+                if self.logger:
+                    self.logger.warning(str(e))
+
+        now = time.monotonic()
+        with self.lock:
+            for cgroup_id in batch:
+                if cgroup_id not in parsed:
+                    # Exited before we looked and not found in cgroupfs
+                    self._store(cgroup_id, None, now + self.negative_ttl)
+                    self.unresolved += 1
+                    continue
+                path, container_id, pod_uid = parsed[cgroup_id]
+                meta = metadata.get((container_id, pod_uid))
+                retry = None
+                if (container_id or pod_uid) and meta is None and self.source is not None:
+                    # A container we cannot name yet (e.g. a new pod)
+                    retry = now + self.negative_ttl
+                    self.unresolved += 1
+                else:
+                    self.resolved += 1
+                namespace, pod, container = meta or (None, None, None)
+                self._store(cgroup_id, PodInfo(path, container_id, pod_uid, namespace, pod, container), retry)
+
+    def _store(self, cgroup_id, info, retry):
+        self._cache[cgroup_id] = (info, retry)
+        self._cache.move_to_end(cgroup_id)
+        while len(self._cache) > self.capacity:
+            self._cache.popitem(last=False)
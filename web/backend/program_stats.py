@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Background sampling of eBPF program run-time statistics.
+
+The kernel keeps cumulative run_time_ns/run_cnt counters per program while
+run-time stats are enabled (kernel.bpf_stats_enabled or BPF_ENABLE_STATS).
+ProgramStatsSampler reads them for every loaded program at a fixed interval
+and stores per-interval deltas in a fixed-size ring per program, from which
+ns per invocation and invocations per second are derived.
+
+With `window` > 0 the stats are only enabled for `window` seconds of every
+interval: the counters are read at the start and end of the window, so the
+accounting overhead is paid for window / interval of the time. Rates are
+then extrapolated from the window. The backend decides how stats are
+enabled: the syscall backend holds a BPF_ENABLE_STATS fd for the window,
+the bpftool backend flips kernel.bpf_stats_enabled and restores its previous
+value afterwards (leaving it untouched if it was already on).
+"""
+import threading
+import time
+from array import array
+
+
+class ProgramSeries:
+    """Ring of (ts, elapsed, run_time_ns delta, run_cnt delta) samples."""
+    __slots__ = ("capacity", "ts", "elapsed", "run_time", "run_cnt", "count", "head", "last")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ts = array("d", bytes(8 * capacity))
+        self.elapsed = array("d", bytes(8 * capacity))
+        self.run_time = array("Q", bytes(8 * capacity))
+        self.run_cnt = array("Q", bytes(8 * capacity))
+        self.count = 0
+        self.head = 0      # next slot to write
+        self.last = None   # newest cumulative (run_time_ns, run_cnt)
+
+    def add(self, ts, elapsed, run_time, run_cnt):
+        i = self.head
+        self.ts[i] = ts
+        self.elapsed[i] = elapsed
+        self.run_time[i] = run_time
+        self.run_cnt[i] = run_cnt
+        self.head = (i + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def samples(self, since_ts):
+        """Yield samples newer than since_ts, oldest first."""
+        start = (self.head - self.count) % self.capacity
+        for n in range(self.count):
+            i = (start + n) % self.capacity
+            if self.ts[i] > since_ts:
+                yield self.ts[i], self.elapsed[i], self.run_time[i], self.run_cnt[i]
+
+
+def _rates(elapsed, run_time, run_cnt):
+    return {
+        "run_time_ns": run_time,
+        "run_cnt": run_cnt,
+        "ns_per_run": round(run_time / run_cnt, 1) if run_cnt else None,
+        "runs_per_sec": round(run_cnt / elapsed, 3) if elapsed else None,
+    }
+
+
+class ProgramStatsSampler:
+    def __init__(self, backend, interval=1.0, window=0.0, capacity=3600, logger=None):
+        self.backend = backend
+        self.interval = interval
+        self.window = min(window, interval)
+        self.capacity = capacity
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.series = {}   # program id -> ProgramSeries
+        self.names = {}    # program id -> name
+        self.types = {}    # program id -> program type
+        self.samples = 0
+        self.errors = 0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="program-stats", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _read(self):
+        programs, error = self.backend.list_programs()
+        if error:
+            raise RuntimeError(error)
+        types = {p["id"]: p.get("type", "") for p in programs}
+        with self.lock:
+            self.types = types
+        return {p["id"]: (p.get("name", ""), p.get("run_time_ns", 0), p.get("run_cnt", 0)) for p in programs}
+
+    def _sample_window(self):
+        handle, error = self.backend.enable_stats()
+        if error:
+            raise RuntimeError(f"enable stats: {error}")
+        try:
+            before = self._read()
+            start = time.monotonic()
+            self._stop.wait(self.window)
+            after = self._read()
+            elapsed = time.monotonic() - start
+        finally:
+            self.backend.disable_stats(handle)
+        now = time.time()
+        with self.lock:
+            for prog_id, (name, run_time, run_cnt) in after.items():
+                series = self._series(prog_id, name)
+                if prog_id in before:
+                    _, run_time0, run_cnt0 = before[prog_id]
+                    series.add(now, elapsed, max(run_time - run_time0, 0), max(run_cnt - run_cnt0, 0))
+                series.last = (run_time, run_cnt)
+            self._forget(after)
+
+    def _sample_continuous(self, previous_time):
+        current = self._read()
+        now = time.time()
+        elapsed = now - previous_time if previous_time else 0.0
+        with self.lock:
+            for prog_id, (name, run_time, run_cnt) in current.items():
+                series = self._series(prog_id, name)
+                if series.last is not None and elapsed:
+                    run_time0, run_cnt0 = series.last
+                    series.add(now, elapsed, max(run_time - run_time0, 0), max(run_cnt - run_cnt0, 0))
+                series.last = (run_time, run_cnt)
+            self._forget(current)
+        return now
+
+    def _series(self, prog_id, name):
+        series = self.series.get(prog_id)
+        if series is None:
+            series = self.series[prog_id] = ProgramSeries(self.capacity)
+        self.names[prog_id] = name
+        return series
+
+    def _forget(self, present):
+        for prog_id in [p for p in self.series if p not in present]:
+            del self.series[prog_id]
+            del self.names[prog_id]
+
+    def _run(self):
+        previous_time = None
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                if self.window > 0:
+                    self._sample_window()
+                else:
+                    previous_time = self._sample_continuous(previous_time)
+                self.samples += 1
+            except Exception as e:
+                self.errors += 1
+                if str(e) != self.last_error and self.logger:
+                    self.logger.warning(f"Program stats sampling failed: {e}")
+                self.last_error = str(e)
+            self._stop.wait(max(self.interval - (time.monotonic() - started), 0))
+
+    def history(self, prog_id, seconds=300, step=None):
+        """
+        Return the stats of one program over the last `seconds`, downsampled to
+        `step`-second bins, or None if the program is not being sampled.
+        """
+        step = step or self.interval
+        now = time.time()
+        start = now - seconds
+        with self.lock:
+            series = self.series.get(prog_id)
+            if series is None:
+                return None
+            name = self.names[prog_id]
+            samples = list(series.samples(start))
+            last = series.last
+        bins = []
+        total = [0.0, 0, 0]
+        for ts, elapsed, run_time, run_cnt in samples:
+            bin_start = start + (ts - start) // step * step
+            if not bins or bins[-1][0] != bin_start:
+                bins.append([bin_start, 0.0, 0, 0])
+            b = bins[-1]
+            b[1] += elapsed
+            b[2] += run_time
+            b[3] += run_cnt
+            total[0] += elapsed
+            total[1] += run_time
+            total[2] += run_cnt
+        result = {
+            "id": prog_id,
+            "name": name,
+            "interval": self.interval,
+            "window": self.window,
+            "cumulative": {"run_time_ns": last[0], "run_cnt": last[1]} if last else None,
+            "latest": _rates(*samples[-1][1:]) if samples else None,
+            "summary": _rates(*total),
+            "series": {
+                "start": round(start, 3),
+                "step": step,
+                "points": [dict(ts=round(b[0], 3), **_rates(b[1], b[2], b[3])) for b in bins],
+            },
+        }
+        return result
+
+    def programs(self):
+        """Return [(id, name, type, run_time_ns, run_cnt)] with the newest cumulative counters."""
+        with self.lock:
+            return [(prog_id, self.names[prog_id], self.types.get(prog_id, ""), *series.last)
+                    for prog_id, series in self.series.items() if series.last is not None]
+
+    def stats(self):
+        with self.lock:
+            programs = len(self.series)
+        return {
+            "programs": programs,
+            "interval": self.interval,
+            "window": self.window,
+            "samples": self.samples,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
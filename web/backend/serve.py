@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Production entry point: serves app.py with waitress.
+
+Concurrency model:
+
+- One process. The collector and userspace readers, event stores, indexes,
+  aggregates and samplers live in this process, so the app must never be
+  forked into several workers (that would give each worker its own, empty
+  copy of the state).
+- waitress accepts and buffers connections on its I/O thread and runs
+  requests on a fixed pool of K8SSCOPE_THREADS worker threads. A slow
+  client does not hold a worker while its request or response is in flight.
+- Shared state is synchronized by the objects themselves: EventStore,
+  ExecAggregates, the caches and the samplers take their own short locks,
+  and the supervisor serializes starting and stopping each child process.
+- Work that can take long is kept off request threads: /api/programs is
+  served from a single-flight cache, program run-time stats, pod metadata
+  and cluster nodes are sampled by background threads, and bpftool/sudo
+  commands are killed after K8SSCOPE_COMMAND_TIMEOUT seconds.
+- An event stream (SSE) holds a worker for as long as it is open. At most
+  K8SSCOPE_MAX_STREAMS streams are accepted, so at least
+  K8SSCOPE_THREADS - K8SSCOPE_MAX_STREAMS workers are always left for
+  ordinary requests.
+
+SIGTERM and SIGINT stop the server and the child processes it started.
+"""
+import os
+import signal
+import sys
+
+HOST = os.environ.get("K8SSCOPE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("K8SSCOPE_PORT", 5000))
+THREADS = int(os.environ.get("K8SSCOPE_THREADS", 32))
+# Open connections beyond this wait in the listen backlog
+CONNECTION_LIMIT = int(os.environ.get("K8SSCOPE_CONNECTION_LIMIT", 1000))
+# Seconds an idle keep-alive connection is kept open
+CHANNEL_TIMEOUT = 120
+
+
+def main():
+    try:
+        from waitress import serve
+    except ImportError:
+        sys.exit("waitress is not installed (pip install waitress)")
+
+    from app import app, shutdown, SSE_MAX_STREAMS
+
+    if SSE_MAX_STREAMS >= THREADS:
+        app.logger.warning(f"K8SSCOPE_MAX_STREAMS ({SSE_MAX_STREAMS}) leaves no threads out of "
+                           f"K8SSCOPE_THREADS ({THREADS}) for other requests")
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, terminate)
+    try:
+        serve(
+            app,
+            host=HOST,
+            port=PORT,
+            threads=THREADS,
+            connection_limit=CONNECTION_LIMIT,
+            channel_timeout=CHANNEL_TIMEOUT,
+            asyncore_use_poll=True,
+            # Keep reading from busy connections so a closed stream is noticed
+            channel_request_lookahead=1,
+            ident="k8sscope",
+        )
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Stand-in for bpftool, used by benchmark.py so /api/programs and the map
+endpoints can be exercised without root or eBPF.
+
+It answers the `prog show` and `map show` subcommands of the bpftool
+backend with a fixed set of fake objects; every other subcommand succeeds
+without output. K8SSCOPE_STUB_PROGRAMS sets the number of programs (default
+50) and K8SSCOPE_STUB_DELAY the seconds every call takes, to model bpftool's
+start-up and kernel round trips.
+"""
+import json
+import os
+import sys
+import time
+
+PROGRAMS = int(os.environ.get("K8SSCOPE_STUB_PROGRAMS", 50))
+DELAY = float(os.environ.get("K8SSCOPE_STUB_DELAY", 0.02))
+PROG_TYPES = ("tracepoint", "xdp", "kprobe", "cgroup_skb")
+
+
+def fake_program(prog_id):
+    return {
+        "id": prog_id,
+        "type": PROG_TYPES[prog_id % len(PROG_TYPES)],
+        "name": f"stub_prog_{prog_id}",
+        "tag": f"{prog_id:016x}",
+        "gpl_compatible": True,
+        "loaded_at": 1700000000 + prog_id,
+        "uid": 0,
+        "orphaned": False,
+        "bytes_xlated": 4096,
+        "jited": True,
+        "bytes_jited": 2048,
+        "map_ids": [prog_id],
+        "btf_id": prog_id,
+        "run_time_ns": prog_id * 1000,
+        "run_cnt": prog_id * 10,
+    }
+
+
+def fake_map(map_id):
+    return {
+        "id": map_id,
+        "type": "hash",
+        "name": f"stub_map_{map_id}",
+        "flags": 0,
+        "bytes_key": 4,
+        "bytes_value": 8,
+        "max_entries": 1024,
+        "btf_id": map_id,
+    }
+
+
+def main(argv):
+    time.sleep(DELAY)
+    args = [arg for arg in argv if arg not in ("--json", "-j", "--pretty", "-p")]
+    if args[:2] == ["prog", "show"]:
+        if len(args) >= 4 and args[2] == "id":
+            result = fake_program(int(args[3]))
+        else:
+            result = [fake_program(prog_id) for prog_id in range(1, PROGRAMS + 1)]
+    elif args[:2] == ["map", "show"]:
+        if len(args) >= 4 and args[2] == "id":
+            result = fake_map(int(args[3]))
+        else:
+            result = [fake_map(map_id) for map_id in range(1, PROGRAMS + 1)]
+    elif args[:2] == ["map", "dump"]:
+        result = []
+    else:
+        return 0
+    json.dump(result, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
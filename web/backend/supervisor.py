@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Supervision of collector and userspace child processes.
+
+Every ManagedProcess has an id, a command line, its own output EventStore
+and, while it runs, its own PipeReader draining stdout/stderr into that
+store in batches. The Supervisor keeps them by id, so several collectors and
+userspace programs can run side by side.
+
+- Commands are started through a privilege prefix (sudo by default) in their
+  own process group. Optional resource limits are applied by running the
+  command through `prlimit` and `nice` after the prefix, so they hold for the
+  program itself whatever sudo's PAM configuration does. (A preexec_fn would
+  run Python code between fork and exec, which can deadlock in the threaded
+  server.)
+- A process that exits with a non-zero status without being stopped is
+  restarted after a backoff that doubles with every consecutive crash, up to
+  `backoff_max`. A run that lasted `stable_seconds` resets the backoff. A
+  clean exit (status 0) is not restarted.
+- stop() sends SIGTERM, waits `stop_timeout` seconds and then sends SIGKILL
+  to the whole process group, so children of sudo are not left behind.
+"""
+import os
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from pipe_reader import PipeReader
+
+PROCESS_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+# limits key -> prlimit(1) option
+RESOURCE_LIMITS = {
+    "memory_bytes": "--as",
+    "cpu_seconds": "--cpu",
+    "open_files": "--nofile",
+}
+
+
+def validate_limits(limits):
+    """Check a limits dict ({memory_bytes, cpu_seconds, open_files, nice}); raises ValueError."""
+    if not isinstance(limits, dict):
+        raise ValueError("'limits' must be an object")
+    for key, value in limits.items():
+        if key not in RESOURCE_LIMITS and key != "nice":
+            raise ValueError(f"unknown limit {key!r} (expected one of {', '.join([*RESOURCE_LIMITS, 'nice'])})")
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise ValueError(f"limit {key!r} must be an integer")
+        if key == "nice" and not 0 <= value <= 19:
+            raise ValueError("'nice' must be between 0 and 19")
+        if key != "nice" and value <= 0:
+            raise ValueError(f"limit {key!r} must be positive")
+    return limits
+
+
+def limits_argv(limits):
+    """Return the `prlimit ... -- nice -n N` words that apply `limits` to the command after them."""
+    argv = []
+    rlimits = [f"{RESOURCE_LIMITS[key]}={value}" for key, value in limits.items() if key in RESOURCE_LIMITS]
+    if rlimits:
+        argv += ["prlimit", *rlimits, "--"]
+    if limits.get("nice"):
+        argv += ["nice", "-n", str(limits["nice"])]
+    return argv
+
+
+class ManagedProcess:
+    def __init__(self, process_id, kind, command, store, decoder_factory, logger, prefix=("sudo",),
+                 on_batch=None, restart=True, limits=None, backoff_initial=1.0, backoff_max=60.0,
+                 stable_seconds=30.0, stop_timeout=5.0, read_size=64 * 1024):
+        self.id = process_id
+        self.kind = kind
+        self.command = list(command)
+        self.store = store
+        self.decoder_factory = decoder_factory
+        self.logger = logger
+        self.prefix = list(prefix)
+        self.on_batch = on_batch
+        self.restart = restart
+        self.limits = dict(limits or {})
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_seconds = stable_seconds
+        self.stop_timeout = stop_timeout
+        self.read_size = read_size
+        self.lock = threading.Lock()
+        self.state = "stopped"    # running, backoff, stopping, stopped, exited, failed
+        self.proc = None
+        self.reader = None
+        self.started_at = None
+        self.exit_code = None
+        self.last_error = None
+        self.starts = 0
+        self.restarts = 0
+        self.failures = 0         # consecutive crashes, drives the backoff
+        self.next_restart_at = None
+        self._started_mono = None
+        self._stopping = False
+        self._timer = None
+
+    # ------------------------
+    # Lifecycle
+    # ------------------------
+    def is_running(self):
+        proc = self.proc
+        return proc is not None and proc.poll() is None
+
+    def start(self):
+        """Start the process; return False if it is already running. Raises OSError if it cannot be launched."""
+        with self.lock:
+            if self.is_running():
+                return False
+            self._cancel_timer_locked()
+            self._stopping = False
+            self.failures = 0
+            self._spawn_locked()
+        return True
+
+    def _spawn_locked(self):
+        try:
+            proc = subprocess.Popen(
+                self.prefix + limits_argv(self.limits) + self.command,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+                start_new_session=True,
+            )
+        except OSError as e:
+            self.state = "failed"
+            self.last_error = str(e)
+            raise
+        self.proc = proc
+        self.started_at = time.time()
+        self._started_mono = time.monotonic()
+        self.exit_code = None
+        self.next_restart_at = None
+        self.starts += 1
+        self.state = "running"
+        self.reader = PipeReader(
+            self.id, proc, self.decoder_factory(), self.store, self.logger,
+            read_size=self.read_size,
+            on_batch=self.on_batch,
+            on_exit=self._on_exit,
+        ).start()
+
+    def _on_exit(self, reader):
+        """Called on the reader thread once the process has exited."""
+        with self.lock:
+            if reader is not self.reader:
+                return
+            self.exit_code = reader.proc.returncode
+            if self._stopping:
+                self.state = "stopped"
+                return
+            if self.exit_code == 0 or not self.restart:
+                self.state = "exited"
+                return
+            if time.monotonic() - self._started_mono >= self.stable_seconds:
+                self.failures = 0
+            self.logger.warning(f"{self.id} exited with status {self.exit_code}")
+            self._schedule_restart_locked()
+
+    def _schedule_restart_locked(self):
+        delay = min(self.backoff_initial * 2 ** self.failures, self.backoff_max)
+        self.failures += 1
+        self.state = "backoff"
+        self.next_restart_at = time.time() + delay
+        self.logger.info(f"Restarting {self.id} in {delay:g}s")
+        self._timer = threading.Timer(delay, self._restart)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _restart(self):
+        with self.lock:
+            if self._stopping or self.state != "backoff":
+                return
+            self._timer = None
+            self.restarts += 1
+            try:
+                self._spawn_locked()
+            except OSError as e:
+                self.logger.error(f"Failed to restart {self.id}: {e}")
+                self._schedule_restart_locked()
+
+    def _cancel_timer_locked(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self.next_restart_at = None
+
+    def stop(self):
+        """
+        Stop the process (SIGTERM, then SIGKILL to its process group after
+        stop_timeout) and cancel pending restarts; return False if it was not
+        running. Raises on failure to signal it.
+        """
+        with self.lock:
+            self._stopping = True
+            self._cancel_timer_locked()
+            proc = self.proc
+            if proc is None or proc.poll() is not None:
+                self.state = "stopped"
+                return False
+            self.state = "stopping"
+        # Signal and wait without the lock; the reader's on_exit needs it
+        self._signal(proc.pid, "TERM", group=False)
+        try:
+            proc.wait(timeout=self.stop_timeout)
+        except subprocess.TimeoutExpired:
+            self.logger.warning(f"{self.id} did not exit within {self.stop_timeout:g}s; killing it")
+            self._signal(proc.pid, "KILL", group=True)
+            proc.wait(timeout=5)
+        with self.lock:
+            self.state = "stopped"
+        return True
+
+    def _signal(self, pid, name, group):
+        if self.prefix:
+            target = f"-{pid}" if group else str(pid)
+            subprocess.run(self.prefix + ["kill", f"-{name}", "--", target], check=True, capture_output=True)
+        elif group:
+            os.killpg(pid, getattr(signal, f"SIG{name}"))
+        else:
+            os.kill(pid, getattr(signal, f"SIG{name}"))
+
+    # ------------------------
+    # Introspection
+    # ------------------------
+    def status(self):
+        with self.lock:
+            proc = self.proc
+            return {
+                "id": self.id,
+                "kind": self.kind,
+                "command": self.command,
+                "state": self.state,
+                "pid": proc.pid if proc is not None and proc.poll() is None else None,
+                "started_at": self.started_at,
+                "exit_code": self.exit_code,
+                "last_error": self.last_error,
+                "restart": self.restart,
+                "starts": self.starts,
+                "restarts": self.restarts,
+                "next_restart_at": self.next_restart_at,
+                "limits": self.limits,
+                "store": self.store.stats(),
+            }
+
+
+class Supervisor:
+    def __init__(self, logger, **defaults):
+        """`defaults` are passed to every ManagedProcess (prefix, backoff, stop_timeout, ...)."""
+        self.logger = logger
+        self.defaults = defaults
+        self.lock = threading.Lock()
+        self.processes = {}   # id -> ManagedProcess
+
+    def add(self, process_id, kind, command, store, decoder_factory, **options):
+        """Register a process (not started); raises ValueError for a bad or duplicate id."""
+        if not PROCESS_ID.match(process_id or ""):
+            raise ValueError(f"invalid process id {process_id!r}")
+        process = ManagedProcess(process_id, kind, command, store, decoder_factory, self.logger,
+                                 **{**self.defaults, **options})
+        with self.lock:
+            if process_id in self.processes:
+                raise ValueError(f"process {process_id!r} already exists")
+            self.processes[process_id] = process
+        return process
+
+    def get(self, process_id):
+        with self.lock:
+            return self.processes.get(process_id)
+
+    def remove(self, process_id):
+        """Stop and forget a process; return it, or None if unknown."""
+        with self.lock:
+            process = self.processes.get(process_id)
+        if process is None:
+            return None
+        process.stop()
+        with self.lock:
+            if self.processes.get(process_id) is process:
+                del self.processes[process_id]
+        return process
+
+    def all(self):
+        with self.lock:
+            return list(self.processes.values())
+
+    def pids(self):
+        """{id: pid} of the running processes."""
+        return {p.id: p.proc.pid for p in self.all() if p.is_running()}
+
+    def stop_all(self):
+        for process in self.all():
+            try:
+                process.stop()
+            except Exception as e:
+                self.logger.error(f"Failed to stop {process.id}: {e}")
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Synthetic stand-in for the exec collector (ebpf/exec_syscall/exec.c).
+
+It takes the collector's command line (--format, --ringbuf-size,
+--pin-root) and writes the same output: framed binary records, JSON lines
+or the text lines of handle_evt, plus a stats record about once per second.
+The events are generated instead of read from a ring buffer, so the ingest
+path can be driven without root or eBPF. benchmark.py runs it through
+K8SSCOPE_COLLECTOR_BIN.
+
+Events are generated at --rate per second (0 = as fast as the reader
+consumes them). A paced generator behaves like the ring buffer: while the
+pipe is full new events are counted as dropped instead of blocking, so
+losses show up in the stats records and /api/collector_health. The options
+can also be given as K8SSCOPE_SYNTHETIC_RATE, _DURATION and _COMMS, since
+the backend starts the collector with a fixed command line.
+"""
+import argparse
+import json
+import os
+import select
+import struct
+import sys
+import time
+
+from collector_protocol import EXEC_RECORD_EVT, EXEC_RECORD_STATS, RECORD_EVT, RECORD_HEADER, RECORD_STATS
+
+# exec_record_hdr followed by exec_record_evt
+BINARY_EVENT = struct.Struct("=" + RECORD_HEADER.format.lstrip("=") + RECORD_EVT.format.lstrip("="))
+STATS_INTERVAL = 1.0
+# Pacing granularity of a rate-limited generator
+TICK = 0.005
+# Events per write of an unpaced generator
+UNPACED_BATCH = 1024
+# Distinct cgroup ids the events are spread over
+CGROUPS = 16
+
+
+class EventEncoder:
+    def __init__(self, fmt, comms):
+        self.fmt = fmt
+        self.names = [(f"synth{i}", f"/usr/bin/synth{i}") for i in range(comms)]
+        self.encoded = [(comm.encode(), file.encode()) for comm, file in self.names]
+
+    def events(self, first, count, ts):
+        """Encode events first .. first+count-1, all stamped `ts`."""
+        names = self.encoded if self.fmt == "binary" else self.names
+        n = len(names)
+        if self.fmt == "binary":
+            pack = BINARY_EVENT.pack
+            return b"".join(
+                pack(RECORD_EVT.size, EXEC_RECORD_EVT, ts, 1000 + seq % 4000000, 1000 + seq % 4000000,
+                     *names[seq % n], 4096 + seq % CGROUPS)
+                for seq in range(first, first + count))
+        if self.fmt == "json":
+            return "".join(
+                f'{{"ts":{ts},"pid":{1000 + seq % 4000000},"tgid":{1000 + seq % 4000000},'
+                f'"cgroup_id":{4096 + seq % CGROUPS},"comm":{json.dumps(names[seq % n][0])},'
+                f'"file":{json.dumps(names[seq % n][1])}}}\n'
+                for seq in range(first, first + count)).encode()
+        return "".join(
+            f"tgid: {1000 + seq % 4000000} <> pid: {1000 + seq % 4000000} -- "
+            f"comm: {names[seq % n][0]} <> file: {names[seq % n][1]}\n"
+            for seq in range(first, first + count)).encode()
+
+    def stats(self, ts, submitted, dropped, consumed, ringbuf_bytes):
+        if self.fmt == "binary":
+            return RECORD_HEADER.pack(RECORD_STATS.size, EXEC_RECORD_STATS) + \
+                RECORD_STATS.pack(ts, submitted, dropped, consumed, ringbuf_bytes, 0)
+        if self.fmt == "json":
+            return (f'{{"type":"stats","ts":{ts},"submitted":{submitted},"dropped":{dropped},'
+                    f'"consumed":{consumed},"ringbuf_bytes":{ringbuf_bytes},"filtered":0}}\n').encode()
+        if dropped:
+            sys.stderr.write(f"stats: submitted={submitted} dropped={dropped} consumed={consumed}\n")
+        return b""
+
+
+def write_some(fd, data):
+    """Write as much of `data` as the pipe takes; return the rest."""
+    try:
+        written = os.write(fd, data)
+    except BlockingIOError:
+        return data
+    return data[written:]
+
+
+def write_all(fd, data):
+    while data:
+        data = write_some(fd, data)
+        if data:
+            select.select([], [fd], [])
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--format", choices=("text", "json", "binary"),
+                        default="text" if os.isatty(1) else "binary")
+    parser.add_argument("--ringbuf-size", type=int, default=256 * 1024)
+    parser.add_argument("--pin-root", default=None, help="accepted for compatibility; unused")
+    parser.add_argument("--rate", type=float, default=float(os.environ.get("K8SSCOPE_SYNTHETIC_RATE", 10000)),
+                        help="events per second (0 = unpaced)")
+    parser.add_argument("--duration", type=float, default=float(os.environ.get("K8SSCOPE_SYNTHETIC_DURATION", 0)),
+                        help="seconds to run (0 = until terminated)")
+    parser.add_argument("--comms", type=int, default=int(os.environ.get("K8SSCOPE_SYNTHETIC_COMMS", 200)),
+                        help="distinct comm/file names")
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    args = parse_args(argv)
+    encoder = EventEncoder(args.format, max(args.comms, 1))
+    fd = sys.stdout.fileno()
+    paced = args.rate > 0
+    if paced:
+        os.set_blocking(fd, False)
+
+    pending = b""
+    produced = dropped = 0
+    started = time.monotonic()
+    next_stats = started
+    try:
+        while True:
+            now = time.monotonic()
+            if args.duration and now - started >= args.duration:
+                break
+            due = int((now - started) * args.rate) - produced - dropped if paced else UNPACED_BATCH
+            if pending:
+                pending = write_some(fd, pending)
+            if due > 0:
+                if pending:
+                    # The "ring buffer" is full: events are lost, not queued
+                    dropped += due
+                else:
+                    data = encoder.events(produced, due, time.time_ns())
+                    produced += due
+                    if paced:
+                        pending = write_some(fd, data)
+                    else:
+                        write_all(fd, data)
+            if now >= next_stats:
+                record = encoder.stats(time.time_ns(), produced, dropped, produced, args.ringbuf_size)
+                if paced:
+                    pending += record
+                else:
+                    write_all(fd, record)
+                next_stats = now + STATS_INTERVAL
+            if paced:
+                time.sleep(TICK)
+        write_all(fd, pending)
+    except BrokenPipeError:
+        pass
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,91 @@
+"""
+In-memory stand-in for the eBPF backends (bpf_backend.py).
+
+Programs and maps are plain dicts that tests change between calls; every
+method returns (value, error) like the real backends, and calls are counted
+so tests can check how often the kernel would have been asked.
+"""
+from collections import Counter
+
+
+class FakeBackend:
+    name = "fake"
+
+    def __init__(self):
+        self.programs = {}   # id -> program dict as returned by `bpftool prog show`
+        self.maps = {}       # id -> {key bytes: value bytes}
+        self.pinned = {}     # pin path -> map id
+        self.writes = []     # ("update", map id, key, value) / ("delete", map id, key), in order
+        self.stats_enabled = False
+        self.fail = None     # error message returned by every call while set
+        self.calls = Counter()
+
+    def add_program(self, prog_id, name, prog_type="tracepoint", run_time_ns=0, run_cnt=0):
+        self.programs[prog_id] = {"id": prog_id, "name": name, "type": prog_type,
+                                  "run_time_ns": run_time_ns, "run_cnt": run_cnt}
+
+    def run(self, prog_id, count, ns_per_run):
+        """Account `count` runs of a program, if run-time stats are on."""
+        if self.stats_enabled:
+            self.programs[prog_id]["run_time_ns"] += count * ns_per_run
+            self.programs[prog_id]["run_cnt"] += count
+
+    def list_programs(self):
+        self.calls["list_programs"] += 1
+        if self.fail:
+            return None, self.fail
+        return [dict(p) for p in self.programs.values()], None
+
+    def program_info(self, prog_id):
+        self.calls["program_info"] += 1
+        if prog_id not in self.programs:
+            return None, f"program {prog_id} not found"
+        return dict(self.programs[prog_id]), None
+
+    def map_info(self, map_id):
+        self.calls["map_info"] += 1
+        if self.fail:
+            return None, self.fail
+        if map_id not in self.maps:
+            return None, f"map {map_id} not found"
+        return {"id": map_id, "type": "hash", "name": f"map{map_id}"}, None
+
+    def map_entries(self, map_id, batch_size=None):
+        self.calls["map_entries"] += 1
+        if self.fail:
+            return None, self.fail
+        if map_id not in self.maps:
+            return None, f"map {map_id} not found"
+        return list(self.maps[map_id].items()), None
+
+    def pinned_map_info(self, pin_path):
+        self.calls["pinned_map_info"] += 1
+        if pin_path not in self.pinned:
+            return None, f"{pin_path}: No such file or directory"
+        return self.map_info(self.pinned[pin_path])
+
+    def map_update(self, map_id, key, value):
+        self.calls["map_update"] += 1
+        if self.fail:
+            return None, self.fail
+        self.writes.append(("update", map_id, key, value))
+        self.maps[map_id][key] = value
+        return None, None
+
+    def map_delete(self, map_id, key):
+        self.calls["map_delete"] += 1
+        if self.fail:
+            return None, self.fail
+        self.writes.append(("delete", map_id, key))
+        del self.maps[map_id][key]
+        return None, None
+
+    def enable_stats(self):
+        self.calls["enable_stats"] += 1
+        self.stats_enabled = True
+        return True, None
+
+    def disable_stats(self, handle):
+        self.calls["disable_stats"] += 1
+        self.stats_enabled = False
+        return None, None
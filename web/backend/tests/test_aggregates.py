@@ -0,0 +1,85 @@
+from aggregates import BoundedCounter, ExecAggregates, RateHistogram, WindowedCounts
+from collector_protocol import ExecEvent
+
+
+def exec_event(comm, file="/bin/sh"):
+    return ExecEvent(0, 1, 1, comm, file)
+
+
+def test_bounded_counter_is_exact_until_pruned():
+    counter = BoundedCounter(2)
+    counter.update({"a": 5, "b": 3, "c": 1, "d": 1})
+    assert counter.counts == {"a": 5, "b": 3, "c": 1, "d": 1}
+    assert counter.error == 0
+
+
+def test_bounded_counter_prunes_to_the_largest_keys():
+    counter = BoundedCounter(2)
+    counter.update({"a": 10, "b": 8, "c": 4, "d": 2, "e": 1})
+    assert counter.counts == {"a": 10, "b": 8}
+    # The largest pruned count bounds the error of what is reported
+    assert counter.error == 4
+    counter.update({"c": 3, "f": 6, "g": 1})
+    assert counter.counts == {"a": 10, "b": 8}
+    assert counter.error == 6
+    # Below 2 * capacity keys new keys are counted again
+    counter.update({"h": 1})
+    assert counter.counts == {"a": 10, "b": 8, "h": 1}
+
+
+def test_windowed_counts_roll_over():
+    window = WindowedCounts(60, buckets=6)
+    window.add(1000, 2, {"sh": 2}, {"/bin/sh": 2})
+    window.add(1025, 1, {"ls": 1}, {"/bin/ls": 1})
+    snapshot = window.snapshot(1030, 10)
+    assert snapshot["total"] == 3
+    assert snapshot["rate"] == 0.05
+    assert snapshot["top_comm"][0] == {"comm": "sh", "count": 2, "rate": round(2 / 60, 3)}
+    # 1000 falls out of the window once its bucket is older than 60 s
+    snapshot = window.snapshot(1065, 10)
+    assert snapshot["total"] == 1
+    assert [c["comm"] for c in snapshot["top_comm"]] == ["ls"]
+    assert window.snapshot(1100, 10)["total"] == 0
+    assert window.buckets == {}
+
+
+def test_windowed_counts_report_max_error():
+    window = WindowedCounts(60, buckets=6, capacity=1)
+    window.add(1000, 6, {"a": 3, "b": 2, "c": 1}, {})
+    window.add(1015, 6, {"a": 3, "b": 2, "c": 1}, {})
+    snapshot = window.snapshot(1020, 10)
+    assert snapshot["top_comm"] == [{"comm": "a", "count": 6, "rate": 0.1}]
+    assert snapshot["max_error"] == 4
+
+
+def test_rate_histogram_zeroes_idle_seconds():
+    rates = RateHistogram(10)
+    rates.add(100, 3)
+    rates.add(100.5, 1)
+    rates.add(102, 2)
+    assert rates.series(102, 4, 1) == (99, 1, [0, 4, 0, 2])
+    assert rates.series(103, 4, 2) == (100, 2, [4, 2])
+    # Slots are reused after a full turn without events
+    rates.add(115, 1)
+    assert rates.series(115, 10, 5) == (106, 5, [0, 1])
+
+
+def test_exec_aggregates_snapshot_and_reset():
+    clock = [1000.0]
+    aggregates = ExecAggregates(windows={"1m": 60}, max_comms=2, clock=lambda: clock[0])
+    aggregates.add_batch([exec_event("sh"), exec_event("sh"), exec_event("ls", "/bin/ls")])
+    clock[0] += 1
+    aggregates.add_batch([exec_event("curl", "/usr/bin/curl")])
+    snapshot = aggregates.snapshot(top_n=1, series_seconds=2)
+    assert snapshot["total"] == 4
+    assert snapshot["windows"]["1m"]["top_comm"][0]["comm"] == "sh"
+    assert snapshot["rate_series"] == {"start": 1000, "step": 1, "counts": [3, 1]}
+    # Comms beyond max_comms are folded into the "other" total
+    assert aggregates.totals() == (4, {"sh": 2, "ls": 1}, 1)
+
+    aggregates.reset()
+    snapshot = aggregates.snapshot()
+    assert snapshot["total"] == 0 and snapshot["windows"]["1m"]["total"] == 0
+    # Cumulative totals keep growing across resets
+    aggregates.add_batch([exec_event("sh")])
+    assert aggregates.totals() == (5, {"sh": 3, "ls": 1}, 1)
@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from aggregator import ClusterAggregator
+from collector_protocol import ExecEvent, event_size
+from event_index import ExecEventIndex, query_events
+from event_store import EventStore
+
+SECOND = 1_000_000_000
+
+
+def node_app(store):
+    """A node backend reduced to the /api/collector_events cursor API."""
+    app = Flask(__name__)
+
+    @app.route("/api/collector_events")
+    def events():
+        since = request.args.get("since", type=int)
+        limit = request.args.get("limit", 1000, type=int)
+        result = store.tail(limit) if since is None else store.read_since(since, limit)
+        return jsonify({
+            "events": [event.to_dict() for event in result.events],
+            "first_seq": result.first_seq,
+            "last_seq": result.last_seq,
+            "next": result.next,
+            "gap": result.gap,
+        })
+
+    return app
+
+
+class FlaskClientPool:
+    """Stands in for NodeConnectionPool, answering from a Flask test client."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.connects = 0
+        self.requests = 0
+
+    def get_json(self, path, params=None):
+        self.requests += 1
+        return self.client.get(path, query_string=params).get_json()
+
+    def close(self):
+        pass
+
+
+def exec_event(ts, pid):
+    return ExecEvent(ts, pid, pid, f"proc{pid}", f"/bin/proc{pid}")
+
+
+class Cluster:
+    def __init__(self, *names):
+        self.nodes = {name: EventStore(1000, sizeof=event_size) for name in names}
+        self.index = ExecEventIndex()
+        self.store = EventStore(1000, sizeof=event_size, index=self.index)
+        self.aggregator = ClusterAggregator({name: f"http://{name}" for name in names}, self.store)
+        for name, node in self.aggregator.nodes.items():
+            node.pool = FlaskClientPool(node_app(self.nodes[name]))
+
+    def add(self, name, *events):
+        self.nodes[name].extend(list(events))
+
+    def sync(self):
+        """Fetch every node until caught up, then merge."""
+        for node in self.aggregator.nodes.values():
+            while self.aggregator._fetch(node):
+                pass
+        return self.aggregator.merge()
+
+    def merged(self):
+        return [(e.node, e.node_seq, e.ts) for e in self.store.read_since(0, None).events]
+
+
+@pytest.fixture
+def cluster():
+    cluster = Cluster("a", "b")
+    # Start the cursors on the empty stores, as a freshly started aggregator does
+    cluster.sync()
+    return cluster
+
+
+def test_events_are_merged_in_timestamp_order(cluster):
+    cluster.add("a", exec_event(10, 1), exec_event(30, 2), exec_event(50, 3))
+    cluster.add("b", exec_event(20, 4), exec_event(40, 5))
+    assert cluster.sync() == 5
+    assert cluster.merged() == [("a", 1, 10), ("b", 1, 20), ("a", 2, 30), ("b", 2, 40), ("a", 3, 50)]
+
+
+def test_events_are_not_fetched_twice(cluster):
+    cluster.add("a", exec_event(10, 1))
+    cluster.sync()
+    assert cluster.sync() == 0
+    cluster.add("a", exec_event(20, 2))
+    cluster.add("b", exec_event(15, 3))
+    assert cluster.sync() == 2
+    assert cluster.merged() == [("a", 1, 10), ("b", 1, 15), ("a", 2, 20)]
+    assert cluster.aggregator.stats()["merged"] == 3
+
+
+def test_node_restart_is_followed(cluster):
+    cluster.add("a", exec_event(10, 1), exec_event(20, 2))
+    cluster.sync()
+    # The node restarted without its journal and numbers events from 1 again
+    cluster.nodes["a"] = EventStore(1000, sizeof=event_size)
+    cluster.aggregator.nodes["a"].pool = FlaskClientPool(node_app(cluster.nodes["a"]))
+    cluster.add("a", exec_event(30, 3))
+    cluster.sync()
+    assert cluster.merged()[-1] == ("a", 1, 30)
+    assert cluster.aggregator.node_status()["a"]["restarts"] == 1
+
+
+def test_late_events_are_kept_out_of_the_store(cluster):
+    cluster.add("a", exec_event(10 * SECOND, 1), exec_event(30 * SECOND, 2))
+    cluster.sync()
+    # Node b delivers an event older than what was already released
+    cluster.add("b", exec_event(20 * SECOND, 3), exec_event(40 * SECOND, 4))
+    assert cluster.sync() == 1
+
+    assert [ts for _, _, ts in cluster.merged()] == [10 * SECOND, 30 * SECOND, 40 * SECOND]
+    late = cluster.aggregator.late_events()
+    assert [(e.node, e.ts) for e in late] == [("b", 20 * SECOND)]
+    assert cluster.aggregator.stats()["late"] == 1
+    assert cluster.aggregator.node_status()["b"]["late"] == 1
+
+    # Time range queries rely on the store being in timestamp order
+    matches, _, _ = query_events(cluster.store, cluster.index, from_ts=25 * SECOND, to_ts=45 * SECOND)
+    assert [event.ts for _, event in matches] == [30 * SECOND, 40 * SECOND]
+
+
+def test_aggregates_two_nodes_over_http():
+    stores = {name: EventStore(1000, sizeof=event_size) for name in ("a", "b")}
+    servers = [make_server("127.0.0.1", 0, node_app(store), threaded=True) for store in stores.values()]
+    for server in servers:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    store = EventStore(1000, sizeof=event_size)
+    aggregator = ClusterAggregator(
+        {name: f"http://127.0.0.1:{server.server_port}" for name, server in zip(stores, servers)},
+        store, poll_interval=0.05, skew=0, max_hold=60)
+    now = time.time_ns()
+    stores["a"].extend([exec_event(now - 3 * SECOND, 1), exec_event(now - SECOND, 2)])
+    stores["b"].extend([exec_event(now - 2 * SECOND, 3)])
+    try:
+        aggregator.start()
+        deadline = time.monotonic() + 10
+        while store.stats()["last_seq"] + aggregator.stats()["late"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        merged = store.read_since(0, None).events
+        # Which node is read first is up to the pollers; an event can only end
+        # up late if its node answered after the other's newer events merged
+        assert [e.ts for e in merged] == sorted(e.ts for e in merged)
+        assert sorted((e.node, e.pid) for e in merged + aggregator.late_events()) == [("a", 1), ("a", 2), ("b", 3)]
+        status = aggregator.node_status()
+        assert status["a"]["state"] == "ok" and status["b"]["state"] == "ok"
+    finally:
+        aggregator.stop()
+        for server in servers:
+            server.shutdown()
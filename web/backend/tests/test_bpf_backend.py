@@ -0,0 +1,63 @@
+import pytest
+
+import bpf_backend
+from bpf_backend import BpftoolBackend, create_backend
+
+
+class UnusableSyscall(bpf_backend.SyscallBackend):
+    def __init__(self, run_command):
+        raise OSError(1, "Operation not permitted")
+
+
+def no_commands(cmd):
+    raise AssertionError(f"unexpected command {cmd}")
+
+
+def test_auto_falls_back_to_bpftool(monkeypatch):
+    monkeypatch.setattr(bpf_backend, "SyscallBackend", UnusableSyscall)
+    assert isinstance(create_backend("auto", no_commands), BpftoolBackend)
+
+
+def test_explicit_syscall_does_not_fall_back(monkeypatch):
+    monkeypatch.setattr(bpf_backend, "SyscallBackend", UnusableSyscall)
+    with pytest.raises(RuntimeError, match="Operation not permitted"):
+        create_backend("syscall", no_commands)
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend("libbpf", no_commands)
+
+
+def test_bpftool_map_entries_decodes_hex():
+    dump = ('[{"key": ["0x01", "0x00"], "value": ["0x2a"]},'
+            ' {"key": ["0x02", "0x00"], "values": [{"cpu": 0, "value": ["0x01"]}, {"cpu": 1, "value": ["0x02"]}]}]')
+    backend = BpftoolBackend(lambda cmd: (dump, "", None))
+    entries, error = backend.map_entries(3)
+    assert error is None
+    assert entries == [(b"\x01\x00", b"\x2a"), (b"\x02\x00", [b"\x01", b"\x02"])]
+
+
+def stats_backend(tmp_path, monkeypatch, value):
+    sysctl = tmp_path / "bpf_stats_enabled"
+    sysctl.write_text(f"{value}\n")
+    monkeypatch.setattr(bpf_backend, "BPF_STATS_SYSCTL", str(sysctl))
+    commands = []
+    return BpftoolBackend(lambda cmd: commands.append(cmd) or ("", "", None)), commands
+
+
+def test_bpftool_stats_are_restored(tmp_path, monkeypatch):
+    backend, commands = stats_backend(tmp_path, monkeypatch, 0)
+    handle, error = backend.enable_stats()
+    assert error is None
+    backend.disable_stats(handle)
+    assert commands == [["sysctl", "-w", "kernel.bpf_stats_enabled=1"],
+                        ["sysctl", "-w", "kernel.bpf_stats_enabled=0"]]
+
+
+def test_bpftool_stats_enabled_by_admin_are_left_alone(tmp_path, monkeypatch):
+    backend, commands = stats_backend(tmp_path, monkeypatch, 1)
+    handle, error = backend.enable_stats()
+    assert error is None
+    backend.disable_stats(handle)
+    assert commands == []
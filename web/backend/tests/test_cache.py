@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+import cache
+from cache import SingleFlightCache
+
+
+class Loader:
+    """A loader that blocks until released, counting its calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return f"value{self.calls}"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def wait_for(condition):
+    for _ in range(500):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not reached")
+
+
+def test_value_is_cached_for_ttl(clock):
+    loader = Loader()
+    cached = SingleFlightCache(loader, ttl=10)
+    assert cached.get() == "value1"
+    clock[0] += 9
+    assert cached.get() == "value1"
+    clock[0] += 2
+    assert cached.get() == "value2"
+    assert cached.stats() == {"loads": 2, "hits": 1, "coalesced": 0, "stale_hits": 0, "ttl": 10}
+
+
+def test_concurrent_callers_share_one_load(clock):
+    loader = Loader()
+    loader.release.clear()
+    cached = SingleFlightCache(loader, ttl=10)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached.get())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    assert loader.started.wait(5)
+    wait_for(lambda: cached.stats()["coalesced"] == 4)
+    loader.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["value1"] * 5
+    assert loader.calls == 1
+
+
+def test_errors_reach_every_waiter_and_are_not_cached(clock):
+    loader = Loader()
+    loader.error = OSError("bpftool failed")
+    cached = SingleFlightCache(loader, ttl=10)
+    with pytest.raises(OSError):
+        cached.get()
+    loader.error = None
+    assert cached.get() == "value2"
+
+
+def test_invalidate_discards_a_load_in_flight(clock):
+    loader = Loader()
+    loader.release.clear()
+    cached = SingleFlightCache(loader, ttl=10)
+    results = []
+    first = threading.Thread(target=lambda: results.append(cached.get()))
+    first.start()
+    assert loader.started.wait(5)
+    cached.invalidate()
+    loader.release.set()
+    first.join(5)
+    # The old load answers its caller but is not cached
+    assert results == ["value1"]
+    assert cached.get() == "value2"
+    assert cached.get() == "value2"
+
+
+def test_stale_value_is_served_while_refreshing(clock):
+    loader = Loader()
+    cached = SingleFlightCache(loader, ttl=10)
+    assert cached.get(stale_ok=True) == "value1"
+    loader.release.clear()
+    loader.started.clear()
+    clock[0] += 11
+    assert cached.get(stale_ok=True) == "value1"
+    assert loader.started.wait(5)
+    # Only one background refresh runs at a time
+    assert cached.get(stale_ok=True) == "value1"
+    assert cached.stats()["stale_hits"] == 2
+    loader.release.set()
+    wait_for(lambda: cached.get(stale_ok=True) == "value2")
+    assert loader.calls == 2
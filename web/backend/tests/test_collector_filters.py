@@ -0,0 +1,96 @@
+import struct
+
+import pytest
+
+from collector_filters import FILE_PREFIX_MAX, CollectorFilters, FilterError, FiltersUnavailable
+from fake_backend import FakeBackend
+
+PIN_ROOT = "/sys/fs/bpf/test"
+CONFIG, COMM, FILE, CGROUP = 1, 2, 3, 4
+ZERO = b"\0\0\0\0"
+
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend()
+    for map_id, name in ((CONFIG, "filter_config"), (COMM, "comm_filter"),
+                         (FILE, "file_filter"), (CGROUP, "cgroup_filter")):
+        backend.maps[map_id] = {}
+        backend.pinned[f"{PIN_ROOT}/{name}"] = map_id
+    backend.maps[CONFIG][ZERO] = struct.pack("=III", 0, 0, 0)
+    return backend
+
+
+@pytest.fixture
+def filters(backend):
+    return CollectorFilters(backend, PIN_ROOT)
+
+
+def test_keys_are_encoded_as_in_exec_h(backend, filters):
+    filters.update({
+        "comm": {"values": ["curl"]},
+        "file_prefix": {"values": ["/usr/bin/"]},
+        "cgroup": {"values": [4242]},
+    })
+    assert backend.maps[COMM] == {b"curl" + b"\0" * 12: b"\x01"}
+    # struct exec_file_key: prefix length in bits, then the prefix bytes
+    assert backend.maps[FILE] == {struct.pack("=I", 9 * 8) + b"/usr/bin/" + b"\0" * 23: b"\x01"}
+    assert backend.maps[CGROUP] == {struct.pack("=Q", 4242): b"\x01"}
+
+
+def test_values_are_written_before_the_mode(backend, filters):
+    backend.maps[COMM][b"sh".ljust(16, b"\0")] = b"\x01"
+    filters.update({"comm": {"mode": "allow", "values": ["curl"]}, "cgroup": {"mode": "deny"}})
+    assert backend.writes == [
+        ("update", COMM, b"curl".ljust(16, b"\0"), b"\x01"),
+        ("delete", COMM, b"sh".ljust(16, b"\0")),
+        # comm allow (1), file off (0), cgroup deny (2)
+        ("update", CONFIG, ZERO, struct.pack("=III", 1, 0, 2)),
+    ]
+
+
+def test_get_decodes_the_maps(filters):
+    filters.update({"comm": {"mode": "deny", "values": ["sh", "bash"]},
+                    "file_prefix": {"mode": "allow", "values": ["/tmp/"]}})
+    assert filters.get() == {
+        "comm": {"mode": "deny", "values": ["bash", "sh"]},
+        "file_prefix": {"mode": "allow", "values": ["/tmp/"]},
+        "cgroup": {"mode": "off", "values": []},
+    }
+
+
+def test_omitted_filters_are_left_alone(backend, filters):
+    filters.update({"comm": {"mode": "deny", "values": ["sh"]}})
+    backend.writes.clear()
+    filters.update({"cgroup": {"mode": "allow"}})
+    assert backend.writes == [("update", CONFIG, ZERO, struct.pack("=III", 2, 0, 1))]
+    assert filters.get()["comm"]["values"] == ["sh"]
+
+
+def test_file_prefix_is_limited_to_31_bytes(backend, filters):
+    assert FILE_PREFIX_MAX == 31
+    filters.update({"file_prefix": {"values": ["/" * 31]}})
+    with pytest.raises(FilterError):
+        filters.update({"file_prefix": {"values": ["/" * 32]}})
+
+
+@pytest.mark.parametrize("spec", [
+    {"nope": {}},
+    {"comm": "sh"},
+    {"comm": {"mode": "maybe"}},
+    {"comm": {"values": "sh"}},
+    {"comm": {"values": ["a-very-long-comm-name"]}},
+    {"comm": {"values": [""]}},
+    {"cgroup": {"values": [-1]}},
+    {"cgroup": {"values": ["abc"]}},
+])
+def test_invalid_specs_write_nothing(backend, filters, spec):
+    with pytest.raises(FilterError):
+        filters.update(spec)
+    assert backend.writes == []
+
+
+def test_unpinned_maps_are_reported(backend, filters):
+    backend.pinned.clear()
+    with pytest.raises(FiltersUnavailable):
+        filters.get()
@@ -0,0 +1,108 @@
+import json
+
+import pytest
+
+from collector_protocol import (EXEC_RECORD_EVT, EXEC_RECORD_STATS, RECORD_EVT, RECORD_HEADER, RECORD_STATS,
+                                BinaryRecordDecoder, CollectorStats, ExecEvent, JsonLineDecoder,
+                                TextLineDecoder, make_decoder)
+
+
+def evt_record(ts, pid, comm="sh", file="/bin/sh", cgroup_id=0):
+    body = RECORD_EVT.pack(ts, pid, pid, comm.encode(), file.encode(), cgroup_id)
+    return RECORD_HEADER.pack(len(body), EXEC_RECORD_EVT) + body
+
+
+def stats_record(*counters):
+    body = RECORD_STATS.pack(*counters)
+    return RECORD_HEADER.pack(len(body), EXEC_RECORD_STATS) + body
+
+
+def event(ts, pid, comm="sh", file="/bin/sh", cgroup_id=0):
+    return ExecEvent(ts, pid, pid, comm, file, cgroup_id)
+
+
+def test_binary_records_are_decoded():
+    decoder = BinaryRecordDecoder()
+    stream = evt_record(1, 10, "bash", "/usr/bin/bash", 77) + evt_record(2, 11)
+    assert decoder.feed(stream) == [event(1, 10, "bash", "/usr/bin/bash", 77), event(2, 11)]
+    assert decoder.skipped == 0
+
+
+def test_binary_frames_split_across_feeds():
+    decoder = BinaryRecordDecoder()
+    stream = evt_record(1, 10) + evt_record(2, 11) + evt_record(3, 12)
+    events = []
+    for i in range(0, len(stream), 7):
+        events += decoder.feed(stream[i:i + 7])
+    assert [e.pid for e in events] == [10, 11, 12]
+    assert decoder.flush() == [] and decoder.skipped == 0
+
+
+def test_stats_records_are_not_events():
+    decoder = BinaryRecordDecoder()
+    stream = stats_record(1, 5, 0, 5, 4096, 2) + evt_record(2, 10) + stats_record(3, 9, 1, 8, 4096, 2)
+    assert decoder.feed(stream) == [event(2, 10)]
+    assert decoder.prev_stats == CollectorStats(1, 5, 0, 5, 4096, 2)
+    assert decoder.last_stats == CollectorStats(3, 9, 1, 8, 4096, 2)
+
+
+def test_unknown_record_types_are_skipped():
+    decoder = BinaryRecordDecoder()
+    stream = RECORD_HEADER.pack(3, 99) + b"abc" + evt_record(1, 10)
+    assert decoder.feed(stream) == [event(1, 10)]
+    assert decoder.skipped == 1
+
+
+def test_truncated_record_is_skipped_at_eof():
+    decoder = BinaryRecordDecoder()
+    assert decoder.feed(evt_record(1, 10) + evt_record(2, 11)[:20]) == [event(1, 10)]
+    assert decoder.flush() == []
+    assert decoder.skipped == 1
+
+
+def test_corrupt_header_resyncs_to_the_next_record():
+    decoder = BinaryRecordDecoder()
+    # Text written into the binary pipe reads as a header with a huge length
+    garbage = b"Running... Press Ctrl+C\n"
+    assert RECORD_HEADER.unpack_from(garbage)[0] > 4096
+    assert decoder.feed(garbage + evt_record(1, 10)) == [event(1, 10)]
+    assert decoder.feed(evt_record(2, 11)) == [event(2, 11)]
+    assert decoder.skipped == 1
+
+
+def test_resync_continues_across_feeds():
+    decoder = BinaryRecordDecoder()
+    assert decoder.feed(b"\xff" * 64) == []
+    stream = b"\xff" * 10 + evt_record(1, 10) + evt_record(2, 11)
+    events = []
+    for i in range(0, len(stream), 5):
+        events += decoder.feed(stream[i:i + 5])
+    assert events == [event(1, 10), event(2, 11)]
+    assert decoder.skipped == 1
+
+
+def test_json_lines_are_decoded():
+    decoder = JsonLineDecoder()
+    line = json.dumps({"ts": 1, "pid": 10, "tgid": 10, "comm": "sh", "file": "/bin/sh", "cgroup_id": 5})
+    stats = json.dumps({"type": "stats", "ts": 2, "submitted": 3, "dropped": 0, "consumed": 3,
+                        "ringbuf_bytes": 4096})
+    data = f"{line}\n{stats}\n\n[1,2]\nnot json\n{line[:10]}".encode()
+    assert decoder.feed(data) == [event(1, 10, cgroup_id=5)]
+    assert decoder.last_stats == CollectorStats(2, 3, 0, 3, 4096, 0)
+    assert decoder.skipped == 2
+    assert decoder.feed(line[10:].encode()) == []
+    assert decoder.flush() == [event(1, 10, cgroup_id=5)]
+
+
+def test_text_lines_are_stripped():
+    decoder = TextLineDecoder()
+    assert decoder.feed(b"one\n  \ntw") == ["one"]
+    assert decoder.feed(b"o\nthree") == ["two"]
+    assert decoder.flush() == ["three"]
+    assert decoder.flush() == []
+
+
+def test_make_decoder():
+    assert isinstance(make_decoder("binary"), BinaryRecordDecoder)
+    with pytest.raises(ValueError):
+        make_decoder("xml")
@@ -0,0 +1,132 @@
+import threading
+
+from collector_protocol import ExecEvent
+from event_index import ExecEventIndex, PostingList, query_events
+from event_store import EventStore
+
+
+def exec_event(ts, comm, file, pid=1):
+    return ExecEvent(ts, pid, pid, comm, file)
+
+
+def indexed_store(max_events=1000):
+    index = ExecEventIndex()
+    return EventStore(max_events, max_bytes=0, index=index), index
+
+
+def postings(index, comm):
+    return list(index.by_comm[comm].iter_from(0)) if comm in index.by_comm else []
+
+
+def test_posting_lists_follow_appends_and_evictions():
+    store, index = indexed_store(max_events=4)
+    store.extend([exec_event(i, "sh" if i % 2 else "ls", f"/bin/{i % 3}") for i in range(1, 7)])
+    # Events 1 and 2 were evicted
+    assert postings(index, "sh") == [3, 5]
+    assert postings(index, "ls") == [4, 6]
+    assert index.file_keys == ["/bin/0", "/bin/1", "/bin/2"]
+    store.extend([exec_event(7, "sh", "/bin/0")] * 3)
+    # /bin/1 and /bin/2 fell out of the store entirely
+    assert index.file_keys == ["/bin/0"]
+    assert postings(index, "ls") == [6]
+    store.append(exec_event(8, "sh", "/bin/0"))
+    assert "ls" not in index.by_comm
+
+
+def test_posting_list_compaction_keeps_order():
+    postings = PostingList()
+    for seq in range(1, 201):
+        postings.append(seq)
+    for _ in range(150):
+        postings.pop_front()
+    assert len(postings) == 50
+    assert postings.start < 150
+    assert list(postings.iter_from(0)) == list(range(151, 201))
+    assert list(postings.iter_from(190)) == list(range(190, 201))
+
+
+def test_clear_empties_the_index():
+    store, index = indexed_store()
+    store.extend([exec_event(1, "sh", "/bin/sh")])
+    store.clear()
+    assert index.stats() == {"comms": 0, "files": 0}
+    store.append(exec_event(2, "sh", "/bin/sh"))
+    assert postings(index, "sh") == [2]
+    matches, _, _ = query_events(store, index, comm="sh")
+    assert [seq for seq, _ in matches] == [2]
+
+
+def test_indexed_and_scanned_filters():
+    store, index = indexed_store()
+    store.extend([exec_event(10, "sh", "/bin/sh", 1), exec_event(20, "curl", "/usr/bin/curl", 2),
+                  exec_event(30, "sh", "/usr/bin/sh", 3), exec_event(40, "ls", "/bin/ls", 2)])
+
+    def seqs(**filters):
+        return [seq for seq, _ in query_events(store, index, **filters)[0]]
+
+    assert seqs(comm="sh") == [1, 3]
+    assert seqs(file_prefix="/usr/bin/") == [2, 3]
+    assert seqs(comm="sh", file_prefix="/usr") == [3]
+    assert seqs(pid=2) == [2, 4]
+    assert seqs(from_ts=15, to_ts=30) == [2, 3]
+    assert seqs(comm="nope") == []
+
+
+def test_paging_with_limit_and_max_scan():
+    store, index = indexed_store()
+    store.extend([exec_event(i, "sh", "/bin/sh", i % 2) for i in range(1, 21)])
+    matches, cursor, more = query_events(store, index, pid=0, limit=3)
+    assert [seq for seq, _ in matches] == [2, 4, 6] and more
+    matches, cursor, more = query_events(store, index, since=cursor, pid=0, max_scan=5)
+    assert [seq for seq, _ in matches] == [8, 10] and more and cursor == 11
+    matches, cursor, more = query_events(store, index, since=cursor, pid=0)
+    assert [seq for seq, _ in matches] == [12, 14, 16, 18, 20] and not more and cursor == 20
+
+
+class CountingLock:
+    """The store's lock, counting acquisitions and running a hook between them."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.acquired = 0
+        self.between = None
+
+    def __enter__(self):
+        hook, self.between = self.between, None
+        if hook is not None:
+            hook()
+        self.lock.acquire()
+        self.acquired += 1
+
+    def __exit__(self, *exc):
+        self.lock.release()
+
+
+def test_scan_releases_the_lock_between_chunks():
+    store, index = indexed_store(max_events=100)
+    store.lock = CountingLock()
+    store.extend([exec_event(i, "sh", "/bin/sh") for i in range(1, 51)])
+    store.lock.acquired = 0
+    matches, cursor, more = query_events(store, index, pid=1, limit=1000, scan_chunk=10)
+    assert len(matches) == 50 and cursor == 50 and not more
+    # One acquisition for the time range, then one per chunk of 10
+    assert store.lock.acquired == 1 + 5
+
+
+def test_events_evicted_between_chunks_are_skipped():
+    store, index = indexed_store(max_events=50)
+    store.lock = CountingLock()
+    store.extend([exec_event(i, "sh", "/bin/sh") for i in range(1, 51)])
+    calls = []
+
+    def match(event):
+        if len(calls) == 9:
+            # Before the second chunk, 30 new events push out 1..30
+            store.lock.between = lambda: store.extend([exec_event(100, "new", "/bin/new")] * 30)
+        calls.append(event)
+        return True
+
+    matches, cursor, more = query_events(store, index, limit=1000, match=match, scan_chunk=10)
+    assert [seq for seq, _ in matches] == list(range(1, 11)) + list(range(31, 51))
+    # The scan stops at the end of the range seen when it started
+    assert cursor == 50 and not more
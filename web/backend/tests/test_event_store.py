@@ -0,0 +1,111 @@
+from collections import namedtuple
+
+from event_store import EventStore
+
+Event = namedtuple("Event", ["ts", "name"])
+
+
+def test_sequence_numbers_start_at_start_seq():
+    store = EventStore(10, start_seq=5)
+    assert store.append("a") == 5
+    assert store.extend(["b", "c"]) == 7
+    assert store.extend([]) is None
+    result = store.read_since(0)
+    assert result.events == ["a", "b", "c"]
+    assert (result.first_seq, result.last_seq, result.next) == (5, 7, 7)
+
+
+def test_oldest_events_are_evicted_by_count():
+    store = EventStore(3)
+    store.extend(["a", "b", "c", "d", "e"])
+    assert store.read_since(0).events == ["c", "d", "e"]
+    assert store.stats()["first_seq"] == 3
+    assert store.evicted == 2
+    assert len(store) == 3
+
+
+def test_oldest_events_are_evicted_by_bytes():
+    store = EventStore(100, max_bytes=10)
+    store.extend(["aaaa", "bbbb", "cccc"])
+    assert store.read_since(0).events == ["bbbb", "cccc"]
+    assert store.stats()["bytes"] == 8
+    # An event larger than max_bytes is kept on its own
+    store.append("x" * 20)
+    assert store.read_since(0).events == ["x" * 20]
+
+
+def test_read_since_reports_gaps():
+    store = EventStore(3)
+    store.extend(["a", "b", "c", "d", "e"])
+    result = store.read_since(1, limit=2)
+    assert result.events == ["c", "d"]
+    assert result.gap
+    assert result.next == 4
+    result = store.read_since(result.next)
+    assert result.events == ["e"] and not result.gap
+    # Caught up: an empty read keeps the cursor where it is
+    result = store.read_since(5)
+    assert result.events == [] and not result.gap and result.next == 5
+
+
+def test_tail_returns_newest_events():
+    store = EventStore(10)
+    store.extend(["a", "b", "c", "d"])
+    assert store.tail(2).events == ["c", "d"]
+    assert store.tail(10).events == ["a", "b", "c", "d"]
+
+
+def test_clear_keeps_sequence_numbers_monotonic():
+    store = EventStore(10)
+    store.extend(["a", "b"])
+    store.clear()
+    assert len(store) == 0
+    assert store.read_since(0).events == []
+    assert store.append("c") == 3
+    result = store.read_since(0)
+    assert result.events == ["c"] and result.first_seq == 3 and result.gap
+
+
+def test_iter_chunks_walks_history():
+    store = EventStore(10)
+    store.extend(list("abcde"))
+    assert list(store.iter_chunks(2)) == [["a", "b"], ["c", "d"], ["e"]]
+
+
+def test_subscribers_receive_batches():
+    store = EventStore(10)
+    subscription = store.subscribe()
+    store.extend(["a", "b"])
+    store.append("c")
+    assert subscription.get(timeout=0) == (1, ["a", "b"])
+    assert subscription.get(timeout=0) == (3, ["c"])
+    assert subscription.get(timeout=0) is None
+    store.unsubscribe(subscription)
+    store.append("d")
+    assert subscription.get(timeout=0) is None
+    assert store.subscriber_count() == 0
+
+
+def test_lagging_subscriber_drops_batches():
+    store = EventStore(10)
+    subscription = store.subscribe(max_batches=1)
+    store.extend(["a", "b"])
+    store.extend(["c", "d", "e"])
+    assert subscription.lagged and subscription.dropped == 3
+    assert store.subscriber_stats() == {"count": 1, "dropped": 3, "lagged": 1, "max_queue_batches": 1}
+    # The producer never blocked; the subscriber catches up from the store
+    subscription.reset()
+    assert not subscription.lagged and subscription.get(timeout=0) is None
+    assert store.read_since(2).events == ["c", "d", "e"]
+
+
+def test_seq_range_by_timestamp():
+    store = EventStore(4, max_bytes=0)
+    store.extend([Event(ts, str(ts)) for ts in (10, 20, 20, 30, 40, 50)])
+    with store.lock:
+        # Events 1 and 2 were evicted; 3..6 hold ts 20, 30, 40, 50
+        assert store.seq_range_locked() == (3, 7)
+        assert store.seq_range_locked(from_ts=20, to_ts=40) == (3, 6)
+        assert store.seq_range_locked(from_ts=25) == (4, 7)
+        assert store.seq_range_locked(to_ts=15) == (3, 3)
+        assert store.get_locked(4).name == "30"
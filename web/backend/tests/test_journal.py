@@ -0,0 +1,157 @@
+import json
+import os
+import time
+
+import pytest
+
+from collector_protocol import ExecEvent
+from journal import INDEX_ENTRY, Journal
+
+
+def events(first, count, ts_step=10):
+    return [ExecEvent((first + i) * ts_step, first + i, first + i, "sh", f"/bin/{first + i}")
+            for i in range(count)]
+
+
+def dump(journal, since=0, from_ts=None):
+    data = b"".join(journal.iter_raw(since, from_ts, chunk_size=100))
+    return [json.loads(line)["seq"] for line in data.splitlines()]
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "journal")
+
+
+def test_replay_returns_what_was_appended(directory):
+    journal = Journal(directory)
+    batch = events(1, 5)
+    journal.append(1, batch[:2])
+    journal.append(3, batch[2:])
+    assert list(journal.replay()) == list(enumerate(batch, 1))
+    assert [seq for seq, _ in journal.replay(3)] == [4, 5]
+    assert journal.stats()["records_written"] == 5
+
+
+def test_segments_rotate_by_size(directory):
+    journal = Journal(directory, segment_max_bytes=300)
+    for seq in range(1, 11):
+        journal.append(seq, events(seq, 1))
+    assert len(journal.segments) > 2
+    assert [s.first_seq for s in journal.segments] == sorted(s.first_seq for s in journal.segments)
+    assert dump(journal) == list(range(1, 11))
+
+
+def test_segments_rotate_by_age(directory):
+    journal = Journal(directory, segment_max_age=60)
+    journal.append(1, events(1, 2))
+    journal.append(3, events(3, 1))
+    assert len(journal.segments) == 1
+    journal.segments[-1].created -= 61
+    journal.append(4, events(4, 1))
+    assert [s.first_seq for s in journal.segments] == [1, 4]
+
+
+def test_dump_starts_at_seq_or_timestamp(directory):
+    journal = Journal(directory, segment_max_bytes=500, index_interval=100)
+    for seq in range(1, 31, 3):
+        journal.append(seq, events(seq, 3))
+    assert dump(journal) == list(range(1, 31))
+    assert dump(journal, since=17) == list(range(18, 31))
+    assert dump(journal, from_ts=215) == list(range(22, 31))
+    assert dump(journal, since=25, from_ts=100) == list(range(26, 31))
+    assert dump(journal, since=30) == []
+
+
+def test_reopen_recovers_index_and_truncates_partial_record(directory):
+    journal = Journal(directory, index_interval=100)
+    journal.append(1, events(1, 20))
+    journal.close()
+    segment = journal.segments[0]
+    with open(segment.path, "ab") as f:
+        f.write(b'{"seq":21,"ts"')
+    with open(segment.index_path, "ab") as f:
+        f.write(INDEX_ENTRY.pack(21, 0, segment.size)[:10])
+
+    journal = Journal(directory, index_interval=100)
+    segment = journal.segments[0]
+    assert segment.last_seq == 20
+    assert segment.size == os.path.getsize(segment.path)
+    assert segment.index_seqs[0] == 1 and len(segment.index_seqs) > 1
+    assert journal.last_seq == 20
+    journal.append(21, events(21, 1))
+    assert dump(journal, since=15) == list(range(16, 22))
+
+
+def test_retention_removes_oldest_segments(directory):
+    journal = Journal(directory, segment_max_bytes=200, retention_bytes=600)
+    for seq in range(1, 21):
+        journal.append(seq, events(seq, 1))
+    assert sum(s.size for s in journal.segments[:-1]) <= 600
+    assert journal.segments_deleted > 0
+    assert dump(journal)[-1] == 20
+    assert not os.path.exists(os.path.join(directory, f"{1:020d}.jsonl"))
+
+    journal = Journal(directory, segment_max_bytes=200, retention_age=3600)
+    old = journal.segments[0].path
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    # Retention runs when a segment is rotated
+    for seq in range(21, 26):
+        journal.append(seq, events(seq, 1))
+    assert not os.path.exists(old)
+
+
+def test_clear_hides_earlier_records(directory):
+    journal = Journal(directory)
+    journal.append(1, events(1, 5))
+    journal.clear(3)
+    journal.append(6, events(6, 1))
+    assert dump(journal) == [4, 5, 6]
+    assert dump(journal, since=1) == [4, 5, 6]
+    assert [seq for seq, _ in journal.replay()] == [4, 5, 6]
+    journal.close()
+    # The floor survives a restart
+    journal = Journal(directory)
+    assert journal.stats()["cleared_seq"] == 3
+    assert journal.replay_tail(100)[0] == 4
+    journal.clear(6)
+    assert journal.replay_tail(100) == (7, [])
+
+
+def test_replay_tail_keeps_journaled_sequence_numbers(directory):
+    journal = Journal(directory)
+    journal.append(1, events(1, 3))
+    # Events 4 and 5 never made it to disk
+    journal.append(6, events(6, 3))
+    start_seq, replayed = journal.replay_tail(100)
+    assert start_seq == 6 and [e.pid for e in replayed] == [6, 7, 8]
+    start_seq, replayed = journal.replay_tail(2)
+    assert start_seq == 7 and [e.pid for e in replayed] == [7, 8]
+
+
+class FailingFile:
+    def __init__(self, f):
+        self.f = f
+
+    def write(self, data):
+        self.f.write(data[:len(data) // 2])
+        self.f.flush()
+        raise OSError(28, "No space left on device")
+
+    def close(self):
+        self.f.close()
+
+
+def test_failed_write_is_cut_off_and_journal_continues(directory):
+    journal = Journal(directory)
+    journal.append(1, events(1, 3))
+    journal._file = FailingFile(journal._file)
+    with pytest.raises(OSError):
+        journal.append(4, events(4, 3))
+    assert journal.errors == 1
+    assert os.path.getsize(journal.segments[0].path) == journal.segments[0].size
+
+    journal.append(7, events(7, 2))
+    assert [s.first_seq for s in journal.segments] == [1, 7]
+    assert dump(journal) == [1, 2, 3, 7, 8]
+    assert journal.replay_tail(100)[0] == 7
@@ -0,0 +1,104 @@
+import time
+
+import pytest
+
+from fake_backend import FakeBackend
+from map_views import MapViews
+
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend()
+    backend.maps[7] = {bytes([0, i]): bytes([i]) for i in range(10)}
+    backend.maps[7][b"\x01\x00"] = b"\xff"
+    return backend
+
+
+def test_snapshot_is_cached_for_ttl(backend):
+    views = MapViews(backend, ttl=60)
+    first = views.snapshot(7)
+    assert views.snapshot(7) is first
+    assert backend.calls["map_entries"] == 1
+    assert len(first.entries) == 11
+
+
+def reread(views, map_id):
+    """Snapshot from a fresh read rather than a background refresh."""
+    views.invalidate(map_id)
+    return views.snapshot(map_id)
+
+
+def test_unchanged_map_keeps_token(backend):
+    views = MapViews(backend, ttl=60)
+    token = views.snapshot(7).token
+    assert reread(views, 7).token == token
+    backend.maps[7][b"\x00\x00"] = b"\x42"
+    assert reread(views, 7).token != token
+
+
+def test_pages_follow_sorted_keys(backend):
+    views = MapViews(backend, ttl=60)
+    snapshot = views.snapshot(7)
+    page = views.page(snapshot, limit=4)
+    assert [e["key"] for e in page["entries"]] == ["0000", "0001", "0002", "0003"]
+    assert page["total"] == 11 and page["matched"] == 11
+    rest = views.page(snapshot, after=bytes.fromhex(page["next"]), limit=100)
+    assert rest["entries"][0]["key"] == "0004"
+    assert rest["entries"][-1] == {"key": "0100", "value": "ff"}
+    assert rest["next"] is None
+
+
+def test_prefix_filter(backend):
+    views = MapViews(backend, ttl=60)
+    page = views.page(views.snapshot(7), prefix=b"\x01")
+    assert page["matched"] == 1
+    assert page["entries"] == [{"key": "0100", "value": "ff"}]
+
+
+def test_delta_since_previous_token(backend):
+    views = MapViews(backend, ttl=60)
+    old = views.snapshot(7)
+    backend.maps[7][b"\x00\x01"] = b"\x99"
+    del backend.maps[7][b"\x00\x02"]
+    backend.maps[7][b"\x02\x00"] = b"\x01"
+    new = reread(views, 7)
+    delta = views.page(new, since=views.previous(old.token))
+    assert delta["since"] == old.token
+    assert [e["key"] for e in delta["entries"]] == ["0001", "0200"]
+    assert delta["deleted"] == ["0002"]
+
+
+def test_backend_error_raises_lookup_error(backend):
+    views = MapViews(backend, ttl=60)
+    with pytest.raises(LookupError):
+        views.snapshot(99)
+
+
+def test_expired_snapshot_is_served_while_refreshing(backend):
+    views = MapViews(backend, ttl=0)
+    first = views.snapshot(7)
+    backend.maps[7][b"\x00\x00"] = b"\x42"
+    # The stale snapshot is returned at once; the refresh runs in the background
+    assert views.snapshot(7) is first
+    deadline = time.monotonic() + 5
+    while views.snapshot(7) is first and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert views.snapshot(7).entries[b"\x00\x00"] == b"\x42"
+
+
+def test_invalidate_forces_a_fresh_read(backend):
+    views = MapViews(backend, ttl=60)
+    views.snapshot(7)
+    backend.maps[7][b"\x00\x00"] = b"\x42"
+    views.invalidate()
+    assert views.snapshot(7).entries[b"\x00\x00"] == b"\x42"
+
+
+def test_map_info_is_read_with_the_first_snapshot(backend):
+    views = MapViews(backend, ttl=60)
+    assert views.snapshot(7).info["name"] == "map7"
+    views.snapshot(7)
+    assert backend.calls["map_info"] == 1
+    # Loading or unloading programs invalidates it along with the entries
+    assert reread(views, 7).info["name"] == "map7"
+    assert backend.calls["map_info"] == 2
@@ -0,0 +1,79 @@
+import logging
+import subprocess
+import sys
+
+from collector_protocol import BinaryRecordDecoder, TextLineDecoder, event_size
+from event_store import EventStore
+from pipe_reader import PipeReader
+from test_collector_protocol import evt_record
+
+logger = logging.getLogger(__name__)
+
+
+def spawn(*writes):
+    """A child that writes each chunk to stdout, pausing between them, and says bye on stderr."""
+    script = ("import sys, time\n"
+              f"for chunk in {list(writes)!r}:\n"
+              "    sys.stdout.buffer.write(chunk); sys.stdout.flush(); time.sleep(0.2)\n"
+              "sys.stderr.write('bye\\n')\n")
+    return subprocess.Popen([sys.executable, "-c", script], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+def drain(reader):
+    reader.start()
+    reader.thread.join(10)
+    assert not reader.is_alive()
+    return reader.stats()
+
+
+def test_events_are_stored_in_batches():
+    stream = b"".join(evt_record(i, 100 + i) for i in range(50))
+    store = EventStore(1000, sizeof=event_size)
+    batches = []
+    exited = []
+    reader = PipeReader("test", spawn(stream[:1000], stream[1000:]), BinaryRecordDecoder(), store, logger,
+                        read_size=256, on_batch=lambda seq, events: batches.append((seq, len(events))),
+                        on_exit=exited.append)
+    stats = drain(reader)
+
+    assert [e.pid for e in store.read_since(0, None).events] == list(range(100, 150))
+    assert stats["events"] == 50
+    assert stats["bytes_read"] == len(stream)
+    assert stats["reads"] > stats["batches"] >= 2
+    assert sum(count for _, count in batches) == 50
+    assert batches[0][0] == 1 and batches[1][0] == batches[0][1] + 1
+    assert stats["stderr_tail"] == ["bye"]
+    assert exited == [reader]
+
+
+class FlakyStore(EventStore):
+    def __init__(self):
+        super().__init__(100)
+        self.failures = 1
+
+    def extend(self, events):
+        if self.failures:
+            self.failures -= 1
+            raise MemoryError("no room")
+        return super().extend(events)
+
+
+def test_failed_batch_is_counted_and_reading_goes_on():
+    store = FlakyStore()
+    reader = PipeReader("test", spawn(b"one\n", b"two\n", b"three"), TextLineDecoder(), store, logger)
+    stats = drain(reader)
+    assert stats["batch_errors"] == 1
+    # The trailing line without a newline is flushed at EOF
+    assert store.read_since(0).events == ["two", "three"]
+
+
+def test_batch_handler_errors_do_not_stop_reading():
+    store = EventStore(100)
+
+    def on_batch(seq, events):
+        raise OSError("disk full")
+
+    reader = PipeReader("test", spawn(b"one\n", b"two\n"), TextLineDecoder(), store, logger, on_batch=on_batch)
+    stats = drain(reader)
+    assert store.read_since(0).events == ["one", "two"]
+    assert stats["batch_errors"] == 0 and stats["batches"] == 2
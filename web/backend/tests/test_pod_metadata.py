@@ -0,0 +1,153 @@
+import json
+import os
+
+import pytest
+
+import pod_metadata
+from collector_protocol import ExecEvent
+from pod_metadata import FilePodSource, PodResolver, parse_cgroup_path
+
+POD_UID = "0d4f8b1e-6c2a-4f0e-9a51-2f3c8e7d1b90"
+CONTAINER_ID = "a" * 64
+OTHER_CONTAINER_ID = "b" * 64
+POD_PATH = f"/kubepods.slice/kubepods-pod{POD_UID.replace('-', '_')}.slice"
+CONTAINER_PATH = f"{POD_PATH}/cri-containerd-{CONTAINER_ID}.scope"
+OTHER_PATH = f"{POD_PATH}/cri-containerd-{OTHER_CONTAINER_ID}.scope"
+
+
+def pod_list(*containers):
+    return {"items": [{
+        "metadata": {"namespace": "default", "name": "web-0", "uid": POD_UID},
+        "status": {"containerStatuses": [
+            {"name": name, "containerID": f"containerd://{container_id}"} for name, container_id in containers
+        ]},
+    }]}
+
+
+def write_pod_list(path, document):
+    path.write_text(json.dumps(document))
+    # Make sure the change is seen even within the filesystem's mtime granularity
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def cgroup_root(tmp_path):
+    root = tmp_path / "cgroup"
+    for path in (CONTAINER_PATH, OTHER_PATH, "/system.slice/cron.service"):
+        (root / path.lstrip("/")).mkdir(parents=True)
+    return root
+
+
+def cgroup_id(root, path):
+    return os.stat(root / path.lstrip("/")).st_ino
+
+
+@pytest.fixture
+def proc_paths(monkeypatch):
+    """pid -> cgroup path served in place of /proc/<pid>/cgroup."""
+    paths = {}
+    monkeypatch.setattr(pod_metadata, "read_proc_cgroup", paths.get)
+    return paths
+
+
+def resolve(resolver, *events):
+    """Run one resolution pass synchronously for what submit() queued."""
+    resolver.submit([ExecEvent(0, pid, pid, "sh", "/bin/sh", cgroup) for cgroup, pid in events])
+    batch, resolver._pending = resolver._pending, {}
+    resolver._resolve(batch)
+    return batch
+
+
+def test_parse_cgroup_path():
+    assert parse_cgroup_path(CONTAINER_PATH) == (CONTAINER_ID, POD_UID)
+    cgroupfs = f"/kubepods/burstable/pod{POD_UID}/{CONTAINER_ID}"
+    assert parse_cgroup_path(cgroupfs) == (CONTAINER_ID, POD_UID)
+    assert parse_cgroup_path("/system.slice/cron.service") == (None, None)
+
+
+def test_file_source_resolves_containers_and_pods(tmp_path):
+    pods = tmp_path / "pods.json"
+    write_pod_list(pods, pod_list(("app", CONTAINER_ID)))
+    source = FilePodSource(str(pods), refresh_seconds=0)
+    found = source.resolve([(CONTAINER_ID, POD_UID), (OTHER_CONTAINER_ID, POD_UID), ("c" * 64, None)])
+    assert found == {
+        (CONTAINER_ID, POD_UID): ("default", "web-0", "app"),
+        # Only the pod is known for a container missing from the list
+        (OTHER_CONTAINER_ID, POD_UID): ("default", "web-0", None),
+    }
+
+
+def test_file_source_reloads_on_change(tmp_path):
+    pods = tmp_path / "pods.json"
+    write_pod_list(pods, pod_list(("app", CONTAINER_ID)))
+    source = FilePodSource(str(pods), refresh_seconds=0)
+    source.resolve([(CONTAINER_ID, None)])
+    write_pod_list(pods, pod_list(("app", CONTAINER_ID), ("sidecar", OTHER_CONTAINER_ID)))
+    assert source.resolve([(OTHER_CONTAINER_ID, None)]) == {(OTHER_CONTAINER_ID, None): ("default", "web-0", "sidecar")}
+    assert source.loads == 2
+
+
+def test_resolves_through_proc(tmp_path, cgroup_root, proc_paths):
+    pods = tmp_path / "pods.json"
+    write_pod_list(pods, pod_list(("app", CONTAINER_ID)))
+    resolver = PodResolver(FilePodSource(str(pods), refresh_seconds=0), cgroup_root=str(cgroup_root))
+    proc_paths[100] = CONTAINER_PATH
+    cgroup = cgroup_id(cgroup_root, CONTAINER_PATH)
+    resolve(resolver, (cgroup, 100))
+
+    info = resolver.lookup(cgroup)
+    assert info.cgroup_path == CONTAINER_PATH
+    assert info.to_dict() == {"container_id": CONTAINER_ID, "namespace": "default", "pod": "web-0",
+                              "container": "app"}
+    assert resolver.stats()["cgroup_walks"] == 0
+
+
+def test_recycled_pid_falls_back_to_cgroup_walk(cgroup_root, proc_paths):
+    resolver = PodResolver(walk_interval=0, cgroup_root=str(cgroup_root))
+    # The pid now belongs to a process in another container
+    proc_paths[100] = OTHER_PATH
+    cgroup = cgroup_id(cgroup_root, CONTAINER_PATH)
+    resolve(resolver, (cgroup, 100))
+
+    info = resolver.lookup(cgroup)
+    assert info.container_id == CONTAINER_ID
+    assert resolver.stats()["proc_mismatched"] == 1
+    assert resolver.stats()["cgroup_walks"] == 1
+
+
+def test_unknown_cgroups_are_retried_after_negative_ttl(cgroup_root, proc_paths, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(pod_metadata.time, "monotonic", lambda: clock[0])
+    resolver = PodResolver(negative_ttl=30, walk_interval=0, cgroup_root=str(cgroup_root))
+    resolve(resolver, (999999999, 100))
+    assert resolver.lookup(999999999) is None
+    assert resolver.stats()["negative"] == 1
+
+    # Cached as negative: not queued again until the TTL has passed
+    assert resolve(resolver, (999999999, 100)) == {}
+    clock[0] += 31
+    assert resolve(resolver, (999999999, 100)) == {999999999: 100}
+
+
+def test_partial_entries_are_completed_once_the_pod_is_listed(tmp_path, cgroup_root, proc_paths, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(pod_metadata.time, "monotonic", lambda: clock[0])
+    pods = tmp_path / "pods.json"
+    write_pod_list(pods, {"items": []})
+    resolver = PodResolver(FilePodSource(str(pods), refresh_seconds=0), negative_ttl=30,
+                           cgroup_root=str(cgroup_root))
+    proc_paths[100] = CONTAINER_PATH
+    cgroup = cgroup_id(cgroup_root, CONTAINER_PATH)
+    resolve(resolver, (cgroup, 100))
+
+    # The container is identified, its pod is not known yet
+    info = resolver.lookup(cgroup)
+    assert info.container_id == CONTAINER_ID and info.pod is None
+    assert resolver.stats()["unresolved"] == 1
+
+    write_pod_list(pods, pod_list(("app", CONTAINER_ID)))
+    assert resolve(resolver, (cgroup, 100)) == {}
+    clock[0] += 31
+    resolve(resolver, (cgroup, 100))
+    assert resolver.lookup(cgroup).pod == "web-0"
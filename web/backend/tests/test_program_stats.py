@@ -0,0 +1,55 @@
+import pytest
+
+from fake_backend import FakeBackend
+from program_stats import ProgramStatsSampler
+
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend()
+    backend.stats_enabled = True
+    backend.add_program(1, "trace_exec")
+    backend.add_program(2, "xdp_pass", prog_type="xdp")
+    return backend
+
+
+def test_continuous_sampling_records_deltas(backend):
+    sampler = ProgramStatsSampler(backend, interval=1.0, capacity=10)
+    previous = sampler._sample_continuous(None)
+    backend.run(1, 100, ns_per_run=50)
+    sampler._sample_continuous(previous - 1.0)
+
+    history = sampler.history(1)
+    assert history["name"] == "trace_exec"
+    assert history["cumulative"] == {"run_time_ns": 5000, "run_cnt": 100}
+    assert history["latest"]["run_cnt"] == 100
+    assert history["latest"]["ns_per_run"] == 50.0
+    assert history["summary"]["runs_per_sec"] == pytest.approx(100, rel=0.05)
+    assert sampler.history(2)["latest"]["run_cnt"] == 0
+
+
+def test_window_sampling_toggles_stats(backend):
+    backend.stats_enabled = False
+    sampler = ProgramStatsSampler(backend, interval=1.0, window=0.01, capacity=10)
+    sampler._sample_window()
+    assert backend.calls["enable_stats"] == 1
+    assert backend.calls["disable_stats"] == 1
+    assert not backend.stats_enabled
+    assert sampler.history(1)["latest"]["run_cnt"] == 0
+
+
+def test_unloaded_programs_are_forgotten(backend):
+    sampler = ProgramStatsSampler(backend, interval=1.0, capacity=10)
+    sampler._sample_continuous(None)
+    del backend.programs[2]
+    sampler._sample_continuous(None)
+    assert sampler.history(2) is None
+    assert [p[0] for p in sampler.programs()] == [1]
+    assert sampler.programs()[0][2] == "tracepoint"
+
+
+def test_backend_errors_are_raised(backend):
+    backend.fail = "permission denied"
+    sampler = ProgramStatsSampler(backend, interval=1.0, capacity=10)
+    with pytest.raises(RuntimeError, match="permission denied"):
+        sampler._sample_continuous(None)
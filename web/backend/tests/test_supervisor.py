@@ -0,0 +1,25 @@
+import logging
+import time
+
+from collector_protocol import make_decoder
+from event_store import EventStore
+from supervisor import Supervisor, limits_argv
+
+
+def test_limits_argv():
+    assert limits_argv({}) == []
+    assert limits_argv({"memory_bytes": 1024, "open_files": 64, "nice": 5}) == [
+        "prlimit", "--as=1024", "--nofile=64", "--", "nice", "-n", "5"]
+    assert limits_argv({"nice": 0, "cpu_seconds": 10}) == ["prlimit", "--cpu=10", "--"]
+
+
+def test_limits_apply_to_the_child():
+    supervisor = Supervisor(logging.getLogger(__name__), prefix=[])
+    store = EventStore(100)
+    process = supervisor.add("limited", "userspace", ["sh", "-c", "ulimit -n; nice"], store,
+                             lambda: make_decoder("text"), limits={"open_files": 64, "nice": 5})
+    process.start()
+    deadline = time.monotonic() + 10
+    while process.status()["state"] != "exited" and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert store.read_since(0).events == ["64", "5"]
@@ -1,14 +1,41 @@
 // Global variables for Chart.js and polling intervals
 let logChart = null;
+let logChartInterval = null;
 let pollingInterval = null;
+let collectorEventSource = null;   // live SSE stream, when available
 
 let userspaceChart = null;
+let userspaceChartInterval = null;
 let userspacePollingInterval = null;
 
-// We'll store eBPF collector events and userspace output lines in JS arrays
-// but also persist them in localStorage so we don't lose them on refresh.
-let ebpfEventsMemory = [];       // eBPF logs
-let userspaceOutputMemory = [];  // Userspace logs
+// Virtualized views of the collector events and the userspace output. The
+// history stays on the server; the browser only holds the visible rows and
+// a few cached pages.
+let collectorLog = null;
+let userspaceLog = null;
+
+// Sequence cursors: the last event seq we have already received from the
+// backend, so each poll only asks for the delta. They start at the server's
+// newest seq when a view is opened.
+let ebpfCursor = 0;
+let userspaceCursor = 0;
+const POLL_PAGE_LIMIT = 1000;
+
+// Virtual log geometry and caching
+const LOG_ROW_HEIGHT = 24;        // px, keep in sync with .virtual-row
+const LOG_PAGE_SIZE = 200;        // events per page request
+const LOG_CACHE_PAGES = 25;       // pages kept per view (LRU)
+const LOG_OVERSCAN_ROWS = 20;     // rows rendered above and below the viewport
+const LOG_MAX_ROWS = 500000;      // browsers cap element heights
+const LOG_EVICTED = Symbol("evicted");
+
+// Charts are fed from server-side aggregates
+const CHART_REFRESH_MS = 5000;
+const CHART_SERIES_SECONDS = 300;
+const CHART_STEP_SECONDS = 5;
+
+// Keys of the old localStorage persistence, removed on load
+const LEGACY_STORAGE_KEYS = ["ebpfEventsMemory", "userspaceOutputMemory", "ebpfCursor", "userspaceCursor"];
 
 /* -------------------------------
    Utility Functions
@@ -56,29 +83,231 @@ function showToast(message, isError = false) {
   });
 }
 
-/* 
- * Restore data from localStorage so we don't lose chart lines after refresh.
- * Called in DOMContentLoaded for both eBPF events & Userspace output.
+/*
+ * Older versions kept every log line in localStorage. Drop those keys so
+ * they stop using up the quota; the history now lives on the server.
  */
-function restoreDataFromLocalStorage() {
-  // eBPF events
-  const storedEbpf = localStorage.getItem("ebpfEventsMemory");
-  if (storedEbpf) {
-    ebpfEventsMemory = JSON.parse(storedEbpf);
+function removeLegacyStorage() {
+  try {
+    LEGACY_STORAGE_KEYS.forEach((key) => localStorage.removeItem(key));
+  } catch (err) {
+    console.warn("[DEBUG] Could not clean up localStorage:", err);
   }
-  // Userspace logs
-  const storedUserspace = localStorage.getItem("userspaceOutputMemory");
-  if (storedUserspace) {
-    userspaceOutputMemory = JSON.parse(storedUserspace);
+}
+
+/*
+ * Fetch the events after `cursor` from a cursor-paged endpoint.
+ * Resolves to { items, firstSeq, lastSeq, next }. If the backend restarted
+ * (its newest seq is behind our cursor) the request is repeated from the
+ * start. If we are more than one page behind, the cursor skips ahead to the
+ * newest page: older events are fetched by the view when scrolled to.
+ */
+async function fetchDelta(url, key, cursor) {
+  const res = await fetch(`${url}?since=${cursor}&limit=${POLL_PAGE_LIMIT}`);
+  const data = await res.json();
+  if (data.last_seq < cursor) {
+    return fetchDelta(url, key, 0);
+  }
+  if (data.last_seq - cursor > POLL_PAGE_LIMIT) {
+    return fetchDelta(url, key, data.last_seq - POLL_PAGE_LIMIT);
   }
+  return { items: data[key] || [], firstSeq: data.first_seq, lastSeq: data.last_seq, next: data.next };
 }
 
-/* 
- * Save the updated data arrays to localStorage
+/*
+ * Render a collector event ({ts, pid, tgid, comm, file}) as a log line.
  */
-function persistDataToLocalStorage() {
-  localStorage.setItem("ebpfEventsMemory", JSON.stringify(ebpfEventsMemory));
-  localStorage.setItem("userspaceOutputMemory", JSON.stringify(userspaceOutputMemory));
+function formatExecEvent(evt) {
+  if (typeof evt === "string") return evt;
+  const time = new Date(evt.ts / 1e6).toLocaleTimeString();
+  return `${time} tgid: ${evt.tgid} <> pid: ${evt.pid} -- comm: ${evt.comm} <> file: ${evt.file}`;
+}
+
+/*
+ * Virtualized, newest-first view of a server-side event store. Rows are
+ * addressed by sequence number: row 0 is `lastSeq`, row 1 the event before
+ * it, and so on. Only the rows in and near the viewport exist in the DOM,
+ * and their contents are fetched from `url` a page at a time and kept in a
+ * small LRU cache, so memory and rendering cost do not grow with the
+ * history. Live events are added with append() and shown on the next
+ * render; while the user reads older rows the view keeps them in place.
+ */
+class VirtualLog {
+  constructor(container, url, key, format) {
+    this.container = container;
+    this.url = url;
+    this.key = key;
+    this.format = format;
+    this.firstSeq = 1;          // oldest seq still retained by the backend
+    this.lastSeq = 0;           // newest seq known
+    this.renderedLastSeq = 0;
+    this.pages = new Map();     // page index -> items; insertion order = LRU order
+    this.loading = new Set();
+    this.rows = [];
+    this.frame = null;
+
+    container.innerHTML = "";
+    container.classList.add("virtual-log");
+    this.spacer = document.createElement("div");
+    this.spacer.className = "virtual-log-spacer";
+    container.appendChild(this.spacer);
+    container.addEventListener("scroll", () => this.scheduleRender());
+  }
+
+  /* Load the newest page; resolves to the server's newest seq (the cursor to resume from). */
+  async resume() {
+    // A one-event read from the start tells us the oldest retained seq
+    const [oldest, data] = await Promise.all(
+      [`${this.url}?since=0&limit=1`, `${this.url}?limit=${LOG_PAGE_SIZE}`].map((url) =>
+        fetch(url).then((res) => res.json())
+      )
+    );
+    this.reset();
+    this.setRange(oldest.first_seq, data.last_seq);
+    (data[this.key] || []).forEach((item, i) => this.put(data.first_seq + i, item));
+    this.scheduleRender();
+    return data.last_seq;
+  }
+
+  reset() {
+    this.pages.clear();
+    this.firstSeq = 1;
+    this.lastSeq = 0;
+    this.renderedLastSeq = 0;
+    this.container.scrollTop = 0;
+  }
+
+  setRange(firstSeq, lastSeq) {
+    if (lastSeq < this.lastSeq) {
+      // The backend restarted and numbers events from the start again
+      this.reset();
+    }
+    this.firstSeq = Math.max(this.firstSeq, firstSeq);
+    this.lastSeq = Math.max(this.lastSeq, lastSeq);
+  }
+
+  /* Add live events: `items[i]` has sequence number firstSeq + i. */
+  append(firstSeq, items, lastSeq = firstSeq + items.length - 1) {
+    items.forEach((item, i) => this.put(firstSeq + i, item));
+    this.setRange(this.firstSeq, lastSeq);
+    this.scheduleRender();
+  }
+
+  put(seq, item) {
+    const page = Math.floor((seq - 1) / LOG_PAGE_SIZE);
+    let items = this.pages.get(page);
+    if (!items) {
+      items = new Array(LOG_PAGE_SIZE);
+      this.pages.set(page, items);
+      this.prune();
+    }
+    items[(seq - 1) % LOG_PAGE_SIZE] = item;
+  }
+
+  get(seq) {
+    if (seq < this.firstSeq) return LOG_EVICTED;
+    const page = Math.floor((seq - 1) / LOG_PAGE_SIZE);
+    const items = this.pages.get(page);
+    if (!items) return undefined;
+    // Mark the page as recently used
+    this.pages.delete(page);
+    this.pages.set(page, items);
+    return items[(seq - 1) % LOG_PAGE_SIZE];
+  }
+
+  prune() {
+    while (this.pages.size > LOG_CACHE_PAGES) {
+      this.pages.delete(this.pages.keys().next().value);
+    }
+  }
+
+  async fetchPage(page) {
+    if (this.loading.has(page)) return;
+    this.loading.add(page);
+    try {
+      const since = page * LOG_PAGE_SIZE;
+      const res = await fetch(`${this.url}?since=${since}&limit=${LOG_PAGE_SIZE}`);
+      const data = await res.json();
+      if (data.gap) {
+        // Events before first_seq were evicted from the backend's store
+        this.setRange(data.first_seq, data.last_seq);
+      }
+      const items = data[this.key] || [];
+      items.forEach((item, i) => {
+        const seq = data.first_seq + i;
+        if (seq <= since + LOG_PAGE_SIZE) this.put(seq, item);
+      });
+      if (!this.pages.has(page)) {
+        // Nothing retained for this page any more; remember that
+        this.pages.set(page, new Array(LOG_PAGE_SIZE).fill(LOG_EVICTED));
+        this.prune();
+      }
+      this.scheduleRender();
+    } catch (err) {
+      console.error(`Failed to fetch ${this.url} page ${page}:`, err);
+    } finally {
+      this.loading.delete(page);
+    }
+  }
+
+  rowCount() {
+    return this.lastSeq >= this.firstSeq ? Math.min(this.lastSeq - this.firstSeq + 1, LOG_MAX_ROWS) : 0;
+  }
+
+  scheduleRender() {
+    if (this.frame === null) {
+      this.frame = requestAnimationFrame(() => {
+        this.frame = null;
+        this.render();
+      });
+    }
+  }
+
+  render() {
+    const count = this.rowCount();
+    this.spacer.style.height = `${count * LOG_ROW_HEIGHT}px`;
+    // New rows are added at the top; keep older rows in place while scrolled down
+    const added = this.lastSeq - this.renderedLastSeq;
+    if (added > 0 && this.renderedLastSeq > 0 && this.container.scrollTop > 0) {
+      this.container.scrollTop += added * LOG_ROW_HEIGHT;
+    }
+    this.renderedLastSeq = this.lastSeq;
+
+    const top = this.container.scrollTop;
+    const height = this.container.clientHeight || 300;
+    const start = Math.max(0, Math.floor(top / LOG_ROW_HEIGHT) - LOG_OVERSCAN_ROWS);
+    const end = Math.min(count, Math.ceil((top + height) / LOG_ROW_HEIGHT) + LOG_OVERSCAN_ROWS);
+    while (this.rows.length < end - start) {
+      const row = document.createElement("div");
+      row.className = "virtual-row border-bottom";
+      this.spacer.appendChild(row);
+      this.rows.push(row);
+    }
+
+    const missing = new Set();
+    this.rows.forEach((row, i) => {
+      const index = start + i;
+      if (index >= end) {
+        row.style.display = "none";
+        return;
+      }
+      const seq = this.lastSeq - index;
+      const item = this.get(seq);
+      let text;
+      if (item === undefined) {
+        text = "…";
+        missing.add(Math.floor((seq - 1) / LOG_PAGE_SIZE));
+      } else if (item === LOG_EVICTED) {
+        text = "(evicted)";
+      } else {
+        text = this.format(item);
+      }
+      row.style.display = "";
+      row.style.transform = `translateY(${index * LOG_ROW_HEIGHT}px)`;
+      if (row.textContent !== text) row.textContent = text;
+    });
+    missing.forEach((page) => this.fetchPage(page));
+  }
 }
 
 /* -------------------------------
@@ -359,37 +588,49 @@ async function doDetach(pinPath, attachType, target) {
 /* -------------------------------
    eBPF Logs & Visualization
 ------------------------------- */
+let collectorLive = false;
+
 function fetchCollectorEvents() {
-  fetch("/api/collector_events")
-    .then((res) => res.json())
-    .then((data) => {
-      // Merge new events with existing memory
-      // (We assume data.events is an array of strings)
-      data.events.forEach((evt) => {
-        if (!ebpfEventsMemory.includes(evt)) {
-          ebpfEventsMemory.push(evt);
-        }
-      });
-      persistDataToLocalStorage(); // Store updated logs
-
-      // Update the logs panel
-      const eventsDiv = document.getElementById("collector-events");
-      eventsDiv.innerHTML = "";
-      [...ebpfEventsMemory].reverse().forEach((event) => {
-        const eventElem = document.createElement("div");
-        eventElem.className = "border-bottom py-1";
-        eventElem.style.fontSize = "0.8rem";
-        eventElem.textContent = event;
-        eventsDiv.appendChild(eventElem);
-      });
-      // Update chart
-      if (logChart) {
-        updateChartData(ebpfEventsMemory.length);
-      }
+  fetchDelta("/api/collector_events", "events", ebpfCursor)
+    .then(({ items, firstSeq, lastSeq, next }) => {
+      ebpfCursor = next;
+      collectorLog.append(firstSeq, items, lastSeq);
     })
     .catch((err) => console.error("Failed to fetch collector events:", err));
 }
 
+/*
+ * Subscribe to the live SSE stream, resuming after the server cursor.
+ * Events go straight into the virtual log, which coalesces them into one
+ * render per frame. If the stream cannot be opened at all we fall back to
+ * polling.
+ */
+function startCollectorStream() {
+  const source = new EventSource(`/api/collector_events/stream?since=${ebpfCursor}`);
+  let opened = false;
+  source.onopen = () => {
+    opened = true;
+  };
+  source.onmessage = (e) => {
+    const seq = Number(e.lastEventId);
+    if (!seq) return;
+    ebpfCursor = seq;
+    collectorLog.append(seq, [JSON.parse(e.data)]);
+  };
+  source.addEventListener("gap", (e) => {
+    console.warn("[DEBUG] Collector stream skipped evicted events:", e.data);
+  });
+  source.onerror = () => {
+    if (!opened) {
+      console.log("[DEBUG] Collector stream unavailable, falling back to polling.");
+      source.close();
+      collectorEventSource = null;
+      pollingInterval = setInterval(fetchCollectorEvents, 2000);
+    }
+  };
+  collectorEventSource = source;
+}
+
 function initializeChart() {
   const canvas = document.getElementById("logChart");
   if (!canvas) return console.error("Chart canvas not found for eBPF logs");
@@ -402,47 +643,106 @@ function initializeChart() {
       labels: [],
       datasets: [
         {
-          label: "eBPF Log Count Over Time",
+          label: "Execs per Second",
           data: [],
           fill: false,
           borderColor: "rgb(75, 192, 192)",
           tension: 0.1,
+          pointRadius: 0,
         },
       ],
     },
     options: {
       responsive: true,
       maintainAspectRatio: false,
+      animation: false,
       scales: {
         x: { title: { display: true, text: "Time" } },
-        y: { title: { display: true, text: "Total Logs" } },
+        y: { title: { display: true, text: "Execs/s" }, beginAtZero: true },
       },
     },
   });
 }
 
-function updateChartData(totalCount) {
-  const now = new Date().toLocaleTimeString();
-  if (logChart.data.labels.length >= 15) {
-    logChart.data.labels.shift();
-    logChart.data.datasets[0].data.shift();
+/*
+ * Redraw the exec rate chart from the server's per-second rate series
+ * (/api/collector_stats), so it covers all events, not only those the
+ * browser has seen.
+ */
+async function refreshChartData() {
+  if (!logChart) return;
+  try {
+    const res = await fetch(
+      `/api/collector_stats?top=1&series=${CHART_SERIES_SECONDS}&step=${CHART_STEP_SECONDS}`
+    );
+    const { start, step, counts } = (await res.json()).rate_series;
+    logChart.data.labels = counts.map((_, i) =>
+      new Date((start + i * step) * 1000).toLocaleTimeString()
+    );
+    // The newest bin may be shorter than `step`
+    logChart.data.datasets[0].data = counts.map(
+      (count, i) => count / Math.min(step, CHART_SERIES_SECONDS - i * step)
+    );
+    logChart.update();
+  } catch (err) {
+    console.error("Failed to fetch collector stats:", err);
+  }
+}
+
+function startChartUpdates() {
+  if (!logChart) initializeChart();
+  if (!logChartInterval) {
+    refreshChartData();
+    logChartInterval = setInterval(refreshChartData, CHART_REFRESH_MS);
+  }
+}
+
+function stopChartUpdates() {
+  if (logChartInterval) {
+    clearInterval(logChartInterval);
+    logChartInterval = null;
   }
-  logChart.data.labels.push(now);
-  logChart.data.datasets[0].data.push(totalCount);
-  logChart.update();
 }
 
 /* -------------------------------
    eBPF Collection Control
 ------------------------------- */
 function startPolling() {
-  if (!pollingInterval) {
-    pollingInterval = setInterval(fetchCollectorEvents, 2000);
-    console.log("[DEBUG] eBPF polling started.");
+  if (collectorLive) return;
+  collectorLive = true;
+  if (!collectorLog) {
+    collectorLog = new VirtualLog(
+      document.getElementById("collector-events"),
+      "/api/collector_events",
+      "events",
+      formatExecEvent
+    );
   }
+  collectorLog
+    .resume()
+    .then((lastSeq) => {
+      if (!collectorLive) return;
+      ebpfCursor = lastSeq;
+      if (window.EventSource) {
+        startCollectorStream();
+        console.log("[DEBUG] eBPF streaming started.");
+      } else {
+        pollingInterval = setInterval(fetchCollectorEvents, 2000);
+        console.log("[DEBUG] eBPF polling started.");
+      }
+    })
+    .catch((err) => {
+      collectorLive = false;
+      console.error("Failed to load collector events:", err);
+    });
 }
 
 function stopPolling() {
+  collectorLive = false;
+  if (collectorEventSource) {
+    collectorEventSource.close();
+    collectorEventSource = null;
+  }
   if (pollingInterval) {
     clearInterval(pollingInterval);
     pollingInterval = null;
@@ -536,30 +836,38 @@ function stopUserspaceProgram() {
 }
 
 function fetchUserspaceOutput() {
-  fetch("/api/userspace_output")
-    .then((res) => res.json())
-    .then((data) => {
-      // Merge new lines into our memory array
-      data.output.forEach((line) => {
-        if (!userspaceOutputMemory.includes(line)) {
-          userspaceOutputMemory.push(line);
-        }
-      });
-      persistDataToLocalStorage();
-
-      // Update the UI
-      const outputDiv = document.getElementById("userspaceOutput");
-      outputDiv.textContent = userspaceOutputMemory.join("\n");
-      updateUserspaceChartData(userspaceOutputMemory.length);
+  fetchDelta("/api/userspace_output", "output", userspaceCursor)
+    .then(({ items, firstSeq, lastSeq, next }) => {
+      userspaceCursor = next;
+      userspaceLog.append(firstSeq, items, lastSeq);
     })
     .catch((err) => console.error("Failed to fetch userspace output:", err));
 }
 
 function startUserspacePolling() {
-  if (!userspacePollingInterval) {
-    userspacePollingInterval = setInterval(fetchUserspaceOutput, 2000);
-    console.log("[DEBUG] Userspace polling started.");
+  if (userspacePollingInterval) return;
+  if (!userspaceLog) {
+    userspaceLog = new VirtualLog(
+      document.getElementById("userspaceOutput"),
+      "/api/userspace_output",
+      "output",
+      String
+    );
   }
+  userspacePollingInterval = setInterval(() => {
+    // Resume from the server's newest line before the first poll
+    if (userspaceCursor === 0) {
+      userspaceLog
+        .resume()
+        .then((lastSeq) => {
+          userspaceCursor = lastSeq;
+        })
+        .catch((err) => console.error("Failed to load userspace output:", err));
+    } else {
+      fetchUserspaceOutput();
+    }
+  }, 2000);
+  console.log("[DEBUG] Userspace polling started.");
 }
 
 function stopUserspacePolling() {
@@ -582,7 +890,7 @@ function initializeUserspaceChart() {
       labels: [],
       datasets: [
         {
-          label: "Userspace Output Lines Over Time",
+          label: "Userspace Output Lines Retained",
           data: [],
           fill: false,
           borderColor: "rgb(255, 99, 132)",
@@ -601,16 +909,41 @@ function initializeUserspaceChart() {
   });
 }
 
-function updateUserspaceChartData(lineCount) {
+/*
+ * Add a point with the number of output lines the server retains; a
+ * one-line read returns the store's oldest and newest sequence numbers.
+ */
+async function refreshUserspaceChartData() {
   if (!userspaceChart) return;
-  const now = new Date().toLocaleTimeString();
-  if (userspaceChart.data.labels.length >= 15) {
-    userspaceChart.data.labels.shift();
-    userspaceChart.data.datasets[0].data.shift();
+  try {
+    const res = await fetch("/api/userspace_output?since=0&limit=1");
+    const data = await res.json();
+    const lineCount = data.last_seq >= data.first_seq ? data.last_seq - data.first_seq + 1 : 0;
+    if (userspaceChart.data.labels.length >= 15) {
+      userspaceChart.data.labels.shift();
+      userspaceChart.data.datasets[0].data.shift();
+    }
+    userspaceChart.data.labels.push(new Date().toLocaleTimeString());
+    userspaceChart.data.datasets[0].data.push(lineCount);
+    userspaceChart.update();
+  } catch (err) {
+    console.error("Failed to fetch userspace output range:", err);
+  }
+}
+
+function startUserspaceChartUpdates() {
+  if (!userspaceChart) initializeUserspaceChart();
+  if (!userspaceChartInterval) {
+    refreshUserspaceChartData();
+    userspaceChartInterval = setInterval(refreshUserspaceChartData, CHART_REFRESH_MS);
+  }
+}
+
+function stopUserspaceChartUpdates() {
+  if (userspaceChartInterval) {
+    clearInterval(userspaceChartInterval);
+    userspaceChartInterval = null;
   }
-  userspaceChart.data.labels.push(now);
-  userspaceChart.data.datasets[0].data.push(lineCount);
-  userspaceChart.update();
 }
 
 function initializeUserspaceDumpHandler() {
@@ -684,12 +1017,10 @@ function initializeEBPFButtons() {
         vizPanel.style.display === "none" || vizPanel.style.display === "";
       vizPanel.style.display = isHidden ? "block" : "none";
       toggleVizBtn.textContent = isHidden ? "Hide Visualization" : "Visualize";
-      if (isHidden && !logChart) {
-        initializeChart();
-        // On first init, also fill the chart with the existing memory
-        if (ebpfEventsMemory.length > 0) {
-          updateChartData(ebpfEventsMemory.length);
-        }
+      if (isHidden) {
+        startChartUpdates();
+      } else {
+        stopChartUpdates();
       }
     });
   }
@@ -730,12 +1061,10 @@ function initializeUserspaceButtons() {
         vizPanel.style.display === "none" || vizPanel.style.display === "";
       vizPanel.style.display = isHidden ? "block" : "none";
       toggleVizBtn.textContent = isHidden ? "Hide Visualization" : "Visualize";
-      if (isHidden && !userspaceChart) {
-        initializeUserspaceChart();
-        // Also push existing memory count
-        if (userspaceOutputMemory.length > 0) {
-          updateUserspaceChartData(userspaceOutputMemory.length);
-        }
+      if (isHidden) {
+        startUserspaceChartUpdates();
+      } else {
+        stopUserspaceChartUpdates();
       }
     });
   }
@@ -764,8 +1093,8 @@ function initializeFileSearch() {
    DOM Initialization
 ------------------------------- */
 document.addEventListener("DOMContentLoaded", () => {
-  // 1) Restore data from localStorage if present
-  restoreDataFromLocalStorage();
+  // 1) Logs are resumed from the server; drop the old localStorage copies
+  removeLegacyStorage();
 
   // 2) Load eBPF programs & attach form handler
   fetchPrograms();